@@ -0,0 +1,29 @@
+"""Add full-text search index
+
+Revision ID: 4b1d2c7e9a10
+Revises: 0e0f60776e06
+Create Date: 2025-04-02 10:24:13.518342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from handler.search import drop_search_index, install_search_index
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1d2c7e9a10'
+down_revision: Union[str, None] = '0e0f60776e06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite: FTS5 table + trigger，Postgres: GIN index (見 handler/search.py)
+    install_search_index(op.get_bind())
+
+
+def downgrade() -> None:
+    drop_search_index(op.get_bind())
@@ -0,0 +1,80 @@
+"""/save_to_mongo 寫入期間其他 endpoint 的延遲
+
+在同一個 event loop 內 (httpx ASGITransport) 同時送出多個大批 /save_to_mongo，
+並持續打 /welcome 量測延遲；Mongo I/O 若卡住 event loop，/welcome 的延遲會跟著寫入時間拉長
+
+    MONGO_URI=mongodb://localhost:27017/mydatabase python -m benchmark.mongo_latency --rows 100000 --writers 4
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmark.stats import percentile
+
+
+def markdown_table(rows: int) -> str:
+    lines = ["| name | age | city |", "| --- | --- | --- |"]
+    lines += [f"| user{i} | {i % 90} | city{i % 50} |" for i in range(rows)]
+    return "\n".join(lines)
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/welcome")
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+def summary(latencies: list) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+async def run(rows: int, writers: int, interval: float) -> dict:
+    from simple_main import app
+
+    payload = {"content": markdown_table(rows), "collection_name": "benchmark"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        # 沒有寫入時的基準
+        stop = asyncio.Event()
+        idle = asyncio.create_task(probe(client, stop, interval))
+        await asyncio.sleep(1)
+        stop.set()
+        idle_latencies = await idle
+
+        stop = asyncio.Event()
+        busy = asyncio.create_task(probe(client, stop, interval))
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/save_to_mongo/", json=payload) for _ in range(writers)))
+        write_seconds = time.perf_counter() - started
+        stop.set()
+        busy_latencies = await busy
+
+    return {
+        "rows_per_request": rows,
+        "writers": writers,
+        "write_seconds": round(write_seconds, 2),
+        "rows_per_second": [response.json().get("rows_per_second") for response in responses],
+        "idle": summary(idle_latencies),
+        "during_writes": summary(busy_latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="每個 /save_to_mongo 的列數")
+    parser.add_argument("--writers", type=int, default=4, help="同時進行的 /save_to_mongo 數量")
+    parser.add_argument("--interval", type=float, default=0.01, help="/welcome 量測間隔 (秒)")
+    args = parser.parse_args()
+    for key, value in asyncio.run(run(args.rows, args.writers, args.interval)).items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
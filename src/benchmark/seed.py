@@ -0,0 +1,53 @@
+"""以 faker 產生固定 seed 的測試資料，相同參數每次產生相同的內容"""
+from datetime import datetime, timedelta
+
+from faker import Faker
+from sqlalchemy import delete, insert
+
+from handler.markdown import batched
+
+SEED_BATCH_SIZE = 1000
+
+
+def make_faker(seed: int) -> Faker:
+    fake = Faker()
+    fake.seed_instance(seed)
+    return fake
+
+def _insert_rows(db, model, rows):
+    for batch in batched(rows, SEED_BATCH_SIZE):
+        db.execute(insert(model), batch)
+
+def seed_simple(session_factory, user_model, post_model, users: int, posts: int, seed: int = 0) -> dict:
+    """simple_main 的 user / post；id 從 1 開始連續編號，benchmark 可以直接用亂數挑 id"""
+    fake = make_faker(seed)
+    now = datetime(2024, 1, 1)
+    with session_factory() as db:
+        db.execute(delete(post_model))
+        db.execute(delete(user_model))
+        _insert_rows(db, user_model, ({
+            "id": i,
+            "username": fake.user_name(),
+            "email": fake.email(),
+            "signup_time": now,
+            "expired_time": now + timedelta(days=365),
+            "role": "user",
+        } for i in range(1, users + 1)))
+        _insert_rows(db, post_model, ({
+            "id": i,
+            "title": fake.sentence(nb_words=6),
+            "content": fake.paragraph(nb_sentences=5),
+            "author_id": fake.random_int(1, users),
+        } for i in range(1, posts + 1)))
+        db.commit()
+    return {"users": users, "posts": posts}
+
+def seed_main(session_factory, user_model, users: int, seed: int = 0) -> dict:
+    """main.py 的 users (REST /users/api/v1/users/{id})"""
+    fake = make_faker(seed)
+    with session_factory() as db:
+        db.execute(delete(user_model))
+        _insert_rows(db, user_model, ({"id": i, "name": fake.first_name(), "age": fake.random_int(18, 80)}
+                                      for i in range(1, users + 1)))
+        db.commit()
+    return {"users": users}
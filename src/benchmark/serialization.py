@@ -0,0 +1,80 @@
+"""response JSON 序列化：標準庫 json (strawberry / JSONResponse 的預設) 與 handler.serializer (orjson) 的比較
+
+payload 模擬 getPosts / search 的 GraphQL 結果，以及帶 datetime / Enum 的 REST user 清單
+
+    cd src
+    python -m benchmark.serialization --rows 10000
+
+端到端的比較 (經過 ASGI app，含 resolver 與 DB)：
+    JSON_SERIALIZER=json python -m benchmark.suite --scenarios getPosts,search --output before.json
+    python -m benchmark.suite --scenarios getPosts,search --output after.json
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Callable, Dict
+
+from tabulate import tabulate
+
+from handler import serializer
+
+
+class Role(Enum):
+    ADMIN = "admin"
+    USER = "user"
+    GUEST = "guest"
+
+
+def make_payloads(rows: int) -> Dict[str, object]:
+    signup = datetime(2024, 1, 1, 12, 30)
+    posts = [{"id": str(i), "title": f"Post title {i}", "content": "內容 " * 20, "authorId": str(i % 100)}
+             for i in range(rows)]
+    search = [{"__typename": "PostType", "id": str(i), "title": f"Post title {i}"} if i % 2 else
+              {"__typename": "UserType", "id": str(i), "username": f"user{i}"} for i in range(rows)]
+    users = [{"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "signup_time": signup,
+              "expired_time": signup + timedelta(days=365), "role": list(Role)[i % 3]} for i in range(rows)]
+    return {
+        "getPosts": {"data": {"getPosts": posts}},
+        "search": {"data": {"search": search}},
+        "users (datetime / enum)": {"status": "success", "data": users},
+    }
+
+def stdlib_dumps(data) -> bytes:
+    # strawberry 預設 json.dumps；datetime / Enum 需要 default 才能編碼
+    return json.dumps(data, default=serializer.encode_default).encode("utf-8")
+
+def measure(fn: Callable, data, repeat: int) -> float:
+    """repeat 次中最快一次的毫秒數"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+def run(rows: int, repeat: int) -> list:
+    table = []
+    for name, payload in make_payloads(rows).items():
+        encoded = stdlib_dumps(payload)
+        before = measure(stdlib_dumps, payload, repeat)
+        after = measure(serializer.dumps, payload, repeat)
+        decode_before = measure(json.loads, encoded, repeat)
+        decode_after = measure(serializer.loads, encoded, repeat)
+        table.append([name, len(encoded), round(before, 2), round(after, 2), round(before / after, 1),
+                      round(decode_before, 2), round(decode_after, 2), round(decode_before / decode_after, 1)])
+    return table
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="每個 payload 的列數")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(f"serializer: {'orjson' if serializer.USE_ORJSON else 'json'}")
+    print(tabulate(run(args.rows, args.repeat), headers=[
+        "payload", "bytes", "json dumps ms", "serializer dumps ms", "x",
+        "json loads ms", "serializer loads ms", "x"]))
+
+if __name__ == "__main__":
+    main()
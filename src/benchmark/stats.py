@@ -0,0 +1,43 @@
+from typing import Dict, List, Optional
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def latency_summary(latencies: List[float], seconds: float, errors: int = 0) -> dict:
+    """latencies 單位為 ms；seconds 為整段量測的時間，用來算 throughput"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "count": count,
+        "errors": errors,
+        "mean_ms": round(sum(latencies) / count, 3) if count else None,
+        "p50_ms": round(percentile(latencies, 0.50), 3) if count else None,
+        "p95_ms": round(percentile(latencies, 0.95), 3) if count else None,
+        "p99_ms": round(percentile(latencies, 0.99), 3) if count else None,
+        "max_ms": round(latencies[-1], 3) if count else None,
+        "requests_per_second": round(count / seconds, 2) if seconds else None,
+    }
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[dict]:
+    """和 baseline 比較各情境的 p95 與 throughput，超出 tolerance (比例) 的列為 regression"""
+    regressions = []
+    for name, current in results.items():
+        previous: Optional[dict] = baseline.get(name)
+        if not previous:
+            continue
+        checks = [
+            ("p95_ms", current.get("p95_ms"), previous.get("p95_ms"), lambda now, before: now > before * (1 + tolerance)),
+            ("p99_ms", current.get("p99_ms"), previous.get("p99_ms"), lambda now, before: now > before * (1 + tolerance)),
+            ("requests_per_second", current.get("requests_per_second"), previous.get("requests_per_second"),
+             lambda now, before: now < before * (1 - tolerance)),
+        ]
+        for metric, now, before, is_worse in checks:
+            if now is not None and before and is_worse(now, before):
+                regressions.append({"scenario": name, "metric": metric, "baseline": before, "current": now,
+                                    "change": round((now - before) / before, 3)})
+        if current.get("errors", 0) > previous.get("errors", 0):
+            regressions.append({"scenario": name, "metric": "errors", "baseline": previous.get("errors", 0),
+                                "current": current["errors"], "change": None})
+    return regressions
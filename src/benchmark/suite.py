@@ -0,0 +1,211 @@
+"""GraphQL / REST endpoint 的延遲與 throughput
+
+在暫存目錄建立新的 SQLite DB，以 faker 塞入固定 seed 的資料，再以 in-process 的 httpx ASGITransport
+(不經過網路) 對每個情境送出固定數量的 request，輸出 p50 / p95 / p99 與 requests/s 的 JSON
+
+    cd src
+    python -m benchmark.suite --users 1000 --posts 5000 --requests 500 --concurrency 10 --update-baseline
+    python -m benchmark.suite --baseline benchmark/baseline.json   # p95 / p99 / throughput 退步超過 tolerance 時 exit 1
+
+simple_main 的 DB 路徑固定是 ./simple.db，所以會先切換到 --workdir (預設為新的暫存目錄) 再載入 app；
+預設關閉 response cache 以量測 resolver 本身，--response-cache 則量測實際設定
+baseline 和機器有關，請在同一台機器上產生與比較；repo 內的 benchmark/baseline.json 是以預設參數產生的參考值
+(環境見其中的 meta)，要比較改動前後時先在改動前的 commit 以 --update-baseline 重新產生
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from benchmark.seed import make_faker
+from benchmark.stats import compare, latency_summary
+
+DEFAULT_BASELINE = os.path.join(SRC_DIR, "benchmark", "baseline.json")
+
+# (method, url, json body)
+Request = Tuple[str, str, Optional[dict]]
+
+
+def graphql(query: str, variables: Optional[dict] = None) -> Request:
+    return "POST", "/graphql", {"query": query, "variables": variables or {}}
+
+# 情境名稱 -> (app, 產生 request 的函式)；app 為 "simple" (simple_main) 或 "main" (main.py)
+SCENARIOS: Dict[str, Tuple[str, Callable[[random.Random, dict], Request]]] = {
+    "getUser": ("simple", lambda rng, data: graphql(
+        "query GetUser($id: Int) { getUser(id: $id) { id username email } }",
+        {"id": rng.randint(1, data["users"])})),
+    "getUserWithPosts": ("simple", lambda rng, data: graphql(
+        "query GetUserWithPosts($id: Int) { getUser(id: $id) { id username posts { id title } } }",
+        {"id": rng.randint(1, data["users"])})),
+    "getPosts": ("simple", lambda rng, data: graphql(
+        "query GetPosts { getPosts { id title authorId } }")),
+    "search": ("simple", lambda rng, data: graphql(
+        "query Search($keyword: String!) { search(keyword: $keyword, limit: 20) "
+        "{ __typename ... on PostType { id title } ... on UserType { id username } } }",
+        {"keyword": rng.choice(data["keywords"])})),
+    "createUser": ("simple", lambda rng, data: graphql(
+        "mutation CreateUser($input: UserInput!) { createUser(input: $input) { id } }",
+        {"input": {"username": f"bench{rng.getrandbits(32)}", "email": "bench@example.com"}})),
+    "createUsers": ("simple", lambda rng, data: graphql(
+        "mutation CreateUsers($inputs: [UserInput!]!) { createUsers(inputs: $inputs) { users { id } errors { index } } }",
+        {"inputs": [{"username": f"bench{rng.getrandbits(32)}", "email": "bench@example.com"} for _ in range(10)]})),
+    "createPost": ("simple", lambda rng, data: graphql(
+        "mutation CreatePost($authorId: ID!) { createPost(title: \"benchmark\", content: \"benchmark post\", authorId: $authorId) { id } }",
+        {"authorId": str(rng.randint(1, data["users"]))})),
+    "updateUser": ("simple", lambda rng, data: graphql(
+        "mutation UpdateUser($id: ID!, $username: String) { updateUser(id: $id, username: $username) { id } }",
+        {"id": str(rng.randint(1, data["users"])), "username": f"renamed{rng.getrandbits(16)}"})),
+    "restGetUser": ("main", lambda rng, data: (
+        "GET", f"/users/api/v1/users/{rng.randint(1, data['users'])}", None)),
+}
+
+
+def load_apps(users: int, posts: int, seed: int, response_cache: bool) -> Dict[str, object]:
+    """在目前目錄建立 DB 並塞入資料後回傳 {"simple": app, "main": app}"""
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.abspath('main.db')}")
+    if not response_cache:
+        os.environ.update(RESPONSE_CACHE_BACKEND="memory", RESPONSE_CACHE_SIZE="0")
+    import main
+    import simple_main
+    from benchmark.seed import seed_main, seed_simple
+
+    seed_simple(simple_main.SessionLocal, simple_main.UserModel, simple_main.PostModel, users, posts, seed)
+    seed_main(main.SessionLocal, main.UserModel, users, seed)
+    return {"simple": simple_main.app, "main": main.app}
+
+def is_ok(response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    if response.request.url.path == "/graphql":
+        return not response.json().get("errors")
+    return True
+
+async def run_scenario(client: httpx.AsyncClient, build: Callable, data: dict,
+                       requests: int, concurrency: int, warmup: int, seed: int) -> dict:
+    rng = random.Random(seed)
+
+    async def send() -> Tuple[float, bool]:
+        method, url, body = build(rng, data)
+        started = time.perf_counter()
+        response = await client.request(method, url, json=body)
+        return (time.perf_counter() - started) * 1000, is_ok(response)
+
+    for _ in range(warmup):
+        await send()
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            latency, ok = await send()
+            latencies.append(latency)
+            errors += 0 if ok else 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(latencies, time.perf_counter() - started, errors)
+
+async def run(scenarios: List[str], users: int, posts: int, requests: int, concurrency: int,
+              warmup: int, seed: int, response_cache: bool = False) -> dict:
+    apps = load_apps(users, posts, seed, response_cache)
+    # search 的關鍵字取自和 post 相同的 faker 字庫
+    fake = make_faker(seed)
+    data = {"users": users, "posts": posts, "keywords": [fake.word() for _ in range(50)]}
+    results = {}
+    clients = {name: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None)
+               for name, app in apps.items()}
+    try:
+        for index, name in enumerate(scenarios):
+            app_name, build = SCENARIOS[name]
+            results[name] = await run_scenario(clients[app_name], build, data, requests, concurrency, warmup,
+                                               seed + index)
+    finally:
+        for client in clients.values():
+            await client.aclose()
+    return {
+        "meta": {
+            "users": users, "posts": posts, "requests": requests, "concurrency": concurrency, "warmup": warmup,
+            "seed": seed, "response_cache": response_cache, "db_async": os.getenv("DB_ASYNC", "false"),
+            "json_serializer": os.getenv("JSON_SERIALIZER", "orjson"),
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="塞入的 user 數")
+    parser.add_argument("--posts", type=int, default=5000, help="塞入的 post 數")
+    parser.add_argument("--requests", type=int, default=300, help="每個情境量測的 request 數")
+    parser.add_argument("--concurrency", type=int, default=10, help="同時進行的 request 數")
+    parser.add_argument("--warmup", type=int, default=20, help="每個情境不計入結果的 request 數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="以逗號分隔，預設全部")
+    parser.add_argument("--response-cache", action="store_true", help="開啟 simple_main 的 response cache")
+    parser.add_argument("--workdir", help="放 DB 的目錄，預設為新的暫存目錄")
+    parser.add_argument("--output", help="結果 JSON 的路徑，未指定時輸出到 stdout")
+    parser.add_argument("--baseline", help="和這個 baseline JSON 比較")
+    parser.add_argument("--update-baseline", nargs="?", const=DEFAULT_BASELINE, help="把結果寫成 baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="可接受的退步比例 (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    # 切換目錄前先把路徑轉成絕對路徑
+    output, baseline_path, update_baseline = (os.path.abspath(path) if path else None
+                                              for path in (args.output, args.baseline, args.update_baseline))
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir or tempfile.mkdtemp(prefix="benchmark-"))
+
+    # app 內的 print 改輸出到 stderr，stdout 只有結果 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(scenarios, args.users, args.posts, args.requests, args.concurrency,
+                                 args.warmup, args.seed, args.response_cache))
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        report["regressions"] = compare(report["scenarios"], baseline["scenarios"], args.tolerance)
+        # 資料量或設定不同時結果不能直接比較
+        mismatched = [key for key in ("users", "posts", "requests", "concurrency", "response_cache", "db_async",
+                                  "json_serializer")
+                      if baseline.get("meta", {}).get(key) != report["meta"][key]]
+        if mismatched:
+            print(f"warning: baseline was recorded with different {', '.join(mismatched)}", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if update_baseline:
+        with open(update_baseline, "w") as f:
+            json.dump({"meta": report["meta"], "scenarios": report["scenarios"]}, f, indent=2)
+    if report.get("regressions"):
+        for item in report["regressions"]:
+            print(f"regression: {item['scenario']} {item['metric']} {item['baseline']} -> {item['current']}",
+                  file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
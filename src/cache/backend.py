@@ -0,0 +1,247 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from redis import Redis, WatchError
+from starlette.concurrency import run_in_threadpool
+
+
+class LRUCache:
+    """行程內的 LRU cache，超過 maxsize 時淘汰最久沒用到的 key
+
+    ttl: 秒數，過期的 key 視為不存在 (None 表示不過期)
+    tags: set 時可以替 key 標上 tag，invalidate(tags) 會刪掉所有帶有這些 tag 的 key
+    version: 讀取前先取 version()，set(..., version=) 時若任一 tag 在那之後被 invalidate 過就不寫入，
+             避免 invalidate 前開始的讀取在 invalidate 後把舊資料寫回去
+    recently_invalidated(key): key 在 invalidated_window 秒內因 invalidate 被刪除過
+    a 開頭的 async 版本介面與 RedisCache 一致，記憶體操作直接執行
+    """
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, invalidated_window: float = 5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.invalidated_window = invalidated_window
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._tags = {}  # tag -> {key}
+        self._key_tags = {}  # key -> {tag}，刪除 key 時同步清掉 tag 索引
+        self._version = 0
+        # tag -> 最後一次 invalidate 的 version，最多保留 maxsize 個；
+        # 被淘汰的紀錄中最新的 version 存在 _forgotten_version，更早開始的讀取一律不寫入
+        self._tag_versions = OrderedDict()
+        self._forgotten_version = 0
+        self._invalidated = OrderedDict()  # key -> 紀錄到期時間，依時間排序
+        # resolver 可能在 threadpool 裡存取，OrderedDict 的搬移需要上鎖
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] is not None and item[0] <= time.monotonic():
+                self._remove(key)
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return item[1]
+
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = (), version: Optional[int] = None):
+        tags = list(tags)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if version is not None and self._is_stale(tags, version):
+                return
+            self._remove(key)
+            self._data[key] = (expires_at, value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+                self._key_tags.setdefault(key, set()).add(tag)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, tags: Iterable[str]):
+        now = time.monotonic()
+        with self._lock:
+            self._version += 1
+            for tag in tags:
+                self._tag_versions[tag] = self._version
+                self._tag_versions.move_to_end(tag)
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+                    self._invalidated[key] = now + self.invalidated_window
+                    self._invalidated.move_to_end(key)
+            while len(self._tag_versions) > self.maxsize:
+                _, self._forgotten_version = self._tag_versions.popitem(last=False)
+            while self._invalidated and (len(self._invalidated) > self.maxsize or next(iter(self._invalidated.values())) <= now):
+                self._invalidated.popitem(last=False)
+
+    def recently_invalidated(self, key: str) -> bool:
+        with self._lock:
+            expires_at = self._invalidated.get(key)
+            return expires_at is not None and expires_at > time.monotonic()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, tags: Iterable[str] = (), version: Optional[int] = None):
+        self.set(key, value, tags, version)
+
+    async def ainvalidate(self, tags: Iterable[str]):
+        self.invalidate(tags)
+
+    async def aversion(self) -> int:
+        return self.version()
+
+    async def arecently_invalidated(self, key: str) -> bool:
+        return self.recently_invalidated(key)
+
+    def _is_stale(self, tags: Iterable[str], version: int) -> bool:
+        if version < self._forgotten_version:
+            return True
+        return any(self._tag_versions.get(tag, 0) > version for tag in tags)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+            self._tag_versions.clear()
+            self._forgotten_version = self._version
+            self._invalidated.clear()
+
+    def _remove(self, key: str):
+        self._data.pop(key, None)
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache:
+    """以 Redis 儲存，多個 worker 可以共用；key 會加上 prefix 避免和 rq 的 key 衝突
+
+    tag 以 Redis set 記錄 (prefix + "tag:" + tag)，invalidate 時一次刪掉所有對應的 key
+    version 與 LRUCache 相同：invalidate 會遞增 prefix + "version" 並記在 prefix + "tagver:" + tag，
+    set 以 WATCH 檢查 tag 的 version，期間被 invalidate 就放棄寫入；
+    tag 的 version 保留 version_ttl 秒，比這更久的讀取仍可能寫回舊資料 (最多存活 ttl 秒)
+    被 invalidate 刪除的 key 記在 prefix + "invalidated:" + key，保留 invalidated_window 秒
+
+    redis client 是同步的，async 程式碼 (resolver / extension) 請用 a 開頭的版本，會在 threadpool 執行
+    """
+    def __init__(self, connection: Redis, prefix: str = "cache:", ttl: Optional[int] = None,
+                 version_ttl: int = 300, invalidated_window: float = 5):
+        self.connection = connection
+        self.prefix = prefix
+        self.ttl = ttl
+        self.version_ttl = version_ttl
+        self.invalidated_window = invalidated_window
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.connection.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode("utf-8")
+        return value
+
+    def version(self) -> int:
+        return int(self.connection.get(self.prefix + "version") or 0)
+
+    def set(self, key: str, value: str, tags: Iterable[str] = (), version: Optional[int] = None):
+        tags = list(tags)
+        with self.connection.pipeline() as pipe:
+            try:
+                if version is not None and tags:
+                    version_keys = [self._version_key(tag) for tag in tags]
+                    pipe.watch(*version_keys)
+                    if any(int(tag_version) > version for tag_version in pipe.mget(version_keys) if tag_version):
+                        return
+                    pipe.multi()
+                pipe.set(self.prefix + key, value, ex=self.ttl)
+                for tag in tags:
+                    pipe.sadd(self._tag_key(tag), key)
+                    if self.ttl:
+                        pipe.expire(self._tag_key(tag), self.ttl)
+                pipe.execute()
+            except WatchError:
+                # 檢查之後有 invalidate，放棄這次寫入
+                return
+
+    def delete(self, key: str):
+        self.connection.delete(self.prefix + key)
+
+    def invalidate(self, tags: Iterable[str]):
+        tags = list(tags)
+        if not tags:
+            return
+        # 先更新 tag 的 version 再刪 key：WATCH 中的 set 會失敗，已寫入的 set 會出現在下面的 sunion
+        version = self.connection.incr(self.prefix + "version")
+        pipe = self.connection.pipeline()
+        for tag in tags:
+            pipe.set(self._version_key(tag), version, ex=self.version_ttl)
+        pipe.execute()
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        keys = self.connection.sunion(tag_keys)
+        pipe = self.connection.pipeline()
+        for key in keys:
+            key = key.decode("utf-8") if isinstance(key, bytes) else key
+            pipe.delete(self.prefix + key)
+            pipe.set(self._invalidated_key(key), 1, px=int(self.invalidated_window * 1000))
+        pipe.delete(*tag_keys)
+        pipe.execute()
+
+    def recently_invalidated(self, key: str) -> bool:
+        return bool(self.connection.exists(self._invalidated_key(key)))
+
+    def clear(self):
+        # version 計數不清除，否則進行中的讀取會拿舊的 version 通過檢查
+        version_key = (self.prefix + "version").encode("utf-8")
+        for key in self.connection.scan_iter(match=self.prefix + "*"):
+            if key not in (version_key, version_key.decode("utf-8")):
+                self.connection.delete(key)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await run_in_threadpool(self.get, key)
+
+    async def aset(self, key: str, value: str, tags: Iterable[str] = (), version: Optional[int] = None):
+        await run_in_threadpool(self.set, key, value, tags, version)
+
+    async def ainvalidate(self, tags: Iterable[str]):
+        await run_in_threadpool(self.invalidate, tags)
+
+    async def aversion(self) -> int:
+        return await run_in_threadpool(self.version)
+
+    async def arecently_invalidated(self, key: str) -> bool:
+        return await run_in_threadpool(self.recently_invalidated, key)
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.prefix}tagver:{tag}"
+
+    def _invalidated_key(self, key: str) -> str:
+        return f"{self.prefix}invalidated:{key}"
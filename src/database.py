@@ -1,16 +1,254 @@
-from sqlalchemy import create_engine
+import os
+import random
+import asyncio
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.concurrency import run_in_threadpool
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# DB_ASYNC=true 改用 async engine (sqlite+aiosqlite / postgresql+asyncpg)，方便和 sync 版本做效能比較
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+# read replica，以逗號分隔多個 URL；未設定時讀寫都走 primary
+DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+
+def parse_url_list(value: str) -> list:
+    return [url.strip() for url in value.split(",") if url.strip()]
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """sqlite:///./test.db -> sqlite+aiosqlite:///./test.db"""
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+# 連線池設定，可用環境變數調整
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # 秒，避免拿到被 DB 端關掉的閒置連線
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+
+# 每條 SQLite 連線建立時套用
+# WAL: 讀取不會被寫入擋住，多個 reader 可以同時讀
+# synchronous=NORMAL: WAL 模式下仍不會損毀資料，只是斷電時可能遺失最後一筆 transaction
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # 負數單位為 KiB，約 64MB
+    "mmap_size": 268435456,  # 256MB
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # 毫秒，寫入互相等待時不要立刻回 database is locked
+}
+
+def is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+def engine_options(url: str) -> dict:
+    # in-memory SQLite 用的是 SingletonThreadPool / StaticPool，不接受 pool_size 等參數
+    return {} if is_memory_sqlite(url) else dict(POOL_OPTIONS)
+
+def set_sqlite_pragmas(engine):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_db_engine(url: str):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args, **engine_options(url))
+    if url.startswith("sqlite"):
+        set_sqlite_pragmas(engine)
+    return engine
+
+def create_async_db_engine(url: str):
+    options = engine_options(url)
+    if options and url.startswith("sqlite"):
+        # aiosqlite 預設是 NullPool (每次都開新連線)，改用 queue pool 重複使用連線
+        options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(to_async_url(url), **options)
+    if url.startswith("sqlite"):
+        set_sqlite_pragmas(engine.sync_engine)
+    return engine
+
+class RoutingSession(Session):
+    """讀取走 replica，寫入 (flush / INSERT / UPDATE / DELETE) 走 primary
+
+    read-your-writes: session 寫入過一次之後，後續的讀取也改走 primary；
+    搭配 RequestSession (一個 request 一個 session)，同一個 request 內寫入後一定讀得到剛寫的資料
+    跨 request 的 read-your-writes 見 extension.session.RequestSessionExtension 的 sticky_seconds
+    每個 session 固定使用同一台 replica，同一個 request 內的讀取結果彼此一致
+    """
+    def __init__(self, *args, primary=None, replicas=(), **kwargs):
+        kwargs["bind"] = kwargs.get("bind") or primary
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replica = random.choice(replicas) if replicas else None
+
+    def use_primary(self):
+        self.info["use_primary"] = True
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None:
+            return self.primary
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.use_primary()
+            return self.primary
+        if self.info.get("use_primary"):
+            return self.primary
+        return self.replica
+
+def routing_sessionmaker(primary, replicas=()):
+    return sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False,
+                        primary=primary, replicas=list(replicas))
+
+def async_routing_sessionmaker(primary, replicas=()):
+    # AsyncSession 內部仍是 sync Session，所以路由到 async engine 對應的 sync_engine
+    return async_sessionmaker(sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False,
+                              primary=primary.sync_engine, replicas=[replica.sync_engine for replica in replicas])
+
+engine = create_db_engine(DATABASE_URL)
+replica_engines = [create_db_engine(url) for url in parse_url_list(DATABASE_REPLICA_URLS)]
+SessionLocal = routing_sessionmaker(engine, replica_engines)
 Base =  declarative_base()
 
+# async driver 是選用套件，只有開啟 DB_ASYNC 時才建立
+async_engine = create_async_db_engine(DATABASE_URL) if DB_ASYNC else None
+async_replica_engines = [create_async_db_engine(url) for url in parse_url_list(DATABASE_REPLICA_URLS)] if DB_ASYNC else []
+AsyncSessionLocal = async_routing_sessionmaker(async_engine, async_replica_engines) if DB_ASYNC else None
+# resolver 統一透過 session_factory 取得 session
+session_factory = AsyncSessionLocal if DB_ASYNC else SessionLocal
+
+async def dispose_engines(*engines):
+    """app 關閉時釋放連線池；async engine 需要 await，否則 aiosqlite 的連線 thread 不會結束"""
+    for engine in engines:
+        if engine is None:
+            continue
+        if isinstance(engine, AsyncEngine):
+            await engine.dispose()
+        else:
+            engine.dispose()
+
 # 依賴注入
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def run_in_session(factory, fn, *args):
+    """在新的 session 中執行同步的 ORM 程式碼 fn(db, *args)
+
+    async_sessionmaker: 透過 AsyncSession.run_sync 跑在 async driver 上，等待 I/O 時不佔用 thread
+    sessionmaker: 丟到 threadpool 執行，避免阻塞 event loop
+    """
+    if isinstance(factory, async_sessionmaker):
+        async with factory() as session:
+            return await session.run_sync(fn, *args)
+
+    def work():
+        with factory() as session:
+            return fn(session, *args)
+    return await run_in_threadpool(work)
+
+class RequestSession:
+    """同一個 request 的 resolver 共用一個 session (一條連線)，第一次用到時才建立
+
+    fn(db, *args) 與 run_in_session 相同；resolver 可能並行執行，而 session 不能同時被多個
+    thread / task 使用，所以以 lock 依序執行。request 結束時由 close() 歸還連線
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.session = None
+        self.closed = False
+        self.primary_only = False
+        self._lock = asyncio.Lock()
+
+    def use_primary(self):
+        """之後的查詢都走 primary (例如 mutation 內先讀再寫，不能讀到 replica 的舊資料)"""
+        self.primary_only = True
+        if self.session is not None:
+            self.session.info["use_primary"] = True
+
+    async def run(self, fn, *args):
+        if self.closed:
+            # request 已結束 (例如 subscription 仍在推送)，改用一次性的 session
+            return await run_in_session(self.factory, fn, *args)
+        async with self._lock:
+            if self.session is None:
+                self.session = self.factory()
+                if self.primary_only:
+                    self.session.info["use_primary"] = True
+            try:
+                if isinstance(self.session, AsyncSession):
+                    return await self.session.run_sync(fn, *args)
+                return await run_in_threadpool(fn, self.session, *args)
+            except Exception:
+                # 讓後續的 resolver 還能繼續使用這個 session
+                await self._call(self.session.rollback)
+                raise
+
+    async def close(self):
+        self.closed = True
+        async with self._lock:
+            if self.session is not None:
+                await self._call(self.session.close)
+                self.session = None
+
+    async def _call(self, method):
+        if isinstance(self.session, AsyncSession):
+            return await method()
+        return await run_in_threadpool(method)
+
+def request_session_dependency(factory):
+    """建立 FastAPI dependency：每個 request 一個 RequestSession，response 完成後關閉"""
+    async def get_request_session():
+        request_session = RequestSession(factory)
+        try:
+            yield request_session
+        finally:
+            await request_session.close()
+    return get_request_session
+
+get_request_session = request_session_dependency(session_factory)
+
+async def stream_scalars(factory, statement, batch_size: int = 100):
+    """以 server-side cursor (yield_per) 分批讀取，每次 yield 一批 ORM 物件，不會一次載入整張表
+
+    batch 在 session 關閉前交出，呼叫端應在下一次迭代前用完 (轉成輸出型別)
+    """
+    statement = statement.execution_options(yield_per=batch_size)
+    if isinstance(factory, async_sessionmaker):
+        async with factory() as session:
+            result = await session.stream_scalars(statement)
+            async for batch in result.partitions():
+                yield batch
+        return
+
+    session = factory()
+    try:
+        result = await run_in_threadpool(session.scalars, statement)
+        partitions = result.partitions()
+        while True:
+            batch = await run_in_threadpool(next, partitions, None)
+            if batch is None:
+                break
+            yield batch
+    finally:
+        await run_in_threadpool(session.close)
@@ -0,0 +1,114 @@
+"""Automatic Persisted Queries (APQ)
+
+client 只送 query 的 sha256，server 從 store 取回完整的 query：
+1. 送 {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": "..."}}}
+2. store 找不到時回傳 PersistedQueryNotFound，client 再連同 query 一起送一次完成註冊
+"""
+import hashlib
+import json
+
+from graphql import GraphQLError
+from strawberry.asgi import GraphQL
+from strawberry.fastapi import GraphQLRouter
+from strawberry.http import GraphQLRequestData
+from strawberry.http.exceptions import HTTPException
+from strawberry.http.parse_content_type import parse_content_type
+from strawberry.types import ExecutionResult
+
+from cache.backend import LRUCache
+from handler.serializer import FastJSONMixin
+
+APQ_VERSION = 1
+
+
+class PersistedQueryError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+class PersistedQueryMixin:
+    """覆寫 strawberry view 的 request 解析，在執行前把 hash 換回 query"""
+    def __init__(self, *args, persisted_query_store=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.persisted_query_store = persisted_query_store or LRUCache(maxsize=1000)
+
+    def should_render_graphql_ide(self, request) -> bool:
+        # GET 只帶 hash 沒有 query 時是 APQ 查詢，不是要開 GraphiQL
+        if request.method == "GET" and request.query_params.get("extensions") is not None:
+            return False
+        return super().should_render_graphql_ide(request)
+
+    async def parse_http_body(self, request) -> GraphQLRequestData:
+        content_type, _ = parse_content_type(request.content_type or "")
+        if request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+            if isinstance(data.get("extensions"), str):
+                try:
+                    data["extensions"] = json.loads(data["extensions"])
+                except json.JSONDecodeError:
+                    raise HTTPException(400, "Unable to parse extensions as JSON")
+        elif "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        else:
+            # multipart 上傳等其他格式不支援 APQ
+            return await super().parse_http_body(request)
+
+        if not isinstance(data, dict):
+            raise HTTPException(400, "Unsupported request body")
+
+        accept = {key.lower(): value for key, value in request.headers.items()}.get("accept", "")
+        protocol = "multipart-subscription" if self._is_multipart_subscriptions(*parse_content_type(accept)) else "http"
+
+        return GraphQLRequestData(
+            query=self.resolve_persisted_query(data),
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+            protocol=protocol,
+        )
+
+    def resolve_persisted_query(self, data: dict):
+        query = data.get("query")
+        extensions = data.get("extensions") or {}
+        if not isinstance(extensions, dict):
+            raise HTTPException(400, "extensions must be an object")
+        persisted_query = extensions.get("persistedQuery")
+        if not persisted_query:
+            return query
+        if not isinstance(persisted_query, dict):
+            raise HTTPException(400, "extensions.persistedQuery must be an object")
+
+        if persisted_query.get("version") != APQ_VERSION:
+            raise PersistedQueryError("Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED")
+        query_hash = persisted_query.get("sha256Hash")
+        # 沒有 hash 時 store.get(None) 在 redis 上會丟 TypeError
+        if not isinstance(query_hash, str) or not query_hash:
+            raise PersistedQueryError("persistedQuery requires a sha256Hash string", "BAD_USER_INPUT")
+        if query is not None and not isinstance(query, str):
+            raise HTTPException(400, "query must be a string")
+
+        if query is None:
+            query = self.persisted_query_store.get(query_hash)
+            if query is None:
+                raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+            return query
+
+        # 註冊前確認 hash 與 query 相符，避免被寫入錯誤的對應
+        if hashlib.sha256(query.encode("utf-8")).hexdigest() != query_hash:
+            raise PersistedQueryError("provided sha does not match query", "BAD_USER_INPUT")
+        self.persisted_query_store.set(query_hash, query)
+        return query
+
+    async def execute_operation(self, request, context, root_value):
+        try:
+            return await super().execute_operation(request, context, root_value)
+        except PersistedQueryError as e:
+            return ExecutionResult(data=None, errors=[GraphQLError(str(e), extensions={"code": e.code})])
+
+
+class APQGraphQLRouter(PersistedQueryMixin, FastJSONMixin, GraphQLRouter):
+    pass
+
+
+class APQGraphQL(PersistedQueryMixin, FastJSONMixin, GraphQL):
+    pass
@@ -0,0 +1,149 @@
+from typing import Dict, Iterator, Optional, Sequence
+
+from graphql import (
+    ExecutionResult as GraphQLExecutionResult,
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    OperationDefinitionNode,
+    OperationType,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+    is_list_type,
+    value_from_ast,
+)
+from graphql.utilities import get_operation_root_type
+from strawberry.extensions import SchemaExtension
+
+
+class QueryCostExtension(SchemaExtension):
+    """執行前估算 query 成本與深度，超過上限直接拒絕，不會打到 DB
+
+    cost(field) = list 倍數 * (weight + cost(子欄位))
+    - weight: field_weights["Type.field"]，預設物件欄位 1、純量欄位 0
+    - list 倍數: 取 list_size_arguments (limit / first / last) 的值，沒有時用 list_sizes["Type.field"]，
+      再沒有才用 default_list_size；沒有 limit 參數、會回傳整張表的欄位應在 list_sizes 給一個夠大的值
+      connection 這類非 list 欄位帶 first / last 時，倍數會套用到底下的 list 欄位 (edges)
+      分批推送的 subscription (例如 streamPosts) 以 limit 作為全部批次合計的倍數
+
+    計算出的成本會放在 response 的 extensions.cost
+    """
+    def __init__(self, *,
+                 execution_context=None,
+                 max_cost: int = 1000,
+                 max_depth: int = 10,
+                 field_weights: Optional[Dict[str, int]] = None,
+                 default_list_size: int = 10,
+                 list_sizes: Optional[Dict[str, int]] = None,
+                 list_size_arguments: Sequence[str] = ("limit", "first", "last")):
+        self.execution_context = execution_context
+        self.max_cost = max_cost
+        self.max_depth = max_depth
+        self.field_weights = field_weights or {}
+        self.default_list_size = default_list_size
+        self.list_sizes = list_sizes or {}
+        self.list_size_arguments = list_size_arguments
+        self.cost = None
+        self.depth = None
+
+    def on_execute(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        operation = self.get_operation()
+        if operation is not None:
+            self.fragments = {
+                definition.name.value: definition
+                for definition in execution_context.graphql_document.definitions
+                if not isinstance(definition, OperationDefinitionNode)
+            }
+            self.variables = execution_context.variables or {}
+            schema = execution_context.schema._schema
+            root_type = get_operation_root_type(schema, operation)
+            self.cost, self.depth = self.selection_set_cost(root_type, operation.selection_set, 0)
+
+            error = None
+            if self.depth > self.max_depth:
+                error = f"Query depth {self.depth} exceeds the maximum depth of {self.max_depth}"
+            elif self.cost > self.max_cost:
+                error = f"Query cost {self.cost} exceeds the maximum cost of {self.max_cost}"
+            if error:
+                error = GraphQLError(error, extensions={"code": "QUERY_TOO_COMPLEX"})
+                if operation.operation == OperationType.SUBSCRIPTION:
+                    # subscription 不看預先放入的 result，on_execute 拋出的錯誤會直接回給 client
+                    raise error
+                # 預先放入 result，strawberry 就不會執行 resolver
+                execution_context.result = GraphQLExecutionResult(data=None, errors=[error])
+        yield
+
+    def get_results(self) -> Dict[str, dict]:
+        if self.cost is None:
+            return {}
+        return {"cost": {"requested": self.cost, "maximum": self.max_cost, "depth": self.depth}}
+
+    def get_operation(self) -> Optional[OperationDefinitionNode]:
+        document = self.execution_context.graphql_document
+        if document is None:
+            return None
+        operation_name = self.execution_context.operation_name
+        for definition in document.definitions:
+            if isinstance(definition, OperationDefinitionNode) and (
+                    operation_name is None or (definition.name and definition.name.value == operation_name)):
+                return definition
+        return None
+
+    def selection_set_cost(self, parent_type, selection_set, depth: int, size_hint: Optional[int] = None):
+        """回傳 (cost, depth)；union / interface 的各個 fragment 成本直接相加 (取上限)"""
+        cost, max_depth = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field_cost(parent_type, selection, depth, size_hint)
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.execution_context.schema._schema.get_type(selection.type_condition.name.value)
+                field_cost, field_depth = self.selection_set_cost(fragment_type, selection.selection_set, depth, size_hint)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                fragment_type = self.execution_context.schema._schema.get_type(fragment.type_condition.name.value)
+                field_cost, field_depth = self.selection_set_cost(fragment_type, fragment.selection_set, depth, size_hint)
+            else:
+                continue
+            cost += field_cost
+            max_depth = max(max_depth, field_depth)
+        return cost, max_depth
+
+    def field_cost(self, parent_type, node: FieldNode, depth: int, size_hint: Optional[int] = None):
+        name = node.name.value
+        fields = getattr(parent_type, "fields", None)
+        if name.startswith("__") or not fields or name not in fields:
+            return 0, depth
+        field = fields[name]
+        return_type = get_named_type(field.type)
+        if not is_composite_type(return_type) or node.selection_set is None:
+            return self.field_weights.get(f"{parent_type.name}.{name}", 0), depth
+
+        weight = self.field_weights.get(f"{parent_type.name}.{name}", 1)
+        size = self.list_size(field, node)
+        if is_list_type(get_nullable_type(field.type)):
+            multiplier = size or size_hint or self.list_sizes.get(f"{parent_type.name}.{name}", self.default_list_size)
+            children_cost, children_depth = self.selection_set_cost(return_type, node.selection_set, depth + 1)
+        else:
+            multiplier = 1
+            children_cost, children_depth = self.selection_set_cost(return_type, node.selection_set, depth + 1, size)
+        return multiplier * (weight + children_cost), children_depth
+
+    def list_size(self, field, node: FieldNode) -> Optional[int]:
+        arguments = {argument.name.value: argument for argument in node.arguments or ()}
+        for name in self.list_size_arguments:
+            if name not in field.args:
+                continue
+            if name in arguments:
+                value = value_from_ast(arguments[name].value, field.args[name].type, self.variables)
+            else:
+                value = field.args[name].default_value
+            if isinstance(value, int):
+                return max(value, 0)
+        return None
@@ -0,0 +1,44 @@
+import hashlib
+from typing import Iterator
+
+from strawberry.extensions import SchemaExtension
+
+from cache.backend import LRUCache
+
+
+class DocumentCacheExtension(SchemaExtension):
+    """快取 parse + validate 過的 DocumentNode，相同 query 字串不再重新 parse / validate
+
+    cache 由外部傳入並跨 request 共用，extension 本身每個 request 建立一次
+    (strawberry 會把 execution_context 設在 extension 上，共用 instance 在併發時不安全)：
+
+        schema = strawberry.Schema(..., extensions=[partial(DocumentCacheExtension, cache=document_cache)])
+
+    只快取驗證通過的 document，錯誤的 query 每次都重新驗證以回傳完整錯誤訊息
+    """
+    def __init__(self, *, execution_context=None, cache: LRUCache):
+        self.execution_context = execution_context
+        self.cache = cache
+        self.key = None
+        self.hit = False
+
+    def on_parse(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        self.key, self.hit = None, False
+        if execution_context.query:
+            self.key = hashlib.sha256(execution_context.query.encode("utf-8")).hexdigest()
+            document = self.cache.get(self.key)
+            if document is not None:
+                # 已有 document 時 strawberry 會略過 parse
+                execution_context.graphql_document = document
+                self.hit = True
+        yield
+
+    def on_validate(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        if self.hit:
+            # errors 不是 None 時 strawberry 會略過 validation
+            execution_context.errors = []
+        yield
+        if not self.hit and self.key and not execution_context.errors:
+            self.cache.set(self.key, execution_context.graphql_document)
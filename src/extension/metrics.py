@@ -0,0 +1,125 @@
+import os
+import time
+from inspect import isawaitable
+from typing import Any, AsyncIterator, Callable, Collection, Dict, Optional, Set
+
+from graphql import GraphQLResolveInfo
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY,
+                               generate_latest, multiprocess)
+from starlette.responses import Response
+from strawberry.extensions import SchemaExtension
+from strawberry.extensions.tracing.utils import should_skip_tracing
+
+from handler.sql_stats import collect_sql
+
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+OPERATION_DURATION = Histogram(
+    "graphql_operation_duration_seconds", "GraphQL operation latency",
+    ["operation_type", "operation_name"])
+OPERATION_ERRORS = Counter(
+    "graphql_operation_errors_total", "Errors returned in GraphQL responses",
+    ["operation_type", "operation_name"])
+FIELD_DURATION = Histogram(
+    "graphql_field_duration_seconds", "Resolver latency per field", ["field"])
+FIELD_ERRORS = Counter(
+    "graphql_field_errors_total", "Exceptions raised by resolvers", ["field"])
+OPERATION_SQL_STATEMENTS = Histogram(
+    "graphql_operation_sql_statements", "SQL statements executed per GraphQL operation",
+    ["operation_type", "operation_name"], buckets=SQL_COUNT_BUCKETS)
+OPERATION_SQL_DURATION = Histogram(
+    "graphql_operation_sql_duration_seconds", "Total SQL time per GraphQL operation",
+    ["operation_type", "operation_name"])
+
+
+class MetricsExtension(SchemaExtension):
+    """記錄每個 operation / resolver 的延遲與錯誤數，以及每個 operation 執行的 SQL 數量與時間 (Prometheus)
+
+    - 只計時自訂 resolver 的欄位，預設 resolver (直接讀屬性) 與 introspection 不計，開銷很小可以在 production 開著
+    - SQL 由 handler.sql_stats 的 cursor event 統計，engine 需先 instrument_engine()
+    - operation_name 沒有名稱時為 "anonymous"；名稱由 client 決定，為了不讓 time series 無限增加：
+      有設定 operation_names 時只記錄清單內的名稱，否則只記錄最先出現的 max_operation_names 個，其餘都是 "other"
+    """
+    # (型別, 欄位) -> "Type.field" 或 None (不計時)，所有 request 共用
+    _field_labels: Dict[tuple, Any] = {}
+    # 已經當作 label 的 operation 名稱，所有 request 共用
+    _operation_names: Set[str] = set()
+
+    def __init__(self, *, execution_context=None,
+                 operation_names: Optional[Collection[str]] = None,
+                 max_operation_names: int = 100):
+        self.execution_context = execution_context
+        self.allowed_operation_names = set(operation_names) if operation_names else None
+        self.max_operation_names = max_operation_names
+
+    async def on_operation(self) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        with collect_sql() as sql:
+            yield
+        labels = self.operation_labels()
+        OPERATION_DURATION.labels(*labels).observe(time.perf_counter() - start)
+        OPERATION_SQL_STATEMENTS.labels(*labels).observe(sql.count)
+        OPERATION_SQL_DURATION.labels(*labels).observe(sql.seconds)
+        result = self.execution_context.result
+        if result is not None and result.errors:
+            OPERATION_ERRORS.labels(*labels).inc(len(result.errors))
+
+    def resolve(self, _next: Callable, root: Any, info: GraphQLResolveInfo, *args, **kwargs) -> Any:
+        field = self.field_label(_next, info)
+        if field is None:
+            return _next(root, info, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = _next(root, info, *args, **kwargs)
+        except Exception:
+            FIELD_ERRORS.labels(field).inc()
+            raise
+        if isawaitable(result):
+            return self.observe_async(result, field, start)
+        FIELD_DURATION.labels(field).observe(time.perf_counter() - start)
+        return result
+
+    async def observe_async(self, result, field: str, start: float) -> Any:
+        try:
+            return await result
+        except Exception:
+            FIELD_ERRORS.labels(field).inc()
+            raise
+        finally:
+            FIELD_DURATION.labels(field).observe(time.perf_counter() - start)
+
+    def field_label(self, _next: Callable, info: GraphQLResolveInfo):
+        key = (info.parent_type.name, info.field_name)
+        if key not in self._field_labels:
+            self._field_labels[key] = None if should_skip_tracing(_next, info) else f"{key[0]}.{key[1]}"
+        return self._field_labels[key]
+
+    def operation_labels(self) -> tuple:
+        execution_context = self.execution_context
+        try:
+            operation_type = execution_context.operation_type.value
+        except Exception:
+            # parse 失敗等情況沒有 operation
+            operation_type = "unknown"
+        return operation_type, self.operation_label(execution_context.operation_name)
+
+    def operation_label(self, name: Optional[str]) -> str:
+        if not name:
+            return "anonymous"
+        if self.allowed_operation_names is not None:
+            return name if name in self.allowed_operation_names else "other"
+        known = self._operation_names
+        if name not in known:
+            if len(known) >= self.max_operation_names:
+                return "other"
+            known.add(name)
+        return name
+
+
+def metrics_response() -> Response:
+    """Prometheus text format；多個 worker process 時設定 PROMETHEUS_MULTIPROC_DIR 彙整所有 process 的數值"""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+from typing import AsyncIterator, Callable, Collection, Dict, Optional, Tuple
+
+from graphql import (
+    ExecutionResult as GraphQLExecutionResult,
+    OperationDefinitionNode,
+    get_named_type,
+    get_nullable_type,
+    is_abstract_type,
+    is_list_type,
+    print_ast,
+)
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+from handler.serializer import dumps, loads
+
+TAGS_CONTEXT_KEY = "response_cache_tags"
+
+
+class ResponseCacheExtension(SchemaExtension):
+    """read query 的整份結果快取，key 為 正規化後的 query + operationName + variables
+
+    執行時記錄結果碰到的實體，當作 cache 的 tag：
+    - "UserType:1": 結果裡出現過 id=1 的 UserType
+    - "PostType": 結果裡有 PostType 的 list (新增 / 刪除 post 時要失效)
+    - references: 欄位內容來自另一個實體時 (例如 PostType.authorName 來自作者)，
+      以 {"PostType.authorName": ("UserType", "author_id")} 加上 "UserType:{root.author_id}"
+    mutation 完成後呼叫 cache.invalidate([...tags]) 讓相關的結果失效
+
+    cache 需提供 aget / aset(key, value, tags, version) / aversion / ainvalidate(tags)，見 cache.backend；
+    讀取前記下 version，期間結果的 tag 被 invalidate 過時不寫回快取
+    on_repopulate(context): 要重建的 key 剛被 invalidate 過時呼叫，例如讓這次讀取走 primary，
+    避免從還沒同步的 replica 讀到舊資料後寫回快取 (之後不會再有 invalidate 把它清掉)
+    """
+    def __init__(self, *,
+                 execution_context=None,
+                 cache,
+                 entity_types: Collection[str] = (),
+                 collection_types: Optional[Dict[str, str]] = None,
+                 references: Optional[Dict[str, Tuple[str, str]]] = None,
+                 skip_root_fields: Collection[str] = (),
+                 on_repopulate: Optional[Callable[[dict], None]] = None):
+        self.execution_context = execution_context
+        self.cache = cache
+        self.entity_types = set(entity_types)
+        # 不是 list 但代表一整個集合的型別 (例如 connection) -> 對應的 tag
+        self.collection_types = collection_types or {}
+        # "Type.field" -> (被參照的型別, root 上存放其 id 的屬性)
+        self.references = references or {}
+        self.skip_root_fields = set(skip_root_fields)
+        self.on_repopulate = on_repopulate
+        self.key = None
+        self.hit = None
+        self.version = None
+
+    async def on_execute(self) -> AsyncIterator[None]:
+        execution_context = self.execution_context
+        self.key, self.hit, self.version = None, None, None
+        if self.is_cacheable():
+            self.key = self.cache_key()
+            # 在查 DB 之前取 version，之後的 invalidate 都會讓這次的結果不寫入
+            self.version = await self.cache.aversion()
+            cached = await self.cache.aget(self.key)
+            self.hit = cached is not None
+            if self.hit:
+                execution_context.result = GraphQLExecutionResult(data=loads(cached), errors=None)
+            else:
+                # resolver 執行時把碰到的實體記錄在 context 上 (見 resolve)
+                execution_context.context[TAGS_CONTEXT_KEY] = set()
+                if self.on_repopulate is not None and await self.cache.arecently_invalidated(self.key):
+                    self.on_repopulate(execution_context.context)
+        yield
+        if self.hit is False:
+            tags = execution_context.context.pop(TAGS_CONTEXT_KEY, set())
+            result = execution_context.result
+            if result is not None and not result.errors:
+                await self.cache.aset(self.key, dumps(result.data).decode("utf-8"), tags, self.version)
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        # strawberry 會把第一個 extension instance 快取成 middleware，所以狀態一律放在 context
+        context = info.context
+        tags = context.get(TAGS_CONTEXT_KEY) if isinstance(context, dict) else None
+        if tags is not None:
+            parent_name = info.parent_type.name
+            if parent_name in self.entity_types and getattr(root, "id", None) is not None:
+                tags.add(f"{parent_name}:{root.id}")
+            reference = self.references.get(f"{parent_name}.{info.field_name}")
+            if reference is not None and getattr(root, reference[1], None) is not None:
+                tags.add(f"{reference[0]}:{getattr(root, reference[1])}")
+            return_type = get_nullable_type(info.return_type)
+            if get_named_type(return_type).name in self.collection_types:
+                tags.add(self.collection_types[get_named_type(return_type).name])
+            elif is_list_type(return_type):
+                named_type = get_named_type(return_type)
+                possible_types = info.schema.get_possible_types(named_type) if is_abstract_type(named_type) else [named_type]
+                tags.update(t.name for t in possible_types if t.name in self.entity_types)
+        return _next(root, info, *args, **kwargs)
+
+    def get_results(self) -> Dict[str, dict]:
+        if self.hit is None:
+            return {}
+        return {"responseCache": {"hit": self.hit}}
+
+    def is_cacheable(self) -> bool:
+        execution_context = self.execution_context
+        # 已經有結果 (例如被成本檢查擋下) 就不走 cache
+        if execution_context.result is not None:
+            return False
+        if execution_context.operation_type != OperationType.QUERY:
+            return False
+        if not isinstance(execution_context.context, dict):
+            return False
+        for definition in execution_context.graphql_document.definitions:
+            if isinstance(definition, OperationDefinitionNode):
+                for selection in definition.selection_set.selections:
+                    if getattr(selection, "name", None) and selection.name.value in self.skip_root_fields:
+                        return False
+        return True
+
+    def cache_key(self) -> str:
+        execution_context = self.execution_context
+        raw = json.dumps([
+            print_ast(execution_context.graphql_document),
+            execution_context.operation_name,
+            execution_context.variables or {},
+        ], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,81 @@
+import math
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+from starlette.responses import Response
+from strawberry.extensions import SchemaExtension
+from strawberry.types.graphql import OperationType
+
+from database import RequestSession
+
+
+class RequestSessionExtension(SchemaExtension):
+    """每個 GraphQL operation 一個 DB session，放在 context[context_key]，operation 結束時關閉
+
+    websocket 連線只呼叫一次 context getter，同一條連線的所有 operation 共用那個 dict；
+    所以每個 operation 改用自己的 context (複製後放入新的 RequestSession 與 per_operation(session) 的值，
+    例如 DataLoader)，快取與連線都不會跨 operation
+    subscription 的 operation 涵蓋整個推送過程，最後一筆送出後才關閉
+    mutation 整個 operation 都走 primary，query / subscription 讀 replica (見 database.RoutingSession)
+
+    sticky_seconds > 0 時跨 request 的 read-your-writes：HTTP mutation 的 response 會設定 cookie
+    (sticky_cookie，值為到期的 unix time)，之後 sticky_seconds 秒內帶著 cookie 的 request 都讀 primary，
+    不會讀到 replica 還沒同步的舊資料；超過 sticky_seconds 的到期時間視為偽造，不予理會
+    """
+    def __init__(self, *, execution_context=None, factory, context_key: str = "db",
+                 per_operation: Optional[Callable[[RequestSession], dict]] = None,
+                 sticky_seconds: float = 0, sticky_cookie: str = "db_primary_until"):
+        self.execution_context = execution_context
+        self.factory = factory
+        self.context_key = context_key
+        self.per_operation = per_operation
+        self.sticky_seconds = sticky_seconds
+        self.sticky_cookie = sticky_cookie
+
+    async def on_operation(self) -> AsyncIterator[None]:
+        context = self.execution_context.context
+        request_session = None
+        if isinstance(context, dict):
+            request_session = RequestSession(self.factory)
+            if self.is_sticky(context.get("request")):
+                request_session.use_primary()
+            self.execution_context.context = {
+                **context,
+                self.context_key: request_session,
+                **(self.per_operation(request_session) if self.per_operation else {}),
+            }
+        try:
+            yield
+        finally:
+            if request_session is not None:
+                await request_session.close()
+
+    def on_execute(self) -> Iterator[None]:
+        execution_context = self.execution_context
+        context = execution_context.context
+        is_mutation = execution_context.operation_type == OperationType.MUTATION and isinstance(context, dict)
+        if is_mutation:
+            request_session = context.get(self.context_key)
+            if request_session is not None:
+                request_session.use_primary()
+        yield
+        if is_mutation:
+            self.stick_to_primary(context.get("response"))
+
+    def is_sticky(self, request) -> bool:
+        if self.sticky_seconds <= 0 or request is None:
+            return False
+        try:
+            until = float(request.cookies.get(self.sticky_cookie))
+        except (TypeError, ValueError):
+            return False
+        now = time.time()
+        return now < until <= now + self.sticky_seconds
+
+    def stick_to_primary(self, response):
+        # websocket 的 context["response"] 是 WebSocket，無法設定 cookie
+        if self.sticky_seconds <= 0 or not isinstance(response, Response):
+            return
+        until = time.time() + self.sticky_seconds
+        response.set_cookie(self.sticky_cookie, f"{until:.3f}", max_age=math.ceil(self.sticky_seconds),
+                            httponly=True, samesite="lax")
@@ -0,0 +1,88 @@
+from inspect import isawaitable
+from typing import Any, AsyncIterator, Callable, Optional
+
+from graphql import GraphQLError, GraphQLResolveInfo
+from strawberry.extensions import SchemaExtension
+from strawberry.extensions.utils import get_path_from_info
+
+from handler.sql_stats import SQLStats, collect_sql, current_sql_stats, sql_path
+
+
+class SQLTraceExtension(SchemaExtension):
+    """debug 用：把這個 operation 執行的 SQL 放到 response 的 extensions.sqlTrace
+
+    - statements: 每一句 SQL、秒數與發出它的 resolver 路徑 (list index 省略，例如 usersConnection.edges.node.posts)
+    - nPlusOne: 同一個 shape (只差在參數) 執行 n_plus_one_threshold 次以上的 SQL
+    - statement_budget: SQL 數量超過時在 errors 加上 SQL_BUDGET_EXCEEDED，測試可以直接以 errors 判斷失敗
+
+    enabled=True 時每個 request 都 trace；否則 request 帶 header (預設 X-SQL-Trace) 才 trace
+    header=None 時不接受 header (production 不應讓 client 看到 SQL)
+    engine 需先 handler.sql_stats.instrument_engine()
+    """
+    def __init__(self, *,
+                 execution_context=None,
+                 enabled: bool = False,
+                 header: Optional[str] = "x-sql-trace",
+                 statement_budget: Optional[int] = None,
+                 n_plus_one_threshold: int = 3):
+        self.execution_context = execution_context
+        self.enabled = enabled
+        self.header = header
+        self.statement_budget = statement_budget
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.stats: Optional[SQLStats] = None
+
+    async def on_operation(self) -> AsyncIterator[None]:
+        if not self.is_enabled():
+            yield
+            return
+        # MetricsExtension 已經在統計時共用同一個 SQLStats
+        with collect_sql(current_sql_stats()) as stats:
+            stats.trace()
+            self.stats = stats
+            yield
+        result = self.execution_context.result
+        if self.statement_budget is not None and stats.count > self.statement_budget and result is not None:
+            error = GraphQLError(
+                f"Executed {stats.count} SQL statements, exceeding the budget of {self.statement_budget}",
+                extensions={"code": "SQL_BUDGET_EXCEEDED"})
+            result.errors = [*(result.errors or []), error]
+
+    def resolve(self, _next: Callable, root: Any, info: GraphQLResolveInfo, *args, **kwargs) -> Any:
+        # strawberry 會把第一個 extension instance 快取成 middleware，是否 trace 看目前 context 的 SQLStats
+        stats = current_sql_stats()
+        if stats is None or stats.statements is None:
+            return _next(root, info, *args, **kwargs)
+        path = ".".join(str(key) for key in get_path_from_info(info) if not isinstance(key, int))
+        with sql_path(path):
+            result = _next(root, info, *args, **kwargs)
+        if isawaitable(result):
+            return self.resolve_async(result, path)
+        return result
+
+    async def resolve_async(self, result, path: str) -> Any:
+        with sql_path(path):
+            return await result
+
+    def get_results(self) -> dict:
+        if self.stats is None:
+            return {}
+        stats = self.stats
+        return {"sqlTrace": {
+            "count": stats.count,
+            "seconds": round(stats.seconds, 6),
+            "budget": self.statement_budget,
+            "statements": [{**item, "seconds": round(item["seconds"], 6)} for item in stats.statements],
+            "nPlusOne": [{**group, "seconds": round(group["seconds"], 6)}
+                         for group in stats.repeated_statements(self.n_plus_one_threshold)],
+        }}
+
+    def is_enabled(self) -> bool:
+        if self.enabled:
+            return True
+        if self.header is None:
+            return False
+        context = self.execution_context.context
+        request = context.get("request") if isinstance(context, dict) else getattr(context, "request", None)
+        value = request.headers.get(self.header) if request is not None else None
+        return value is not None and value.lower() not in ("", "0", "false")
@@ -0,0 +1,48 @@
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+BULK_CHUNK_SIZE = 1000
+
+
+def bulk_insert(db: Session,
+                model,
+                rows: List[Tuple[int, dict]],
+                chunk_size: int = BULK_CHUNK_SIZE) -> Tuple[Dict[int, object], List[Tuple[int, str]]]:
+    """分批以 INSERT ... RETURNING (executemany) 寫入，整個 list 在呼叫端的同一個 transaction 內
+
+    rows: [(輸入的 index, 欄位值)]
+    回傳 ({index: 寫入的 ORM 物件}, [(index, 錯誤訊息)])
+    每批包在 SAVEPOINT 裡，失敗時只把那一批逐筆重試，找出有問題的項目，其餘照常寫入
+    """
+    inserted, errors = {}, []
+    # 不用 sort_by_parameter_order：SQLite 等沒有 sentinel 的情況會退回一筆一個 INSERT
+    statement = insert(model).returning(model)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            with db.begin_nested():
+                objects = db.scalars(statement, [values for _, values in chunk]).all()
+            inserted.update(match_returned(chunk, objects))
+        except SQLAlchemyError:
+            for index, values in chunk:
+                try:
+                    with db.begin_nested():
+                        inserted[index] = db.scalars(statement, [values]).one()
+                except SQLAlchemyError as e:
+                    errors.append((index, str(getattr(e, "orig", None) or e)))
+    return inserted, errors
+
+def match_returned(chunk: List[Tuple[int, dict]], objects: list) -> Dict[int, object]:
+    """RETURNING 的順序不保證與參數相同，以寫入的欄位值對回輸入的 index
+
+    欄位值完全相同的項目彼此可以互換，依序分配即可
+    """
+    names = sorted(chunk[0][1])
+    pending = defaultdict(deque)
+    for index, values in chunk:
+        pending[tuple(values[name] for name in names)].append(index)
+    return {pending[tuple(getattr(obj, name) for name in names)].popleft(): obj for obj in objects}
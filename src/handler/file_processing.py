@@ -0,0 +1,93 @@
+"""上傳檔案的處理流程 (在 rq worker 內執行)
+
+1. 依換行把檔案切成約 chunk_size 的區段 (大檔以 mmap 找換行，不需讀入記憶體)
+2. 每個區段交給 process pool，子 process 自己開檔讀取該區段並統計 bytes / lines / words
+3. 每完成一個區段就以處理完的 bytes 回報進度
+小檔案直接在目前的 process 串流處理，省下建立 process pool 的成本
+"""
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+PROCESS_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MiB
+PARALLEL_THRESHOLD = 32 * 1024 * 1024  # 小於此大小不開 process pool
+READ_BLOCK_SIZE = 1024 * 1024
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0")) or os.cpu_count() or 1
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def chunk_ranges(path: str, chunk_size: int = PROCESS_CHUNK_SIZE) -> List[Tuple[int, int]]:
+    """回傳 [(start, end)]，每段結尾都對齊在換行之後，一行不會被切到兩段"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges, start = [], 0
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = mm.find(b"\n", end - 1)
+                end = size if newline == -1 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def process_range(path: str, start: int, end: int) -> Dict[str, int]:
+    """統計 [start, end) 的 bytes / lines / words，區塊或區段邊界上被切開的字只算一次 (算在開頭的區段)"""
+    lines = words = 0
+    previous_ends_in_word = False
+    with open(path, "rb") as f:
+        if start > 0:
+            # 前一個區段結尾的字延續到這裡時，由前一個區段計算
+            f.seek(start - 1)
+            previous_ends_in_word = not f.read(1).isspace()
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            lines += block.count(b"\n")
+            words += len(block.split())
+            if previous_ends_in_word and not block[:1].isspace():
+                words -= 1
+            previous_ends_in_word = not block[-1:].isspace()
+    return {"bytes": end - start, "lines": lines, "words": words}
+
+def merge_results(results) -> Dict[str, int]:
+    total = {"bytes": 0, "lines": 0, "words": 0}
+    for result in results:
+        for key in total:
+            total[key] += result[key]
+    return total
+
+def process_file_chunks(path: str,
+                        on_progress: Optional[ProgressCallback] = None,
+                        workers: int = PROCESS_POOL_WORKERS,
+                        chunk_size: int = PROCESS_CHUNK_SIZE) -> Dict[str, int]:
+    """處理整個檔案並回傳統計結果；on_progress(processed_bytes, total_bytes) 在每段完成時呼叫"""
+    total = os.path.getsize(path)
+    ranges = chunk_ranges(path, chunk_size)
+    results, processed = [], 0
+
+    if total < PARALLEL_THRESHOLD or workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            results.append(process_range(path, start, end))
+            processed += end - start
+            if on_progress:
+                on_progress(processed, total)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            futures = {pool.submit(process_range, path, start, end): end - start for start, end in ranges}
+            for future in as_completed(futures):
+                results.append(future.result())
+                processed += futures[future]
+                if on_progress:
+                    on_progress(processed, total)
+
+    if on_progress and total == 0:
+        on_progress(0, 0)
+    return merge_results(results)
@@ -0,0 +1,55 @@
+import re
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Union
+
+# | --- | :---: | ---: | 這類分隔線
+SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+# 沒有被 \ 跳脫的 |
+CELL_SEPARATOR = re.compile(r"(?<!\\)\|")
+
+
+def split_cells(line: str) -> List[str]:
+    """| a | b | -> ["a", "b"]；外側的 | 可以省略，儲存格內的 \\| 是字面上的 |"""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in CELL_SEPARATOR.split(line)]
+
+def iter_lines(text: str) -> Iterator[str]:
+    """逐行切出字串，不像 split / StringIO 會先複製整份內容"""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+def iter_markdown_rows(source: Union[str, Iterable[str]]) -> Iterator[Dict[str, str]]:
+    """逐行解析 markdown 表格，一次 yield 一列 dict，不會建立整張表的 list
+
+    第一個非空行為欄位名稱，緊接在後的分隔線與空行略過 (之後像 | - | 的資料列照常輸出)；
+    source 可以是字串或逐行的 iterable (例如檔案)
+    """
+    lines = iter_lines(source) if isinstance(source, str) else source
+    columns = None
+    after_header = False
+    for line in lines:
+        if not line.strip():
+            continue
+        if columns is None:
+            columns = split_cells(line)
+            after_header = True
+            continue
+        if after_header:
+            after_header = False
+            if SEPARATOR_PATTERN.match(line.strip()):
+                continue
+        yield dict(zip(columns, split_cells(line)))
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,145 @@
+"""從 xlsx / csv / txt 大量匯入成員到 users (model.sqlalchemy.user.UserModel)
+
+- 逐列讀取，不會把整個檔案讀進記憶體 (xlsx 使用 openpyxl read_only 模式)
+- xlsx / csv 第一列為欄位名稱，需要 name (或 username) 欄，age 為選填
+- txt 每行一個名字，空行、# 開頭與 : 結尾的標題行 (例如 "our company members:") 略過
+- 檔案內重複的名字只匯入第一次出現的；DB 已存在的名字以 users.name 的 index 分批查詢後略過
+- 每 batch_size 列一個 transaction，以 executemany 寫入
+
+    cd src
+    DATABASE_URL=sqlite:///./test.db python -m handler.member_import ../docs/member.xlsx --batch-size 50000
+"""
+import argparse
+import csv
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from handler.markdown import batched
+from model.sqlalchemy.user import UserModel
+
+IMPORT_BATCH_SIZE = 10000
+# 單一 statement 的參數數量有上限 (SQLite 3.32 起為 32766)，IN (...) 分段查詢
+LOOKUP_CHUNK_SIZE = 5000
+NAME_COLUMNS = ("name", "username")
+
+
+def iter_xlsx_rows(path: str, sheet: Optional[str] = None) -> Iterator[Dict[str, object]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(cell).strip().lower() if cell is not None else "" for cell in header]
+        for row in rows:
+            yield dict(zip(columns, row))
+    finally:
+        # read_only 模式會保持檔案開啟
+        workbook.close()
+
+def iter_csv_rows(path: str) -> Iterator[Dict[str, object]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [column.strip().lower() for column in header]
+        for row in reader:
+            yield dict(zip(columns, row))
+
+def iter_txt_rows(path: str) -> Iterator[Dict[str, object]]:
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            name = line.strip()
+            if name and not name.startswith("#") and not name.endswith(":"):
+                yield {"name": name}
+
+READERS = {".xlsx": iter_xlsx_rows, ".csv": iter_csv_rows, ".txt": iter_txt_rows}
+
+def iter_rows(path: str, sheet: Optional[str] = None) -> Iterator[Dict[str, object]]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported file type {extension!r}, expected one of {', '.join(READERS)}")
+    return iter_xlsx_rows(path, sheet) if extension == ".xlsx" else READERS[extension](path)
+
+def normalize(row: Dict[str, object]) -> Optional[dict]:
+    """回傳 users 的欄位值，name 空白或 age 不是整數時回傳 None"""
+    name = next((row[column] for column in NAME_COLUMNS if row.get(column) is not None), None)
+    name = str(name).strip() if name is not None else ""
+    if not name:
+        return None
+    age = row.get("age")
+    if age is None or (isinstance(age, str) and not age.strip()):
+        return {"name": name, "age": None}
+    try:
+        return {"name": name, "age": int(age)}
+    except (TypeError, ValueError):
+        return None
+
+def existing_names(connection: Connection, names: List[str]) -> set:
+    found = set()
+    for chunk in batched(names, LOOKUP_CHUNK_SIZE):
+        found.update(connection.scalars(select(UserModel.name).where(UserModel.name.in_(chunk))))
+    return found
+
+def import_rows(engine: Engine, rows: Iterable[Dict[str, object]], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """回傳 read / inserted / duplicates (檔案內重複) / existing (DB 已存在) / invalid 的數量與耗時"""
+    if batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, got {batch_size}")
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "existing": 0, "invalid": 0}
+    seen = set()
+    started = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        stats["read"] += len(batch)
+        values = []
+        for row in batch:
+            item = normalize(row)
+            if item is None:
+                stats["invalid"] += 1
+            elif item["name"] in seen:
+                stats["duplicates"] += 1
+            else:
+                seen.add(item["name"])
+                values.append(item)
+        if not values:
+            continue
+        with engine.begin() as connection:
+            existing = existing_names(connection, [item["name"] for item in values])
+            values = [item for item in values if item["name"] not in existing]
+            if values:
+                connection.execute(insert(UserModel), values)
+        stats["existing"] += len(existing)
+        stats["inserted"] += len(values)
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["rows_per_second"] = round(stats["read"] / seconds) if seconds else None
+    return stats
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="xlsx / csv / txt 檔案")
+    parser.add_argument("--batch-size", type=positive_int, default=IMPORT_BATCH_SIZE, help="每個 transaction 寫入的列數")
+    parser.add_argument("--sheet", help="xlsx 的工作表名稱，預設為第一個")
+    args = parser.parse_args()
+
+    from database import Base, engine
+    Base.metadata.create_all(bind=engine)
+    stats = import_rows(engine, iter_rows(args.path, args.sheet), args.batch_size)
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import base64
+import binascii
+from typing import Optional
+
+import strawberry
+from sqlalchemy.orm import Query
+
+CURSOR_PREFIX = "cursor:"
+DEFAULT_PAGE_SIZE = 10
+
+
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    has_previous_page: bool
+    start_cursor: Optional[str] = None
+    end_cursor: Optional[str] = None
+
+
+def encode_cursor(id: int) -> str:
+    """對 client 而言 cursor 是不透明的字串，內容只是 base64 過的 id"""
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{id}".encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        if not value.startswith(CURSOR_PREFIX):
+            raise ValueError(cursor)
+        return int(value[len(CURSOR_PREFIX):])
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def keyset_page(query: Query,
+                id_column,
+                first: Optional[int] = None,
+                after: Optional[str] = None,
+                last: Optional[int] = None,
+                before: Optional[str] = None):
+    """以 keyset (WHERE id > ? ORDER BY id LIMIT n) 取一頁，不使用 OFFSET，頁數再深成本都一樣
+
+    多取一筆判斷是否還有下一頁 (last 時為上一頁)
+    回傳 (rows, page_info)，rows 依 id 由小到大排列
+    """
+    if first is not None and last is not None:
+        raise ValueError("Passing both `first` and `last` is not supported")
+    if (first is not None and first < 0) or (last is not None and last < 0):
+        raise ValueError("`first` and `last` must be non-negative")
+
+    if after:
+        query = query.filter(id_column > decode_cursor(after))
+    if before:
+        query = query.filter(id_column < decode_cursor(before))
+
+    if last is not None:
+        rows = query.order_by(id_column.desc()).limit(last + 1).all()
+        has_previous_page = len(rows) > last
+        rows = rows[:last][::-1]
+        has_next_page = before is not None
+    else:
+        size = first if first is not None else DEFAULT_PAGE_SIZE
+        rows = query.order_by(id_column).limit(size + 1).all()
+        has_next_page = len(rows) > size
+        rows = rows[:size]
+        has_previous_page = after is not None
+
+    page_info = PageInfo(
+        has_next_page=has_next_page,
+        has_previous_page=has_previous_page,
+        start_cursor=encode_cursor(rows[0].id) if rows else None,
+        end_cursor=encode_cursor(rows[-1].id) if rows else None,
+    )
+    return rows, page_info
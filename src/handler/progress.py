@@ -0,0 +1,165 @@
+"""任務進度的推播
+
+rq 任務:
+- worker 端: save_progress() 寫入 job.meta 後 publish 到 progress:<job_id>
+- app 端: 每個 process 只有一個 ProgressBroadcaster，用一條 pub/sub 連線接收事件，
+  再分送給同一個 process 內訂閱該 job 的所有 subscription；Redis 的負載與訂閱人數無關
+
+app 內的上傳進度 (fileUploadProgress) 使用 progress store:
+- MemoryProgressStore: 單一 process，asyncio.Condition 在值改變時喚醒 subscriber
+- RedisProgressStore: 多個 worker 共用，值存在 Redis 並透過 pub/sub 通知
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set, Union
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+PROGRESS_CHANNEL_PREFIX = "progress:"
+FILE_PROGRESS_PREFIX = "file_progress:"
+
+
+def progress_channel(job_id: str, prefix: str = PROGRESS_CHANNEL_PREFIX) -> str:
+    return f"{prefix}{job_id}"
+
+def publish_progress(connection: Redis, job_id: str, status: str, progress: Optional[int] = None):
+    connection.publish(progress_channel(job_id), json.dumps({"status": status, "progress": progress}))
+
+def save_progress(job, progress: int, **meta):
+    """worker 內更新進度：job.meta 保留給剛連上的 subscriber 讀取目前狀態，事件則即時推播
+
+    meta: 其他要一併寫入 job.meta 的欄位 (例如 processed_bytes)
+    """
+    job.meta.update(meta)
+    job.meta["progress"] = progress
+    job.save_meta()
+    publish_progress(job.connection, job.id, "started", progress)
+
+def publish_finished(job, connection: Redis, result):
+    """rq on_success callback"""
+    publish_progress(connection, job.id, "finished", 100)
+
+def publish_failed(job, connection: Redis, *exc_info):
+    """rq on_failure callback"""
+    publish_progress(connection, job.id, "failed", -1)
+
+
+class ProgressBroadcaster:
+    """一條 pub/sub 連線，依 job_id 分送事件給 process 內的所有 subscriber
+
+    第一個 subscriber 出現時才 SUBSCRIBE 該 job 的 channel (prefix + job_id)，最後一個離開時 UNSUBSCRIBE
+    """
+    def __init__(self, connection: AsyncRedis, prefix: str = PROGRESS_CHANNEL_PREFIX, queue_size: int = 100):
+        self.connection = connection
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """在讀取 job 目前狀態之前先訂閱，才不會漏掉中間的事件"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self._lock:
+            if self._pubsub is None:
+                self._pubsub = self.connection.pubsub()
+            subscribers = self._subscribers.setdefault(job_id, set())
+            if not subscribers:
+                await self._pubsub.subscribe(progress_channel(job_id, self.prefix))
+            subscribers.add(queue)
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                subscribers = self._subscribers.get(job_id, set())
+                subscribers.discard(queue)
+                if not subscribers:
+                    self._subscribers.pop(job_id, None)
+                    await self._pubsub.unsubscribe(progress_channel(job_id, self.prefix))
+
+    async def _listen(self):
+        while self._subscribers:
+            message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None or message["type"] != "message":
+                continue
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            event = json.loads(message["data"])
+            for queue in list(self._subscribers.get(channel[len(self.prefix):], ())):
+                if queue.full():
+                    # subscriber 太慢時丟掉最舊的事件，進度只需要最新值
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+
+class MemoryProgressStore:
+    """進度存在 process 內，值改變時以 asyncio.Condition 喚醒等待的 subscriber (單一 worker 使用)"""
+    def __init__(self):
+        self._values: Dict[str, int] = {}
+        self._condition = asyncio.Condition()
+
+    async def get(self, key: str) -> Optional[int]:
+        return self._values.get(key)
+
+    async def set(self, key: str, value: int):
+        async with self._condition:
+            self._values[key] = value
+            self._condition.notify_all()
+
+    async def watch(self, key: str) -> AsyncIterator[Optional[int]]:
+        """先回傳目前的值，之後每次值改變時回傳新值"""
+        async with self._condition:
+            value = self._values.get(key)
+        yield value
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self._values.get(key) != value)
+                value = self._values.get(key)
+            yield value
+
+
+class RedisProgressStore:
+    """進度存在 Redis，多個 worker 共用；set 時 publish，訂閱端透過 ProgressBroadcaster 收到後喚醒
+
+    ttl: 秒數，避免沒有完成的上傳永遠留在 Redis
+    """
+    def __init__(self, connection: AsyncRedis, broadcaster: Optional[ProgressBroadcaster] = None,
+                 prefix: str = FILE_PROGRESS_PREFIX, ttl: Optional[int] = 86400):
+        self.connection = connection
+        self.prefix = prefix
+        self.broadcaster = broadcaster or ProgressBroadcaster(connection, prefix=prefix)
+        self.ttl = ttl
+
+    async def get(self, key: str) -> Optional[int]:
+        return self._decode(await self.connection.get(self._value_key(key)))
+
+    async def set(self, key: str, value: int):
+        pipe = self.connection.pipeline()
+        pipe.set(self._value_key(key), value, ex=self.ttl)
+        pipe.publish(progress_channel(key, self.prefix), json.dumps({"progress": value}))
+        await pipe.execute()
+
+    async def watch(self, key: str) -> AsyncIterator[Optional[int]]:
+        # 先訂閱再讀目前的值，才不會漏掉中間的更新
+        async with self.broadcaster.subscribe(key) as events:
+            value = await self.get(key)
+            yield value
+            while True:
+                event = await events.get()
+                if event["progress"] != value:
+                    value = event["progress"]
+                    yield value
+
+    def _value_key(self, key: str) -> str:
+        return f"{self.prefix}value:{key}"
+
+    @staticmethod
+    def _decode(value: Union[bytes, str, None]) -> Optional[int]:
+        return None if value is None else int(value)
@@ -0,0 +1,77 @@
+from typing import Collection, Dict, List, Optional, Set
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from strawberry.types.nodes import SelectedField, Selection
+from strawberry.utils.str_converters import to_snake_case
+
+
+def field_selections(selected_fields: List[Selection]) -> List[Selection]:
+    """取出目前 resolver 回傳型別底下被選取的欄位 (合併 alias / 重複節點)"""
+    return [s for field in selected_fields if isinstance(field, SelectedField) for s in field.selections]
+
+def selected_field_names(selections: List[Selection], type_names: Optional[Collection[str]] = None) -> Set[str]:
+    """展開 fragment / inline fragment，回傳被選取的 GraphQL 欄位名稱
+
+    type_names: union / interface 時只保留 type condition 符合的 fragment
+    """
+    names = set()
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            names.add(selection.name)
+        elif type_names is None or selection.type_condition in (None, *type_names):
+            names |= selected_field_names(selection.selections, type_names)
+    return names
+
+def nested_selections(selections: List[Selection], *path: str) -> List[Selection]:
+    """沿著欄位名稱往下取 selections，例如 connection 的 edges -> node"""
+    for name in path:
+        selections = [s for field in _fields(selections) if field.name == name for s in field.selections]
+    return selections
+
+def _fields(selections: List[Selection]):
+    for selection in selections:
+        if isinstance(selection, SelectedField):
+            yield selection
+        else:
+            yield from _fields(selection.selections)
+
+def load_options(model,
+                 selections: List[Selection],
+                 type_names: Optional[Collection[str]] = None,
+                 columns: Optional[Dict[str, Collection[str]]] = None,
+                 relationships: Optional[Dict[str, str]] = None,
+                 required: Collection[str] = ()) -> list:
+    """依照 client 選取的欄位產生 SQLAlchemy 的 load_only / selectinload / joinedload 選項
+
+    columns: GraphQL 欄位 -> 需要的 model 欄位，未列出的欄位以 snake_case 對應同名欄位
+    relationships: GraphQL 欄位 -> model relationship 名稱，有選到才預先載入
+    required: resolver 本身會用到的欄位，不論有沒有被選取都載入
+    預先載入的關聯物件會寫入 DataLoader 快取，所以一律載入完整欄位
+    """
+    columns = columns or {}
+    relationships = relationships or {}
+    mapper = inspect(model)
+    names = selected_field_names(selections, type_names)
+
+    needed = {key.key for key in mapper.primary_key} | set(required)
+    for name in names:
+        if name in columns:
+            needed.update(columns[name])
+        elif to_snake_case(name) in mapper.column_attrs:
+            needed.add(to_snake_case(name))
+
+    options = []
+    for attr in dict.fromkeys(attr for name, attr in relationships.items() if name in names):
+        prop = mapper.relationships[attr]
+        # 關聯需要的 FK 欄位也要一起載入
+        needed.update(column.key for column in prop.local_columns)
+        loader = selectinload if prop.uselist else joinedload
+        options.append(loader(getattr(model, attr)))
+
+    options.insert(0, load_only(*(getattr(model, key) for key in needed)))
+    return options
+
+def is_loaded(obj, attr: str) -> bool:
+    """欄位或關聯是否已經載入 (避免觸發 lazy load)"""
+    return attr not in inspect(obj).unloaded
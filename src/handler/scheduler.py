@@ -0,0 +1,166 @@
+"""依檔案大小 / 使用者角色 / 指定 priority 把處理工作分配到不同的 rq queue
+
+- 小檔案 -> high_priority，大檔案 -> low_priority，其餘 -> upload_file (一般)
+- admin 提高一級、guest 降低一級；明確指定 priority 時以指定的為準
+- 很小的檔案不各自建立 job，而是併入同一個 queue 中「還在排隊」的批次 job：
+  Redis 上記錄每個 queue 目前開放的批次 (batch:<queue>:current)，worker 開始處理批次時關閉它，
+  之後的小檔案會開新的批次；排隊越久的批次收進越多檔案，閒置時則立刻執行
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from redis import Redis
+from redis.exceptions import WatchError
+from rq import Queue
+from rq.job import Job
+
+
+class JobPriority(Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+PRIORITY_ORDER = [JobPriority.LOW, JobPriority.NORMAL, JobPriority.HIGH]
+# 角色對優先順序的調整 (UserRole 的值)
+ROLE_ADJUSTMENT = {"admin": 1, "guest": -1}
+
+SMALL_FILE_BYTES = int(os.getenv("SMALL_FILE_BYTES", str(1024 * 1024)))  # 1 MiB 以下 -> high
+LARGE_FILE_BYTES = int(os.getenv("LARGE_FILE_BYTES", str(100 * 1024 * 1024)))  # 100 MiB 以上 -> low
+COALESCE_FILE_BYTES = int(os.getenv("COALESCE_FILE_BYTES", str(64 * 1024)))  # 64 KiB 以下併入批次 job
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+WAIT_TIME_SAMPLE_SIZE = 50
+
+
+def _current_batch_key(queue_name: str) -> str:
+    return f"batch:{queue_name}:current"
+
+def _batch_paths_key(batch_id: str) -> str:
+    return f"batch:{batch_id}:paths"
+
+def claim_batch(connection: Redis, queue_name: str, batch_id: str) -> List[str]:
+    """worker 開始處理批次時呼叫：關閉批次並取出所有檔案路徑 (之後的小檔案會進新的批次)"""
+    current_key, paths_key = _current_batch_key(queue_name), _batch_paths_key(batch_id)
+    with connection.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(current_key, paths_key)
+                current = pipe.get(current_key)
+                pipe.multi()
+                if current is not None and current.decode("utf-8") == batch_id:
+                    pipe.delete(current_key)
+                pipe.lrange(paths_key, 0, -1)
+                pipe.delete(paths_key)
+                paths = pipe.execute()[-2]
+                return [path.decode("utf-8") for path in paths]
+            except WatchError:
+                continue
+
+
+class JobScheduler:
+    def __init__(self,
+                 queues: Dict[JobPriority, Queue],
+                 small_file_bytes: int = SMALL_FILE_BYTES,
+                 large_file_bytes: int = LARGE_FILE_BYTES,
+                 coalesce_file_bytes: int = COALESCE_FILE_BYTES,
+                 batch_max_files: int = BATCH_MAX_FILES):
+        self.queues = queues
+        self.small_file_bytes = small_file_bytes
+        self.large_file_bytes = large_file_bytes
+        self.coalesce_file_bytes = coalesce_file_bytes
+        self.batch_max_files = batch_max_files
+
+    def choose_priority(self, size: int, role: Optional[str] = None, priority: Optional[JobPriority] = None) -> JobPriority:
+        if priority is not None:
+            return priority
+        if size <= self.small_file_bytes:
+            level = PRIORITY_ORDER.index(JobPriority.HIGH)
+        elif size >= self.large_file_bytes:
+            level = PRIORITY_ORDER.index(JobPriority.LOW)
+        else:
+            level = PRIORITY_ORDER.index(JobPriority.NORMAL)
+        level += ROLE_ADJUSTMENT.get(role or "", 0)
+        return PRIORITY_ORDER[max(0, min(level, len(PRIORITY_ORDER) - 1))]
+
+    def submit(self,
+               func: Callable,
+               batch_func: Callable,
+               path: str,
+               role: Optional[str] = None,
+               priority: Optional[JobPriority] = None,
+               **enqueue_kwargs) -> Job:
+        """func(path) 處理單一檔案，batch_func(queue_name, batch_id) 處理批次；回傳負責這個檔案的 job
+
+        檔案不存在時丟出 FileNotFoundError，不會排入任何 queue
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"File to process not found: {path}")
+        size = os.path.getsize(path)
+        queue = self.queues[self.choose_priority(size, role, priority)]
+        if size <= self.coalesce_file_bytes:
+            return self._add_to_batch(queue, batch_func, path, **enqueue_kwargs)
+        return queue.enqueue(func, path, **enqueue_kwargs)
+
+    def _add_to_batch(self, queue: Queue, batch_func: Callable, path: str, **enqueue_kwargs) -> Job:
+        connection = queue.connection
+        current_key = _current_batch_key(queue.name)
+        with connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(current_key)
+                    current = pipe.get(current_key)
+                    batch_id = current.decode("utf-8") if current is not None else str(uuid.uuid4())
+                    paths_key = _batch_paths_key(batch_id)
+                    # 同時 WATCH 檔案清單：其他 request 加入檔案或 worker 取走批次時重試，count 才準確
+                    pipe.watch(paths_key)
+                    full = pipe.llen(paths_key) + 1 >= self.batch_max_files
+                    pipe.multi()
+                    pipe.rpush(paths_key, path)
+                    # 開新批次 / 批次已滿 (後面的小檔案開新的批次) 與加入檔案在同一個 transaction
+                    if current is None and not full:
+                        pipe.set(current_key, batch_id)
+                    elif current is not None and full:
+                        pipe.delete(current_key)
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+
+        if current is None:
+            return queue.enqueue(batch_func, queue.name, batch_id, job_id=batch_id, **enqueue_kwargs)
+        # 批次 job 可能還在由另一個 request enqueue，不從 Redis 讀取，只回傳 id / queue 供查詢進度
+        job = Job(batch_id, connection=connection)
+        job.origin = queue.name
+        return job
+
+    def metrics(self) -> Dict[str, dict]:
+        """每個 queue 的排隊數量、執行中數量與等待時間 (秒)，用來估算需要多少 worker"""
+        now = datetime.now(timezone.utc)
+        result = {}
+        for priority, queue in self.queues.items():
+            queued_ids = queue.get_job_ids(0, 1)
+            oldest = Job.fetch(queued_ids[0], connection=queue.connection) if queued_ids else None
+            started_ids = queue.started_job_registry.get_job_ids()
+            finished_ids = queue.finished_job_registry.get_job_ids(-WAIT_TIME_SAMPLE_SIZE, -1)
+            waits = [
+                (job.started_at - job.enqueued_at).total_seconds()
+                for job in Job.fetch_many(started_ids + finished_ids, connection=queue.connection)
+                if job is not None and job.started_at and job.enqueued_at
+            ]
+            result[queue.name] = {
+                "priority": priority.value,
+                "queued": queue.count,
+                "started": len(started_ids),
+                "failed": queue.failed_job_registry.count,
+                "oldest_wait_seconds": _seconds_since(oldest.enqueued_at, now) if oldest and oldest.enqueued_at else 0,
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else None,
+                "max_wait_seconds": round(max(waits), 3) if waits else None,
+            }
+        return result
+
+def _seconds_since(moment: datetime, now: datetime) -> float:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return round((now - moment).total_seconds(), 3)
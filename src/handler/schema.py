@@ -2,7 +2,7 @@
 import strawberry
 from typing import Optional, List
 
-from database import SessionLocal
+from strawberry.types import Info
 from handler.utils import get_user_data, create_user, update_user, delete_user
 from model.graphql.user import User
 from model.sqlalchemy.user import UserModel
@@ -10,9 +10,9 @@ from model.sqlalchemy.user import UserModel
 @strawberry.type
 class Query:
     @strawberry.field
-    def user(self, id: Optional[int] = None) -> List[User]:
+    async def user(self, info: Info, id: Optional[int] = None) -> List[User]:
         try:
-            return get_user_data(id)
+            return await info.context["db"].run(get_user_data, id)
         except ValueError as e:
             raise ValueError(str(e))
     
@@ -36,16 +36,16 @@ class Query:
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def create_user(self, name: str, age: int) -> User:
-        new_user = create_user(name, age)
+    async def create_user(self, info: Info, name: str, age: int) -> User:
+        new_user = await info.context["db"].run(create_user, name, age)
         return new_user
     
     @strawberry.mutation
-    def update_user(self, id: int, name: Optional[str] = None, age: Optional[int] = None) -> User:
-        user = update_user(id, name, age)
+    async def update_user(self, info: Info, id: int, name: Optional[str] = None, age: Optional[int] = None) -> User:
+        user = await info.context["db"].run(update_user, id, name, age)
         return user
 
     @strawberry.mutation
-    def delete_user(self, id: int) -> bool:
-        user = delete_user(id)
+    async def delete_user(self, info: Info, id: int) -> bool:
+        user = await info.context["db"].run(delete_user, id)
         return user
\ No newline at end of file
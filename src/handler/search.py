@@ -0,0 +1,116 @@
+"""Query.search 的全文檢索索引
+
+- SQLite: FTS5 external content table (<table>_fts)，以 trigger 與原表同步，bm25 排序
+- Postgres: to_tsvector 的 GIN expression index，ts_rank 排序
+兩者都以 prefix 比對每個關鍵字 (AND)，例如 "gra que" 可以找到 "GraphQL query"
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# table -> 建索引的欄位；bm25 的權重與欄位順序相同 (title 比 content 重要)
+SEARCH_TABLES: Dict[str, Tuple[str, ...]] = {
+    "user": ("username",),
+    "post": ("title", "content"),
+}
+COLUMN_WEIGHTS: Dict[str, Tuple[float, ...]] = {
+    "user": (1.0,),
+    "post": (10.0, 1.0),
+}
+PG_TEXT_SEARCH_CONFIG = "simple"
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def install_search_index(connection):
+    """建立索引 (可重複執行)；app 啟動時與 alembic migration 都會呼叫"""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        for table, columns in SEARCH_TABLES.items():
+            _install_sqlite_fts(connection, table, columns)
+    elif dialect == "postgresql":
+        for table, columns in SEARCH_TABLES.items():
+            connection.execute(text(
+                f'CREATE INDEX IF NOT EXISTS ix_{table}_fts ON "{table}" USING GIN ({_pg_vector(columns)})'))
+
+def drop_search_index(connection):
+    dialect = connection.dialect.name
+    for table in SEARCH_TABLES:
+        if dialect == "sqlite":
+            for suffix in ("ai", "ad", "au"):
+                connection.execute(text(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}"))
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}_fts"))
+        elif dialect == "postgresql":
+            connection.execute(text(f"DROP INDEX IF EXISTS ix_{table}_fts"))
+
+def _install_sqlite_fts(connection, table: str, columns: Tuple[str, ...]):
+    fts = f"{table}_fts"
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}).first()
+    if exists:
+        return
+
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    # prefix='2 3': 額外建立 2、3 字元的 prefix 索引，短的 prefix 查詢不用掃過整個 term 索引
+    connection.execute(text(
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({column_list}, content='{table}', content_rowid='id', prefix='2 3')"))
+    connection.execute(text(
+        f'CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"))
+    connection.execute(text(
+        f'CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END"))
+    connection.execute(text(
+        f'CREATE TRIGGER {fts}_au AFTER UPDATE ON "{table}" BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); END"))
+    # 既有資料一次建入索引
+    connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+def _pg_vector(columns: Tuple[str, ...]) -> str:
+    document = " || ' ' || ".join(f"coalesce({column}, '')" for column in columns)
+    return f"to_tsvector('{PG_TEXT_SEARCH_CONFIG}', {document})"
+
+def match_query(keyword: str, dialect: str) -> Optional[str]:
+    """把使用者輸入轉成 MATCH / tsquery 語法，只保留文字 token，避免語法錯誤或注入運算子"""
+    tokens = TOKEN_PATTERN.findall(keyword)
+    if not tokens:
+        return None
+    if dialect == "postgresql":
+        return " & ".join(f"{token}:*" for token in tokens)
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def search_ids(db: Session, keyword: str, limit: int, offset: int = 0) -> Optional[List[Tuple[str, int]]]:
+    """回傳依相關度排序的 [(table, id)]；不支援全文檢索的 DB 回傳 None，由呼叫端改用 LIKE"""
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return None
+    query = match_query(keyword, dialect)
+    if query is None:
+        return []
+
+    if dialect == "sqlite":
+        # bm25 越小越相關
+        selects = [
+            f"SELECT '{table}' AS kind, rowid AS id, "
+            f"bm25({table}_fts, {', '.join(map(str, COLUMN_WEIGHTS[table]))}) AS rank "
+            f"FROM {table}_fts WHERE {table}_fts MATCH :query"
+            for table in SEARCH_TABLES
+        ]
+        order = "rank"
+    else:
+        selects = [
+            f"SELECT '{table}' AS kind, id, "
+            f"ts_rank({_pg_vector(columns)}, to_tsquery('{PG_TEXT_SEARCH_CONFIG}', :query)) AS rank "
+            f'FROM "{table}" WHERE {_pg_vector(columns)} @@ to_tsquery(\'{PG_TEXT_SEARCH_CONFIG}\', :query)'
+            for table, columns in SEARCH_TABLES.items()
+        ]
+        order = "rank DESC"
+
+    statement = text(f"{' UNION ALL '.join(selects)} ORDER BY {order}, kind, id LIMIT :limit OFFSET :offset")
+    rows = db.execute(statement, {"query": query, "limit": limit, "offset": offset})
+    return [(row.kind, row.id) for row in rows]
@@ -0,0 +1,67 @@
+"""response 的 JSON 序列化
+
+JSON_SERIALIZER=orjson (預設) 使用 orjson，沒有安裝 orjson 或設為 json 時改用標準庫 json
+兩者都直接輸出 bytes，datetime / date 輸出 ISO 8601，Enum 輸出其值 (例如 UserRole.ADMIN -> "admin")
+
+- FastJSONResponse: FastAPI 的 response class (default_response_class 或直接回傳)
+- FastJSONMixin: strawberry HTTP view 的 request 解析與 response 編碼
+"""
+import json
+import os
+from datetime import date, datetime, time
+from enum import Enum
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+from strawberry.http.exceptions import HTTPException
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson 是選用套件
+    orjson = None
+
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson")
+USE_ORJSON = orjson is not None and JSON_SERIALIZER == "orjson"
+
+
+def encode_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if USE_ORJSON:
+    def dumps(data: Any) -> bytes:
+        # datetime / Enum / dataclass 由 orjson 直接編碼，default 只處理其他型別
+        return orjson.dumps(data, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    def dumps(data: Any) -> bytes:
+        return json.dumps(data, default=encode_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+    JSONDecodeError = json.JSONDecodeError
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONMixin:
+    """strawberry 預設以 json.dumps 產生 str，這裡直接產生 bytes 交給 Response"""
+    def encode_json(self, response_data) -> bytes:
+        return dumps(response_data)
+
+    def encode_multipart_data(self, data: Any, separator: str) -> str:
+        # multipart subscription 以字串串接各段
+        return f"\r\n--{separator}\r\nContent-Type: application/json\r\n\r\n{dumps(data).decode('utf-8')}\n"
+
+    def parse_json(self, data: Union[str, bytes]) -> Any:
+        try:
+            return loads(data)
+        except JSONDecodeError as e:
+            raise HTTPException(400, "Unable to parse request body as JSON") from e
@@ -0,0 +1,109 @@
+"""統計一個 request 內執行的 SQL 數量與時間
+
+instrument_engine(engine) 在 engine 上註冊 before/after_cursor_execute，
+執行中的 SQL 會記到目前 context 的 SQLStats (collect_sql 設定)；沒有 collect_sql 時只多一次 ContextVar 查詢
+run_in_threadpool 與 AsyncSession 都會沿用呼叫端的 context，同一個 request 的 SQL 會記在一起
+
+trace() 之後另外保留每一句 SQL、時間與發出它的 resolver 路徑 (sql_path 設定)，
+statement_shape 把參數與 IN (...) 的長度去掉，用來找出只差在參數的重複查詢 (N+1)
+"""
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+_current_path: ContextVar[Optional[str]] = ContextVar("sql_path", default=None)
+
+# IN (?, ?, ?) / VALUES (?, ?) 這類長度不固定的參數列表，以及字串、數字常數
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+))*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    shape = _LITERAL.sub("?", statement)
+    shape = _PARAMETER_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class SQLStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Optional[List[dict]] = None
+
+    def trace(self):
+        if self.statements is None:
+            self.statements = []
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        if self.statements is not None:
+            self.statements.append({"sql": statement, "seconds": seconds, "path": _current_path.get()})
+
+    def repeated_statements(self, threshold: int = 3) -> List[dict]:
+        """同一個 shape 執行 threshold 次以上的 SQL (疑似 N+1)，次數多的在前"""
+        groups: Dict[str, dict] = {}
+        for item in self.statements or []:
+            group = groups.setdefault(statement_shape(item["sql"]), {"count": 0, "seconds": 0.0, "paths": []})
+            group["count"] += 1
+            group["seconds"] += item["seconds"]
+            if item["path"] not in group["paths"]:
+                group["paths"].append(item["path"])
+        return sorted(
+            ({"statement": shape, **group} for shape, group in groups.items() if group["count"] >= threshold),
+            key=lambda group: -group["count"],
+        )
+
+
+_current_stats: ContextVar[Optional[SQLStats]] = ContextVar("sql_stats", default=None)
+
+
+def current_sql_stats() -> Optional[SQLStats]:
+    return _current_stats.get()
+
+@contextmanager
+def collect_sql(stats: Optional[SQLStats] = None) -> Iterator[SQLStats]:
+    stats = stats or SQLStats()
+    # 不用 reset(token)：multipart subscription 的 on_operation 會在另一個 context 結束，
+    # 該 context 的 token 無效，因此明確還原為進入前的值
+    previous = _current_stats.get()
+    _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.set(previous)
+
+@contextmanager
+def sql_path(path: str) -> Iterator[None]:
+    """這段期間執行的 SQL 記在 path (resolver 路徑) 底下"""
+    token = _current_path.set(path)
+    try:
+        yield
+    finally:
+        _current_path.reset(token)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_stats.get() is not None:
+        context._sql_stats_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    start = getattr(context, "_sql_stats_start", None)
+    if stats is not None and start is not None:
+        stats.record(statement, time.perf_counter() - start)
+
+def instrument_engine(*engines):
+    """可傳入 Engine 或 AsyncEngine，重複呼叫不會重複註冊"""
+    for engine in engines:
+        if isinstance(engine, AsyncEngine):
+            engine = engine.sync_engine
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
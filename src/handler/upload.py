@@ -0,0 +1,201 @@
+"""檔案上傳寫入磁碟
+
+- save_upload_file: multipart 上傳，以固定大小的 chunk 寫入並同時計算 sha256，不會整個檔案讀進記憶體
+- 可續傳的分段上傳 (upload session):
+    1. create_session(file_name, size) 取得 upload_id
+    2. append_chunk(upload_id, offset, chunks) 從 offset 繼續寫入，offset 必須等於目前已寫入的大小
+    3. 斷線後以 get_session(upload_id) 查詢 offset，從該位置重送
+  session 的狀態 (metadata JSON + .part 檔) 都在 UPLOAD_DIR，多個 worker 共用同一個目錄即可；
+  寫入時以 .lock 檔 (flock) 鎖住，同一個 upload 同時只會有一個 request 寫入
+- 兩種上傳完成時都回傳 stored_name (UPLOAD_DIR 內的檔名)，之後以 stored_file_path(stored_name) 取得路徑
+"""
+import fcntl
+import hashlib
+import json
+import os
+import uuid
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+
+class UploadError(Exception):
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def safe_file_name(file_name: str) -> str:
+    """只保留檔名，避免 ../ 之類的路徑寫到 UPLOAD_DIR 以外"""
+    name = os.path.basename((file_name or "").replace("\\", "/")).strip()
+    if name in ("", ".", ".."):
+        raise UploadError("Invalid file name")
+    return name
+
+def stored_file_path(stored_name: str, upload_dir: str = UPLOAD_DIR) -> str:
+    """上傳完成時回傳的 stored_name (<id>_<檔名>) -> 磁碟上的路徑；不是上傳完成的檔案或已不存在時回 404"""
+    prefix, _, name = (stored_name or "").partition("_")
+    try:
+        uuid.UUID(prefix)
+        valid = bool(name) and safe_file_name(stored_name) == stored_name
+    except (ValueError, UploadError):
+        valid = False
+    path = os.path.join(upload_dir, stored_name) if valid else None
+    if path is None or not os.path.isfile(path):
+        raise UploadError(f"Uploaded file not found: {stored_name}", 404)
+    return path
+
+def _write_chunk(f, hasher, chunk: bytes):
+    f.write(chunk)
+    hasher.update(chunk)
+
+async def save_upload_file(file: UploadFile, upload_dir: str = UPLOAD_DIR) -> dict:
+    """multipart 上傳：寫到 <upload_dir>/<uuid>_<檔名>，回傳 path / stored_name / size / sha256"""
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}_{safe_file_name(file.filename)}")
+    hasher = hashlib.sha256()
+    size = 0
+    f = await run_in_threadpool(open, path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await run_in_threadpool(_write_chunk, f, hasher, chunk)
+            size += len(chunk)
+    finally:
+        await run_in_threadpool(f.close)
+    return {"path": path, "stored_name": os.path.basename(path), "size": size, "sha256": hasher.hexdigest()}
+
+
+# 同一個 process 內沿用上次的 hash 狀態，記錄當時 .part 的 (大小, mtime)；
+# 不相符 (其他 worker 寫入過、被截斷或 process 重啟) 時以磁碟上的內容重建
+_hashers: Dict[str, Tuple[Tuple[int, int], "hashlib._Hash"]] = {}
+
+def _meta_path(upload_dir: str, upload_id: str) -> str:
+    return os.path.join(upload_dir, f"{upload_id}.json")
+
+def _part_path(upload_dir: str, upload_id: str) -> str:
+    return os.path.join(upload_dir, f"{upload_id}.part")
+
+def _lock_path(upload_dir: str, upload_id: str) -> str:
+    return os.path.join(upload_dir, f"{upload_id}.lock")
+
+def _read_meta(upload_dir: str, upload_id: str) -> dict:
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        raise UploadError("Upload session not found", 404)
+    try:
+        with open(_meta_path(upload_dir, upload_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise UploadError("Upload session not found", 404)
+
+def _session_state(upload_dir: str, meta: dict) -> dict:
+    part = _part_path(upload_dir, meta["upload_id"])
+    offset = os.path.getsize(part) if os.path.exists(part) else meta["size"]
+    return {**meta, "offset": offset}
+
+def create_session(file_name: str, size: int, sha256: Optional[str] = None, upload_dir: str = UPLOAD_DIR) -> dict:
+    """size: 檔案總大小；sha256: 選填，完成時用來驗證內容"""
+    if size < 0:
+        raise UploadError("size must be non-negative")
+    os.makedirs(upload_dir, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    meta = {"upload_id": upload_id, "file_name": safe_file_name(file_name), "size": size,
+            "sha256": sha256.lower() if sha256 else None, "path": None, "stored_name": None}
+    open(_part_path(upload_dir, upload_id), "wb").close()
+    with open(_meta_path(upload_dir, upload_id), "w") as f:
+        json.dump(meta, f)
+    return _session_state(upload_dir, meta)
+
+def get_session(upload_id: str, upload_dir: str = UPLOAD_DIR) -> dict:
+    return _session_state(upload_dir, _read_meta(upload_dir, upload_id))
+
+def _file_version(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _resume_hasher(upload_id: str, part: str):
+    cached = _hashers.pop(upload_id, None)
+    if cached is not None and cached[0] == _file_version(part):
+        return cached[1]
+    hasher = hashlib.sha256()
+    with open(part, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+def _lock_session(upload_dir: str, upload_id: str):
+    """以 flock 鎖住這個 upload，同一時間只有一個 request (不論哪個 worker) 能寫入"""
+    f = open(_lock_path(upload_dir, upload_id), "a")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        raise UploadError("Another chunk of this upload is being written", 409)
+    return f
+
+def _open_part(upload_dir: str, upload_id: str, offset: int):
+    """取得 lock 後檢查 offset，回傳 (meta, lock, .part 檔, hash)"""
+    _read_meta(upload_dir, upload_id)  # 先確認 upload_id 合法且存在，才建立 lock 檔
+    lock = _lock_session(upload_dir, upload_id)
+    try:
+        meta = _read_meta(upload_dir, upload_id)
+        part = _part_path(upload_dir, upload_id)
+        if meta["path"] is not None or not os.path.exists(part):
+            raise UploadError("Upload already completed", 409)
+        current = os.path.getsize(part)
+        if offset != current:
+            raise UploadError(f"Offset mismatch, expected {current}", 409)
+        return meta, lock, open(part, "ab"), _resume_hasher(upload_id, part)
+    except BaseException:
+        lock.close()
+        raise
+
+def _finish(upload_dir: str, meta: dict, hasher) -> dict:
+    upload_id = meta["upload_id"]
+    part = _part_path(upload_dir, upload_id)
+    digest = hasher.hexdigest()
+    if meta["sha256"] and meta["sha256"] != digest:
+        # 不知道是哪一段有問題，清空 .part，client 以同一個 upload_id 從 offset 0 重新上傳
+        open(part, "wb").close()
+        raise UploadError("sha256 does not match the uploaded content, upload again from offset 0", 422)
+    path = os.path.join(upload_dir, f"{upload_id}_{meta['file_name']}")
+    os.replace(part, path)
+    meta.update(path=path, stored_name=os.path.basename(path), sha256=digest)
+    with open(_meta_path(upload_dir, upload_id), "w") as f:
+        json.dump(meta, f)
+    os.remove(_lock_path(upload_dir, upload_id))
+    return {**meta, "offset": meta["size"]}
+
+async def append_chunk(upload_id: str, offset: int, chunks: AsyncIterator[bytes], upload_dir: str = UPLOAD_DIR) -> dict:
+    """從 offset 接著寫入 request body；寫滿 size 後把 .part 改名為正式檔案，回傳的 path 不為 None
+
+    offset 與已寫入的大小不符、或同一個 upload 正在寫入另一段時回 409，client 應先查詢目前的 offset
+    sha256 不符時回 422 並清空已寫入的內容
+    """
+    meta, lock, f, hasher = await run_in_threadpool(_open_part, upload_dir, upload_id, offset)
+    try:
+        written = offset
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if written + len(chunk) > meta["size"]:
+                    # 超出大小的 chunk 不寫入；已寫入的部分保留，可以從新的 offset 續傳
+                    raise UploadError("Upload exceeds the declared size", 413)
+                await run_in_threadpool(_write_chunk, f, hasher, chunk)
+                written += len(chunk)
+        finally:
+            await run_in_threadpool(f.close)
+
+        if written < meta["size"]:
+            # hash 和 .part 的內容一致，下一段若由同一個 process 處理就不用重新計算
+            _hashers[upload_id] = (_file_version(_part_path(upload_dir, upload_id)), hasher)
+            return {**meta, "offset": written}
+        return await run_in_threadpool(_finish, upload_dir, meta, hasher)
+    finally:
+        await run_in_threadpool(lock.close)
@@ -1,13 +1,11 @@
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from fastapi import Depends
 
 from model.sqlalchemy.user import UserModel
 # from model.graphql.user import User
-from database import get_db
 
-def get_user_data(user_id: Optional[int] = None, db: Session = Depends(get_db)) -> List[UserModel]:
-    db = next(get_db())
+# 以下函式都接收 db session，由呼叫端透過 RequestSession.run / database.run_in_session 執行 (sync / async engine 皆可)
+def get_user_data(db: Session, user_id: Optional[int] = None) -> List[UserModel]:
     if user_id is None:
         db_user = db.query(UserModel).all()
     else:
@@ -20,16 +18,14 @@ def get_user_data(user_id: Optional[int] = None, db: Session = Depends(get_db))
     user_list = [UserModel(id=user.id, name=user.name, age=user.age) for user in db_user]
     return user_list
 
-def create_user(name: str, age: int, db: Session = Depends(get_db)) -> UserModel:
-    db = next(get_db())
+def create_user(db: Session, name: str, age: int) -> UserModel:
     user = UserModel(name=name, age=age)
     db.add(user)
     db.commit()
     db.refresh(user)
     return UserModel(id=user.id, name=user.name, age=user.age)
 
-def update_user(id: int, name: Optional[str], age: Optional[int], db: Session = Depends(get_db)):
-    db = next(get_db())
+def update_user(db: Session, id: int, name: Optional[str], age: Optional[int]):
     user = db.query(UserModel).filter(UserModel.id == id).first()
     if user:
         if name:
@@ -41,11 +37,10 @@ def update_user(id: int, name: Optional[str], age: Optional[int], db: Session =
         return user
     return None
 
-def delete_user(id: int, db: Session = Depends(get_db)) -> bool:
-    db = next(get_db())
+def delete_user(db: Session, id: int) -> bool:
     user = db.query(UserModel).filter(UserModel.id == id).first()
     if user:
         db.delete(user)
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
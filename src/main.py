@@ -1,24 +1,72 @@
+import os
 import uvicorn
 import strawberry
+from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse, JSONResponse
-from strawberry.asgi import GraphQL
+from fastapi.responses import RedirectResponse
 
 from router.user import router as router_user
 from model.sqlalchemy.user import UserModel
 from handler.schema import Query, Mutation
+from extension.apq import APQGraphQL
+from extension.document_cache import DocumentCacheExtension
+from extension.session import RequestSessionExtension
+from extension.cost import QueryCostExtension
+from extension.metrics import MetricsExtension, metrics_response
+from extension.sql_trace import SQLTraceExtension
+from handler.sql_stats import instrument_engine
+from handler.serializer import FastJSONResponse
+from cache.backend import LRUCache
 
-from database import engine, Base, SessionLocal
+from database import (engine, replica_engines, async_engine, async_replica_engines, Base, SessionLocal, session_factory,
+                      dispose_engines)
 
 
 # DB init
 Base.metadata.create_all(bind=engine)
+# 每個 GraphQL operation 的 SQL 數量與時間 (/metrics)
+instrument_engine(engine, *replica_engines, *async_replica_engines, *([async_engine] if async_engine else []))
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
-graphql_app = GraphQL(schema)
+# parse + validate 結果快取，跨 request 共用
+document_cache = LRUCache(maxsize=int(os.getenv("DOCUMENT_CACHE_SIZE", "1000")))
+query_cost_extension = partial(
+    QueryCostExtension,
+    max_cost=int(os.getenv("MAX_QUERY_COST", "1000")),
+    max_depth=int(os.getenv("MAX_QUERY_DEPTH", "10")),
+)
+# operation 名稱由 client 決定，/metrics 只以 METRICS_OPERATION_NAMES (逗號分隔) 內的名稱當 label，
+# 未設定時只記錄最先出現的 METRICS_MAX_OPERATION_NAMES 個，其餘為 "other"
+metrics_extension = partial(
+    MetricsExtension,
+    operation_names=[name.strip() for name in os.getenv("METRICS_OPERATION_NAMES", "").split(",") if name.strip()],
+    max_operation_names=int(os.getenv("METRICS_MAX_OPERATION_NAMES", "100")),
+)
+# SQL_TRACE=header: request 帶 X-SQL-Trace header 時在 extensions.sqlTrace 回傳執行的 SQL 與 N+1 提示
+# SQL_TRACE=always: 每個 request 都回傳 (測試用)；SQL_STATEMENT_BUDGET: trace 時 SQL 數量的上限，超過會回傳 error
+SQL_TRACE = os.getenv("SQL_TRACE", "off")
+sql_trace_extension = partial(
+    SQLTraceExtension,
+    enabled=SQL_TRACE == "always",
+    header="x-sql-trace" if SQL_TRACE == "header" else None,
+    statement_budget=int(os.environ["SQL_STATEMENT_BUDGET"]) if os.getenv("SQL_STATEMENT_BUDGET") else None,
+)
+schema = strawberry.Schema(query=Query, mutation=Mutation,
+                           extensions=[metrics_extension,
+                                       sql_trace_extension,
+                                       partial(RequestSessionExtension, factory=session_factory),
+                                       partial(DocumentCacheExtension, cache=document_cache),
+                                       query_cost_extension])
+graphql_app = APQGraphQL(schema)
 
-app = FastAPI(title="FastAPI + GraphQL Example", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await dispose_engines(engine, *replica_engines, async_engine, *async_replica_engines)
+
+app = FastAPI(title="FastAPI + GraphQL Example", version="1.0.0", default_response_class=FastJSONResponse,
+              lifespan=lifespan)
 app.add_route("/graphql", graphql_app)
 app.add_websocket_route("/graphql", graphql_app)
 app.include_router(router_user)
@@ -29,7 +77,16 @@ async def root():
 
 @app.get("/api/v1/health", summary="Health Check", tags=["Health"])
 async def health_check():
-    return JSONResponse(content={"status": "ok", "message": "Service is running"})
+    return FastJSONResponse(content={"status": "ok", "message": "Service is running"})
+
+@app.get("/api/v1/graphql/document_cache", summary="GraphQL Document Cache Stats", tags=["Health"])
+async def graphql_document_cache():
+    return FastJSONResponse(content=document_cache.stats())
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return metrics_response()
 
 if __name__ == "__main__":
     # insert data to db
@@ -1,11 +1,12 @@
 import dataclasses
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Any, Dict, Union
 
+from database import RequestSession, get_request_session
 from handler.utils import get_user_data
+from handler.serializer import FastJSONResponse
 
 router = APIRouter(tags=['User'], prefix="/users")
 
@@ -34,10 +35,10 @@ class ErrorResponse(BaseModel):
             },
         }
 )
-async def get_user(user_id: int):
+async def get_user(user_id: int, db: RequestSession = Depends(get_request_session)):
     try:
-        user = get_user_data(user_id)
-        return JSONResponse(
+        user = await db.run(get_user_data, user_id)
+        return FastJSONResponse(
                 content={
                     "status": "success",
                     "data": {
@@ -49,7 +50,7 @@ async def get_user(user_id: int):
                 status_code=200,
             )
     except ValueError as e:
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "status": "error",
                 "message": str(e)
@@ -4,40 +4,83 @@ import uuid
 import time
 import asyncio
 import strawberry
-import pandas as pd
 from datetime import datetime
-from typing import List, Optional, AsyncGenerator
-from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File, BackgroundTasks
+from typing import Callable, List, Optional, AsyncGenerator
+from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File, BackgroundTasks, Header
 from fastapi.responses import RedirectResponse, StreamingResponse
 from strawberry.asgi import GraphQL
-from sqlalchemy import ForeignKey, create_engine, Column, Integer, String, DateTime, event
+from sqlalchemy import ForeignKey, Column, Integer, String, DateTime, event, inspect, func, select
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base, Session
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from strawberry.fastapi import GraphQLRouter
 from contextlib import asynccontextmanager
+from functools import partial
 from strawberry.types import Info
+from graphql import GraphQLError
+from strawberry.dataloader import DataLoader
 from datetime import datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
-from rq import Queue
+from rq import Callback, Queue
 from redis import Redis
-from pymongo import MongoClient
+from redis.asyncio import Redis as AsyncRedis
+from starlette.concurrency import run_in_threadpool
+from pymongo import AsyncMongoClient
 from pydantic import BaseModel
 from tabulate import tabulate
 from enum import Enum
 
+from database import (DB_ASYNC, DATABASE_REPLICA_URLS, RequestSession, create_db_engine, create_async_db_engine,
+                      dispose_engines, parse_url_list, routing_sessionmaker, async_routing_sessionmaker, stream_scalars)
+from handler.projection import field_selections, nested_selections, load_options, is_loaded
+from handler.pagination import PageInfo, encode_cursor, keyset_page
+from handler.search import install_search_index, search_ids
+from handler.bulk import bulk_insert
+from handler.progress import (MemoryProgressStore, ProgressBroadcaster, RedisProgressStore,
+                              publish_failed, publish_finished, save_progress)
+from handler.upload import UploadError, append_chunk, create_session, get_session, save_upload_file, stored_file_path
+from handler.file_processing import process_file_chunks
+from handler.markdown import batched, iter_markdown_rows
+from handler.scheduler import JobPriority, JobScheduler, claim_batch
+from handler.sql_stats import instrument_engine
+from handler.serializer import FastJSONResponse
+from pymongo.errors import BulkWriteError
+from cache.backend import LRUCache, RedisCache
+from extension.apq import APQGraphQLRouter
+from extension.document_cache import DocumentCacheExtension
+from extension.session import RequestSessionExtension
+from extension.cost import QueryCostExtension
+from extension.response_cache import ResponseCacheExtension
+from extension.metrics import MetricsExtension, metrics_response
+from extension.sql_trace import SQLTraceExtension
+
 
 # 建立 Redis 連線
 redis_conn = Redis(host="redis", port=6379, decode_responses=False)
 upload_file_queue = Queue("upload_file", connection=redis_conn)
+# uploadProgress 以 pub/sub 接收 worker 推播的進度，每個 process 共用一條連線
+async_redis_conn = AsyncRedis(host="redis", port=6379)
+progress_broadcaster = ProgressBroadcaster(async_redis_conn)
+PROGRESS_RECHECK_SECONDS = 30
+# worker 完成 / 失敗時推播最後的狀態
+PROGRESS_CALLBACKS = {"on_success": Callback(publish_finished), "on_failure": Callback(publish_failed)}
 # 啟動 worker: rq worker upload_file
 
 # 啟動 worker: rq worker high_priority
 high_priority_queue = Queue("high_priority", connection=redis_conn)
 # 啟動 worker: rq worker low_priority
 low_priority_queue = Queue("low_priority", connection=redis_conn)
+# 依檔案大小 / 角色 / 指定的 priority 分配 queue，很小的檔案併成批次 job
+# worker 依序處理: rq worker high_priority upload_file low_priority
+job_scheduler = JobScheduler({
+    JobPriority.HIGH: high_priority_queue,
+    JobPriority.NORMAL: upload_file_queue,
+    JobPriority.LOW: low_priority_queue,
+})
 
 # MongoDB 連線
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mymongo:27017/mydatabase")
-client = MongoClient(MONGO_URI)
+# async client，I/O 不會卡住 event loop；連線池設定寫在 URI，例如 ?maxPoolSize=50&minPoolSize=5&waitQueueTimeoutMS=5000
+client = AsyncMongoClient(MONGO_URI)
 
 # def create_access_token(user_info: dict, expires_delta: Optional[timedelta] = timedelta(days=1)):
 #     print(user_info)
@@ -45,8 +88,20 @@ client = MongoClient(MONGO_URI)
 
 
 DATABASE_URL = "sqlite:///./simple.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 讀取走 replica、寫入走 primary；本機可以把 simple.db 複製一份，DATABASE_REPLICA_URLS=sqlite:///./replica.db
+REPLICA_URLS = parse_url_list(DATABASE_REPLICA_URLS)
+engine = create_db_engine(DATABASE_URL)
+replica_engines = [create_db_engine(url) for url in REPLICA_URLS]
+SessionLocal = routing_sessionmaker(engine, replica_engines)
+# DB_ASYNC=true 時 resolver 改走 AsyncSession (sqlite+aiosqlite)
+async_engine = create_async_db_engine(DATABASE_URL) if DB_ASYNC else None
+async_replica_engines = [create_async_db_engine(url) for url in REPLICA_URLS] if DB_ASYNC else []
+AsyncSessionLocal = async_routing_sessionmaker(async_engine, async_replica_engines) if DB_ASYNC else None
+session_factory = AsyncSessionLocal if DB_ASYNC else SessionLocal
+# 寫入後這段時間內同一個 client 的讀取都走 primary (等 replica 同步)，見 RequestSessionExtension
+DB_PRIMARY_STICKY_SECONDS = float(os.getenv("DB_PRIMARY_STICKY_SECONDS", "5"))
+# 每個 GraphQL operation 的 SQL 數量與時間 (/metrics)
+instrument_engine(engine, *replica_engines, *async_replica_engines, *([async_engine] if async_engine else []))
 Base =  declarative_base()
 
 # Define SQLAlchemy models
@@ -82,17 +137,8 @@ class UserModel(Base):
 
 # DB init
 Base.metadata.create_all(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-def get_db_session():
-    with SessionLocal() as db:
-        return db
+with engine.begin() as connection:
+    install_search_index(connection)
 
 
 # Define interface
@@ -107,6 +153,17 @@ class UserRole(Enum):
     USER = "user"
     GUEST = "guest"
 
+strawberry.enum(JobPriority)
+
+def request_role(headers) -> Optional[str]:
+    """X-User-Role header 對應的 UserRole 值 (目前沒有登入機制，只用於分配 queue)"""
+    role = (headers.get("x-user-role") or "").lower()
+    return role if role in {r.value for r in UserRole} else None
+
+def submit_file_job(file_path: str, role: Optional[str] = None, priority: Optional[JobPriority] = None):
+    return job_scheduler.submit(process_file, process_file_batch, file_path,
+                                role=role, priority=priority, **PROGRESS_CALLBACKS)
+
 # Define GraphQL schema
 # 使用 Strawberry 定義的 GraphQL object type
 @strawberry.type
@@ -115,7 +172,20 @@ class PostType(Node):
     title: str
     content: str
     author_id: strawberry.ID
-    author_name: str
+
+    @strawberry.field
+    async def author(self, info: Info) -> Optional["UserType"]:
+        """透過 DataLoader 取得作者，同一次查詢內的作者只會發一次 SQL"""
+        if self.author_id is None:  # 沒有作者的帖子
+            return None
+        return await info.context["user_loader"].load(int(self.author_id))
+
+    @strawberry.field
+    async def author_name(self, info: Info) -> str:
+        if self.author_id is None:
+            return ""
+        author = await info.context["user_loader"].load(int(self.author_id))
+        return author.username if author else ""
 
 # 使用 Strawberry 定義的 GraphQL object type
 @strawberry.type
@@ -130,9 +200,136 @@ class UserType(Node):
     email: str # required field, if optional, set 
     signup_time: datetime
     expired_time: datetime
-    posts: List[PostType]
     cursor: Optional[str] = None  # 添加游標字段
     role: UserRole = UserRole.USER
+    post_title_filter: strawberry.Private[Optional[str]] = None
+
+    @strawberry.field
+    async def posts(self, info: Info) -> List[PostType]:
+        """透過 DataLoader 取得文章，同一次查詢內的所有作者合併成一次 IN (...) 查詢"""
+        posts = await info.context["posts_by_author_loader"].load(int(self.id))
+        if self.post_title_filter:
+            posts = [p for p in posts if self.post_title_filter in p.title]
+        return posts
+
+# 只讀取已載入的欄位 (load_only 沒選到的欄位不會觸發額外的 SQL)
+def to_post_type(post: PostModel) -> PostType:
+    loaded = inspect(post).dict
+    return PostType(id=post.id, 
+                    title=loaded.get("title"), 
+                    content=loaded.get("content"), 
+                    author_id=loaded.get("author_id"))
+
+def to_user_type(user: UserModel, post_title_filter: Optional[str] = None) -> UserType:
+    loaded = inspect(user).dict
+    return UserType(
+        id=user.id, 
+        username=loaded.get("username"), 
+        email=loaded.get("email"),
+        signup_time=loaded.get("signup_time"),
+        expired_time=loaded.get("expired_time"),
+        cursor=user.id,  # 設置游標字段
+        role=loaded.get("role"),
+        post_title_filter=post_title_filter)
+
+# Relay-style connection，以 keyset 分頁
+@strawberry.type
+class PostEdge:
+    cursor: str
+    node: PostType
+
+@strawberry.type
+class PostConnection:
+    edges: List[PostEdge]
+    page_info: PageInfo
+    count_query: strawberry.Private[Callable[[Session], int]]
+
+    @strawberry.field
+    async def total_count(self, info: Info) -> int:
+        """只有 client 選取 totalCount 時才會執行 COUNT"""
+        return await info.context["db"].run(self.count_query)
+
+@strawberry.type
+class UserEdge:
+    cursor: str
+    node: UserType
+
+@strawberry.type
+class UserConnection:
+    edges: List[UserEdge]
+    page_info: PageInfo
+    count_query: strawberry.Private[Callable[[Session], int]]
+
+    @strawberry.field
+    async def total_count(self, info: Info) -> int:
+        """只有 client 選取 totalCount 時才會執行 COUNT"""
+        return await info.context["db"].run(self.count_query)
+
+# GraphQL 欄位 -> 需要的 model 欄位 (其餘以 snake_case 對應同名欄位)
+USER_COLUMNS = {"cursor": ["id"]}
+POST_COLUMNS = {"author": ["author_id"], "authorName": ["author_id"]}
+USER_RELATIONSHIPS = {"posts": "posts"}
+POST_RELATIONSHIPS = {"author": "author", "authorName": "author"}
+
+def user_load_options(selections, type_names=None) -> list:
+    return load_options(UserModel, selections, type_names, USER_COLUMNS, USER_RELATIONSHIPS)
+
+def post_load_options(selections, type_names=None) -> list:
+    # author_id 是 to_post_type / search 判斷作者的依據，一律載入
+    return load_options(PostModel, selections, type_names, POST_COLUMNS, POST_RELATIONSHIPS, required=["author_id"])
+
+# DataLoader: 收集同一個 event loop tick 內的 key，合併成一次 IN (...) 查詢，避免 N+1
+LOADER_MAX_BATCH_SIZE = 500  # SQLite 舊版單一語句最多 999 個參數
+
+class UserByIdLoader(DataLoader[int, Optional[UserType]]):
+    """以 user.id 批次載入使用者"""
+    def __init__(self, db: RequestSession):
+        super().__init__(load_fn=self.batch_load, max_batch_size=LOADER_MAX_BATCH_SIZE)
+        self.db = db
+
+    async def batch_load(self, keys: List[int]) -> List[Optional[UserType]]:
+        def query(db: Session):
+            users = db.query(UserModel).filter(UserModel.id.in_(keys)).all()
+            return {user.id: to_user_type(user) for user in users}
+        by_id = await self.db.run(query)
+        return [by_id.get(key) for key in keys]
+
+class PostsByAuthorLoader(DataLoader[int, List[PostType]]):
+    """以 post.author_id 批次載入每位作者的文章"""
+    def __init__(self, db: RequestSession):
+        super().__init__(load_fn=self.batch_load, max_batch_size=LOADER_MAX_BATCH_SIZE)
+        self.db = db
+
+    async def batch_load(self, keys: List[int]) -> List[List[PostType]]:
+        def query(db: Session):
+            return (db.query(PostModel)
+                    .filter(PostModel.author_id.in_(keys))
+                    .order_by(PostModel.id)
+                    .all())
+        by_author = {key: [] for key in keys}
+        for post in await self.db.run(query):
+            by_author[post.author_id].append(to_post_type(post))
+        return [by_author[key] for key in keys]
+
+def prime_loaders(info: Info, users=(), posts=()):
+    """把 selectinload / joinedload 預先載入的關聯寫入 DataLoader 快取，resolver 就不用再查一次"""
+    for user in users:
+        if is_loaded(user, "posts"):
+            posts_of_user = sorted(user.posts, key=lambda p: p.id)
+            info.context["posts_by_author_loader"].prime(user.id, [to_post_type(p) for p in posts_of_user])
+    for post in posts:
+        if is_loaded(post, "author") and post.author is not None:
+            info.context["user_loader"].prime(post.author_id, to_user_type(post.author))
+
+def operation_loaders(db: RequestSession) -> dict:
+    """每個 operation 新的 DataLoader，快取只在同一個 operation 內有效 (由 RequestSessionExtension 建立)
+
+    session 在第一次查詢時才取得連線，operation 結束時關閉
+    """
+    return {
+        "user_loader": UserByIdLoader(db),
+        "posts_by_author_loader": PostsByAuthorLoader(db),
+    }
 
 @strawberry.type
 class HelloResponse:
@@ -151,6 +348,27 @@ class UserInput:
     username: str
     email: str
 
+@strawberry.input
+class PostInput:
+    title: str
+    content: str
+    author_id: strawberry.ID
+
+@strawberry.type
+class BulkItemError:
+    index: int  # 對應輸入 list 的位置
+    message: str
+
+@strawberry.type
+class CreateUsersResponse:
+    users: List[UserType]
+    errors: List[BulkItemError]
+
+@strawberry.type
+class CreatePostsResponse:
+    posts: List[PostType]
+    errors: List[BulkItemError]
+
 # 定義Union型別
 SearchResult = strawberry.union("SearchResult", (UserType, PostType))
 
@@ -172,51 +390,37 @@ class Query:
     使用 Cursored-based Pagination 時有一個非常重要的要求，那就是資料必須有明確且固定的排序機制，不然 cursor 就失去了紀錄位址的功能。
     # """
     @strawberry.field
-    def get_user(self, 
+    async def get_user(self, 
+                info: Info,
                 id: Optional[int] = None, 
                 username: Optional[str] = None,
                 cursor: Optional[int] = None, 
                 limit: int = 10,
                 post_title_filter: Optional[str] = None) -> List[UserType]:
-        db = get_db_session()
-        query = db.query(UserModel)
-
-        if id:
-            query = query.filter(UserModel.id == id)
-        elif username:
-            query = query.filter(UserModel.username == username)
-        else:
-            if cursor:
-                query = query.filter(UserModel.id > cursor)
-            query = query.order_by(UserModel.id).limit(limit)
+        # 只載入 client 有選取的欄位與關聯
+        options = user_load_options(field_selections(info.selected_fields))
+
+        def query_users(db: Session):
+            query = db.query(UserModel).options(*options)
+
+            if id:
+                query = query.filter(UserModel.id == id)
+            elif username:
+                query = query.filter(UserModel.username == username)
+            else:
+                if cursor:
+                    query = query.filter(UserModel.id > cursor)
+                query = query.order_by(UserModel.id).limit(limit)
+            return query.all()
         
-        users = query.all()
+        users = await info.context["db"].run(query_users)
 
         if not users:
             raise HTTPException(status_code=404, detail="No user found")
         
-        def convert_post(post):
-            if post_title_filter and post_title_filter not in post.title:
-                return None
-            return PostType(
-                id=post.id,
-                title=post.title,
-                content=post.content,
-                author_id=post.author.id,
-                author_name=post.author.username
-            )
-        
-        result = [UserType(
-            id=user.id, 
-            username=user.username, 
-            email=user.email,  # 已棄用的字段
-            # contact_email=user.email,  # 新的字段
-            posts=[p for p in (convert_post(p) for p in user.posts) if p],
-            signup_time=user.signup_time,
-            expired_time=user.expired_time,
-            cursor=user.id,  # 設置游標字段
-            role=user.role
-        ) for user in users]
+        # posts 交給 UserType.posts 透過 DataLoader 批次載入
+        prime_loaders(info, users=users)
+        result = [to_user_type(user, post_title_filter) for user in users]
 
         return result
     
@@ -264,17 +468,17 @@ class Query:
     
 
     @strawberry.field
-    def get_post(self, id: int) -> PostType:
-        # db = next(get_db())
-        db = get_db_session()
-        post = db.query(PostModel).filter(PostModel.id == id).first()
+    async def get_post(self, info: Info, id: int) -> PostType:
+        options = post_load_options(field_selections(info.selected_fields))
+
+        def query_post(db: Session):
+            return db.query(PostModel).options(*options).filter(PostModel.id == id).first()
+
+        post = await info.context["db"].run(query_post)
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
-        return PostType(id=post.id, 
-                        title=post.title, 
-                        content=post.content, 
-                        author_id=post.author.id, 
-                        author_name=post.author.username)
+        prime_loaders(info, posts=[post])
+        return to_post_type(post)
     
     # @strawberry.field
     # def get_users(self) -> List[UserType]:
@@ -290,155 +494,245 @@ class Query:
     #         expired_time=user.expired_time) for user in users]
     
     @strawberry.field
-    def get_posts(self) -> List[PostType]:
-        db = get_db_session()
-        posts = db.query(PostModel).all()
-        return [PostType(id=post.id, 
-                         title=post.title, 
-                         content=post.content, 
-                         author_id=post.author.id, 
-                         author_name=post.author.username) 
-                         for post in posts]
+    async def users_connection(self, 
+                               info: Info,
+                               first: Optional[int] = None,
+                               after: Optional[str] = None,
+                               last: Optional[int] = None,
+                               before: Optional[str] = None) -> UserConnection:
+        """Relay-style 分頁: WHERE id > cursor ORDER BY id LIMIT first"""
+        options = user_load_options(nested_selections(field_selections(info.selected_fields), "edges", "node"))
+
+        def query_page(db: Session):
+            return keyset_page(db.query(UserModel).options(*options), UserModel.id, first, after, last, before)
+
+        users, page_info = await info.context["db"].run(query_page)
+        prime_loaders(info, users=users)
+        return UserConnection(
+            edges=[UserEdge(cursor=encode_cursor(user.id), node=to_user_type(user)) for user in users],
+            page_info=page_info,
+            count_query=lambda db: db.query(func.count(UserModel.id)).scalar())
+
+    @strawberry.field
+    async def posts_connection(self, 
+                               info: Info,
+                               first: Optional[int] = None,
+                               after: Optional[str] = None,
+                               last: Optional[int] = None,
+                               before: Optional[str] = None) -> PostConnection:
+        """Relay-style 分頁: WHERE id > cursor ORDER BY id LIMIT first"""
+        options = post_load_options(nested_selections(field_selections(info.selected_fields), "edges", "node"))
+
+        def query_page(db: Session):
+            return keyset_page(db.query(PostModel).options(*options), PostModel.id, first, after, last, before)
+
+        posts, page_info = await info.context["db"].run(query_page)
+        prime_loaders(info, posts=posts)
+        return PostConnection(
+            edges=[PostEdge(cursor=encode_cursor(post.id), node=to_post_type(post)) for post in posts],
+            page_info=page_info,
+            count_query=lambda db: db.query(func.count(PostModel.id)).scalar())
+
+    @strawberry.field(deprecation_reason="Loads the whole table, use postsConnection instead")
+    async def get_posts(self, info: Info) -> List[PostType]:
+        options = post_load_options(field_selections(info.selected_fields))
+
+        def query_posts(db: Session):
+            return db.query(PostModel).options(*options).all()
+
+        posts = await info.context["db"].run(query_posts)
+        prime_loaders(info, posts=posts)
+        return [to_post_type(post) for post in posts]
     
     # 為查詢提供一個解析器
     @strawberry.field
-    def search(self, keyword: str) -> List[SearchResult]:
-        db = get_db_session()
-        keyword_filter = f"%{keyword}%"
-
-        user_results = db.query(UserModel).filter(UserModel.username.ilike(keyword_filter)).all()
-        post_results = db.query(PostModel).filter(PostModel.title.ilike(keyword_filter)).all()
+    async def search(self, info: Info, keyword: str, limit: int = 20, offset: int = 0) -> List[SearchResult]:
+        """全文檢索 user.username / post.title / post.content，依相關度排序，每個關鍵字皆為 prefix 比對"""
+        limit, offset = max(limit, 0), max(offset, 0)
+        selections = field_selections(info.selected_fields)
+        user_options = user_load_options(selections, ("UserType", "Node"))
+        post_options = post_load_options(selections, ("PostType", "Node"))
+
+        def query_results(db: Session):
+            ranked = search_ids(db, keyword, limit, offset)
+            if ranked is None:
+                # 沒有全文檢索索引的 DB 退回 LIKE
+                keyword_filter = f"%{keyword}%"
+                users = (db.query(UserModel).options(*user_options)
+                         .filter(UserModel.username.ilike(keyword_filter))
+                         .order_by(UserModel.id).limit(limit + offset).all())
+                posts = (db.query(PostModel).options(*post_options)
+                         .filter(PostModel.title.ilike(keyword_filter) | PostModel.content.ilike(keyword_filter))
+                         .order_by(PostModel.id).limit(limit + offset).all())
+                return users, posts, [*users, *posts][offset:offset + limit]
+
+            user_ids = [id for kind, id in ranked if kind == "user"]
+            post_ids = [id for kind, id in ranked if kind == "post"]
+            users = db.query(UserModel).options(*user_options).filter(UserModel.id.in_(user_ids)).all() if user_ids else []
+            posts = db.query(PostModel).options(*post_options).filter(PostModel.id.in_(post_ids)).all() if post_ids else []
+            # 依 rank 的順序排回去
+            by_key = {**{("user", user.id): user for user in users}, **{("post", post.id): post for post in posts}}
+            return users, posts, [by_key[key] for key in ranked if key in by_key]
+
+        user_results, post_results, ordered = await info.context["db"].run(query_results)
+        prime_loaders(info, users=user_results, posts=post_results)
 
         # 將結果轉換為 Strawberry 類型
         results = []
-        for user in user_results:
-            results.append(UserType(
-                id=user.id,
-                username=user.username,
-                email=user.email,
-                posts=[PostType(
-                    id=post.id,
-                    title=post.title,
-                    content=post.content,
-                    author_id=post.author.id,
-                    author_name=post.author.username
-                ) for post in user.posts],
-                signup_time=user.signup_time,
-                expired_time=user.expired_time,
-            ))
-        for post in post_results:
-            if post.author is None:
-                continue  # 跳過沒有作者的帖子
-            results.append(PostType(
-                id=post.id,
-                title=post.title,
-                content=post.content,
-                author_id=post.author.id,
-                author_name=post.author.username,
-            ))
+        for item in ordered:
+            if isinstance(item, UserModel):
+                results.append(to_user_type(item))
+            elif item.author_id is not None:  # 跳過沒有作者的帖子
+                results.append(to_post_type(item))
 
         return results
 
-upload_progress_dict = {}
+# fileUploadProgress 的進度；多個 uvicorn worker 時需設 PROGRESS_STORE_BACKEND=redis 才看得到其他 worker 寫入的進度
+PROGRESS_STORE_BACKEND = os.getenv("PROGRESS_STORE_BACKEND", "memory")
+progress_store = RedisProgressStore(async_redis_conn) if PROGRESS_STORE_BACKEND == "redis" else MemoryProgressStore()
 @strawberry.type
 class Mutation:
     @strawberry.mutation
     # def create_user(self, username: str, email: str) -> UserType:
-    def create_user(self, input: UserInput) -> UserType:
+    async def create_user(self, info: Info, input: UserInput) -> UserType:
         # user_info = {
         #     "username": username,
         #     "email": email
         # }
         # gen_user_token = create_access_token(user_info)
 
-        # db = next(get_db())
-        db = get_db_session()
-        new_user = UserModel(username=input.username, email=input.email)
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-        return UserType(id=new_user.id, 
-                        username=new_user.username, 
-                        email=new_user.email, 
-                        posts=new_user.posts,
-                        signup_time=new_user.signup_time,
-                        expired_time=new_user.expired_time)
+        def insert_user(db: Session):
+            new_user = UserModel(username=input.username, email=input.email)
+            db.add(new_user)
+            db.commit()
+            db.refresh(new_user)
+            return new_user
+
+        new_user = await info.context["db"].run(insert_user)
+        await response_cache.ainvalidate(["UserType"])
+        return to_user_type(new_user)
+
+    @strawberry.mutation
+    async def create_post(self, info: Info, title: str, content: str, author_id: strawberry.ID) -> PostType:
+        def insert_post(db: Session):
+            new_post = PostModel(title=title, content=content, author_id=author_id)
+            db.add(new_post)
+            db.commit()
+            db.refresh(new_post)
+            return new_post
+
+        new_post = await info.context["db"].run(insert_post)
+        await response_cache.ainvalidate(["PostType", f"UserType:{new_post.author_id}"])
+        return to_post_type(new_post)
+
+    @strawberry.mutation
+    async def create_users(self, info: Info, inputs: List[UserInput]) -> CreateUsersResponse:
+        """一次新增多個 user，分批寫入、單一 transaction，個別失敗的項目放在 errors 不影響其他項目"""
+        errors = [BulkItemError(index=i, message="username must not be empty")
+                  for i, item in enumerate(inputs) if not item.username.strip()]
+        failed = {error.index for error in errors}
+        rows = [(i, {"username": item.username, "email": item.email})
+                for i, item in enumerate(inputs) if i not in failed]
+
+        def insert_users(db: Session):
+            inserted, insert_errors = bulk_insert(db, UserModel, rows)
+            # commit 前轉換，RETURNING 已帶回所有欄位，不用在 commit (expire) 後逐筆重新 SELECT
+            users = [to_user_type(inserted[i]) for i in sorted(inserted)]
+            db.commit()
+            return users, insert_errors
+
+        users, insert_errors = await info.context["db"].run(insert_users)
+        errors += [BulkItemError(index=i, message=message) for i, message in insert_errors]
+        if users:
+            await response_cache.ainvalidate(["UserType"])
+        return CreateUsersResponse(users=users, errors=sorted(errors, key=lambda e: e.index))
 
     @strawberry.mutation
-    def create_post(self, title: str, content: str, author_id: strawberry.ID) -> PostType:
-        # db = next(get_db())
-        db = get_db_session()
-        new_post = PostModel(title=title, content=content, author_id=author_id)
-        db.add(new_post)
-        db.commit()
-        db.refresh(new_post)
-        return PostType(id=new_post.id, 
-                        title=new_post.title, 
-                        content=new_post.content, 
-                        author_id=new_post.author.id, 
-                        author_name=new_post.author.username)
+    async def create_posts(self, info: Info, inputs: List[PostInput]) -> CreatePostsResponse:
+        """一次新增多篇 post，author 不存在的項目放在 errors，其餘照常寫入"""
+        errors, rows = [], []
+        for i, item in enumerate(inputs):
+            try:
+                rows.append((i, {"title": item.title, "content": item.content, "author_id": int(item.author_id)}))
+            except ValueError:
+                errors.append(BulkItemError(index=i, message=f"Invalid authorId: {item.author_id}"))
+
+        def insert_posts(db: Session):
+            # sqlite 預設不檢查 foreign key，先一次查出存在的 author
+            author_ids = {values["author_id"] for _, values in rows}
+            existing = {id for (id,) in db.query(UserModel.id).filter(UserModel.id.in_(author_ids))} if author_ids else set()
+            missing = [(i, f"User with id {values['author_id']} not found")
+                       for i, values in rows if values["author_id"] not in existing]
+            inserted, insert_errors = bulk_insert(db, PostModel, [row for row in rows if row[1]["author_id"] in existing])
+            posts = [to_post_type(inserted[i]) for i in sorted(inserted)]
+            db.commit()
+            return posts, missing + insert_errors
+
+        posts, insert_errors = await info.context["db"].run(insert_posts)
+        errors += [BulkItemError(index=i, message=message) for i, message in insert_errors]
+        if posts:
+            await response_cache.ainvalidate(["PostType", *{f"UserType:{post.author_id}" for post in posts}])
+        return CreatePostsResponse(posts=posts, errors=sorted(errors, key=lambda e: e.index))
 
     @strawberry.mutation
-    def update_user(self, id: strawberry.ID, username: Optional[str] = None, email: Optional[str] = None) -> UserType:
-        # db = next(get_db())
-        db = get_db_session()
-        user = db.query(UserModel).filter(UserModel.id == id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        user.username = username
-        user.email = email
-        db.commit()
-        db.refresh(user)
-        return UserType(
-            id=user.id, 
-            username=user.username, 
-            email=user.email, 
-            posts=user.posts,
-            signup_time=user.signup_time,
-            expired_time=user.expired_time)
+    async def update_user(self, info: Info, id: strawberry.ID, username: Optional[str] = None, email: Optional[str] = None) -> UserType:
+        """只更新有傳入的欄位"""
+        def save_user(db: Session):
+            user = db.query(UserModel).filter(UserModel.id == id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            if username is not None:
+                user.username = username
+            if email is not None:
+                user.email = email
+            db.commit()
+            db.refresh(user)
+            return user
+
+        user = await info.context["db"].run(save_user)
+        await response_cache.ainvalidate(["UserType", f"UserType:{user.id}"])
+        return to_user_type(user)
 
     @strawberry.mutation
-    def delete_user(self, id: strawberry.ID) -> UserType:
+    async def delete_user(self, info: Info, id: strawberry.ID) -> UserType:
         #TODO: posts not deleted
-        # db = next(get_db())
-        db = get_db_session()
-        user = db.query(UserModel).filter(UserModel.id == id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        db.delete(user)
-        db.commit()
-        return UserType(
-            id=user.id, 
-            username=user.username, 
-            email=user.email, 
-            posts=user.posts,
-            signup_time=user.signup_time,
-            expired_time=user.expired_time)
+        def remove_user(db: Session):
+            user = db.query(UserModel).filter(UserModel.id == id).first()
+            if not user:
+                raise HTTPException(status_code=404, detail="User not found")
+            # cascade 會一起刪掉 posts，先記下 id 讓快取的單篇 post 失效
+            post_ids = [post.id for post in user.posts]
+            db.delete(user)
+            db.commit()
+            return user, post_ids
+
+        user, post_ids = await info.context["db"].run(remove_user)
+        await response_cache.ainvalidate(["UserType", f"UserType:{user.id}", "PostType",
+                                         *(f"PostType:{post_id}" for post_id in post_ids)])
+        return to_user_type(user)
 
     @strawberry.mutation
-    def delete_post(self, id: strawberry.ID) -> PostType:
-        # db = next(get_db())
-        
-        db = get_db_session()
-        post = db.query(PostModel).filter(PostModel.id == id).first()
-        if not post:
-            raise HTTPException(status_code=404, detail="Post not found")
-        db.delete(post)
-        db.commit()
-        return PostType(id=post.id, 
-                        title=post.title, 
-                        content=post.content, 
-                        author_id=post.author.id, 
-                        author_name=post.author.username)   
+    async def delete_post(self, info: Info, id: strawberry.ID) -> PostType:
+        def remove_post(db: Session):
+            post = db.query(PostModel).filter(PostModel.id == id).first()
+            if not post:
+                raise HTTPException(status_code=404, detail="Post not found")
+            db.delete(post)
+            db.commit()
+            return post
+
+        post = await info.context["db"].run(remove_post)
+        await response_cache.ainvalidate(["PostType", f"PostType:{post.id}", f"UserType:{post.author_id}"])
+        return to_post_type(post)
     
     @strawberry.mutation
     async def upload_file(self, file_id: str) -> str:
         """模擬上傳文件 (沒有放背景執行)"""
-        upload_progress_dict[file_id] = 0  # 初始化進度
+        await progress_store.set(file_id, 0)  # 初始化進度
 
         for i in range(1, 11):
             await asyncio.sleep(1)  # 模擬處理時間
-            upload_progress_dict[file_id] = i * 10  # 更新進度
+            await progress_store.set(file_id, i * 10)  # 更新進度
         
         return f"檔案 {file_id} 上傳完成"
     """
@@ -448,33 +742,87 @@ class Mutation:
     """
     
     @strawberry.mutation
-    async def upload_file_in_task(self, file_name: str) -> UploadResponseType:
-        """模擬上傳文件 (放背景執行)"""
-        job = upload_file_queue.enqueue(process_file, file_name)  # 在背景執行上傳
+    async def upload_file_in_task(self, info: Info, stored_name: str,
+                                  priority: Optional[JobPriority] = None) -> UploadResponseType:
+        """處理已上傳的檔案 (放背景執行)；stored_name 為 /upload/ 或 /uploads/ 完成時回傳的值，
+        priority 不指定時依檔案大小與角色決定 queue
+        """
+        role = request_role(info.context["request"].headers)
+        try:
+            file_path = stored_file_path(stored_name)
+            job = await run_in_threadpool(submit_file_job, file_path, role, priority)  # 在背景執行上傳
+        except UploadError as e:
+            raise GraphQLError(str(e), extensions={"code": "BAD_USER_INPUT"})
+        except FileNotFoundError:
+            # 檢查之後檔案被刪除
+            raise GraphQLError(f"Uploaded file not found: {stored_name}", extensions={"code": "BAD_USER_INPUT"})
         print(f"Job {job.id} added to queue")
         return UploadResponseType(
             message="開始上傳檔案",
-            file_name=file_name,
+            file_name=stored_name,
             job_id=str(job.id)
         )
         # return f"開始上傳檔案 {file_name}, {job.id}"
     """
     mutation uploadFile{
-        uploadFileInTask (fileName: "example.txt")
+        uploadFileInTask (storedName: "<POST /upload/ 回傳的 stored_name>") { jobId }
     }
     """
     
 # 到 worker 看 log, 記得要先啟動 worker !!!!!!
-def process_file(file_name: str):
-    """ 模擬處理上傳的檔案，並更新進度 """
+def process_file(file_path: str):
+    """ 處理上傳的檔案，依處理完的 bytes 更新進度；file_path 為 /upload 寫入磁碟的路徑 (UPLOAD_DIR 需與 worker 共用)
+
+    檔案依換行切段交給 process pool 統計 bytes / lines / words，結果為 job 的回傳值
+    """
     job = rq.get_current_job()
+    file_name = os.path.basename(file_path)
     print(f"current job: {job}")
-    for i in range(1, 11):
-        time.sleep(2)
-        progress = i * 10
-        job.meta["progress"] = progress
-        job.save_meta()
-        print(f"Processing file {file_name}, progress: {progress}%")
+    last_progress = -1
+
+    def on_progress(processed: int, total: int):
+        nonlocal last_progress
+        progress = processed * 100 // total if total else 100
+        # 進度百分比有變才寫入 Redis
+        if job is not None and progress != last_progress:
+            save_progress(job, progress, processed_bytes=processed, total_bytes=total)
+        last_progress = progress
+        print(f"Processing file {file_name}, progress: {progress}% ({processed}/{total} bytes)")
+
+    return process_file_chunks(file_path, on_progress)
+
+def process_file_batch(queue_name: str, batch_id: str):
+    """處理併在一起的小檔案，進度以所有檔案的 bytes 合計；回傳 {檔案路徑: 統計結果}
+
+    排隊期間被刪除的檔案不影響其他檔案，結果為 {"error": ...}
+    """
+    job = rq.get_current_job()
+    connection = job.connection if job is not None else redis_conn
+    paths = claim_batch(connection, queue_name, batch_id)
+    results = {path: {"error": "File not found"} for path in paths if not os.path.isfile(path)}
+    paths = [path for path in paths if path not in results]
+    total = sum(os.path.getsize(path) for path in paths)
+    processed = 0
+    for path in paths:
+        results[path] = process_file_chunks(path)
+        processed += results[path]["bytes"]
+        if job is not None:
+            save_progress(job, processed * 100 // total if total else 100,
+                          processed_bytes=processed, total_bytes=total, files=len(paths))
+    print(f"Processed batch {batch_id}: {len(paths)} files, {total} bytes")
+    return results
+
+def fetch_job_status(job_id: str):
+    """回傳 (status, progress)，找不到 job 時回傳 None"""
+    try:
+        job = rq.job.Job.fetch(str(job_id), connection=redis_conn)
+    except rq.exceptions.NoSuchJobError:
+        return None
+    if job.is_finished:
+        return "finished", 100
+    if job.is_failed:
+        return "failed", -1
+    return "started", job.meta.get("progress", 0)
 
 @strawberry.type
 class Subscription:
@@ -487,36 +835,76 @@ class Subscription:
 
     @strawberry.subscription
     async def file_upload_progress(self, file_id: str) -> AsyncGenerator[int, None]:
-        """訂閱檔案上傳進度"""
-        while file_id in upload_progress_dict and upload_progress_dict[file_id] < 100:
-            yield upload_progress_dict[file_id]
-            await asyncio.sleep(0.5)  # 每 0.5 秒推送一次進度
+        """訂閱檔案上傳進度，進度改變時才推送 (不再每 0.5 秒輪詢)"""
+        if await progress_store.get(file_id) is not None:
+            async for progress in progress_store.watch(file_id):
+                if progress is None or progress >= 100:
+                    break
+                yield progress
 
         yield 100 # 確保最後 100% 狀態被傳送
 
+    @strawberry.subscription
+    async def stream_posts(self, 
+                           info: Info,
+                           author_id: Optional[int] = None,
+                           limit: int = 100,
+                           batch_size: int = 100) -> AsyncGenerator[List[PostType], None]:
+        """以 DB cursor 分批推送 posts，第一批查到就送出，不用等整個 list 建完
+
+        graphql-core 3.2 還不支援 @defer / @stream，改用 subscription 達到同樣的分段傳輸
+        HTTP 以 multipart/mixed 回傳，需帶 Accept: multipart/mixed;boundary="graphql";subscriptionSpec=1.0
+        limit 為最多推送的 post 數，QueryCostExtension 以它計算成本
+        """
+        options = post_load_options(field_selections(info.selected_fields))
+        statement = select(PostModel).options(*options).order_by(PostModel.id)
+        if author_id is not None:
+            statement = statement.filter(PostModel.author_id == author_id)
+        statement = statement.limit(max(limit, 0))
+
+        streamed = False
+        async for posts in stream_scalars(session_factory, statement, max(batch_size, 1)):
+            prime_loaders(info, posts=posts)
+            streamed = True
+            yield [to_post_type(post) for post in posts]
+        if not streamed:
+            # subscription 至少要送出一次結果
+            yield []
+    """
+    subscription {
+        streamPosts(limit: 300, batchSize: 100) { id title authorName }
+    }
+    """
+
     @strawberry.subscription
     async def upload_progress(self, job_id: str) -> AsyncGenerator[str, None]:
-        """ 監控 Redis 任務進度，顯示進度 (0~100%) """
-        while True:
-            try:
-                job = rq.job.Job.fetch(str(job_id), connection=redis_conn)
-            except rq.exceptions.NoSuchJobError:
-                yield "如果找不到 Job 回傳"
-                break
-
-            if job.is_finished:
-                yield "任務完成回傳 100%"
-                break
-            elif job.is_failed:
-                yield "任務失敗回傳 -1"
-                break
-            else:
-                try:
-                    yield f"資料處理中 {job.meta['progress']}%"
-                except Exception as e:
-                    yield "資料處理中 0%"
+        """ 監控 Redis 任務進度，顯示進度 (0~100%)
+
+        先讀一次 job 目前的狀態，之後由 worker publish 的事件推送，不再每秒輪詢 Redis
+        """
+        async with progress_broadcaster.subscribe(str(job_id)) as events:
+            status = await run_in_threadpool(fetch_job_status, job_id)
+            while True:
+                if status is None:
+                    yield "如果找不到 Job 回傳"
+                    break
+
+                state, progress = status
+                if state == "finished":
+                    yield "任務完成回傳 100%"
+                    break
+                elif state == "failed":
+                    yield "任務失敗回傳 -1"
+                    break
+                else:
+                    yield f"資料處理中 {progress or 0}%"
 
-            await asyncio.sleep(1)  # 每秒更新一次
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=PROGRESS_RECHECK_SECONDS)
+                    status = event["status"], event["progress"]
+                except asyncio.TimeoutError:
+                    # 太久沒有事件 (例如 worker 中途被砍掉)，回頭確認一次 job 的狀態
+                    status = await run_in_threadpool(fetch_job_status, job_id)
     """
     subscription checkUploadProgress{
         uploadProgress(jobId: "b84b8cbd-3bfd-4858-98cc-a1d7fc98aa25")
@@ -524,34 +912,145 @@ class Subscription:
     """
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
+# parse + validate 結果快取，跨 request 共用
+document_cache = LRUCache(maxsize=int(os.getenv("DOCUMENT_CACHE_SIZE", "1000")))
+# 執行前的成本 / 深度檢查，擋掉 getUser(limit: 1000000) 這類 query
+query_cost_extension = partial(
+    QueryCostExtension,
+    max_cost=int(os.getenv("MAX_QUERY_COST", "1000")),
+    max_depth=int(os.getenv("MAX_QUERY_DEPTH", "10")),
+    field_weights={"PostType.authorName": 1, "PostConnection.totalCount": 1, "UserConnection.totalCount": 1},  # 純量但需要查 DB
+    list_sizes={"Query.getPosts": int(os.getenv("GET_POSTS_COST_SIZE", "100"))},  # 沒有 limit，會載入整張 post 表
+)
+# read query 結果快取，mutation 會依照碰到的實體讓相關結果失效
+# RESPONSE_CACHE_BACKEND=redis 時多個 worker 共用
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+if os.getenv("RESPONSE_CACHE_BACKEND", "memory") == "redis":
+    response_cache = RedisCache(redis_conn, prefix="gql:", ttl=RESPONSE_CACHE_TTL,
+                                invalidated_window=DB_PRIMARY_STICKY_SECONDS)
+else:
+    response_cache = LRUCache(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "1000")), ttl=RESPONSE_CACHE_TTL,
+                              invalidated_window=DB_PRIMARY_STICKY_SECONDS)
+response_cache_extension = partial(
+    ResponseCacheExtension,
+    cache=response_cache,
+    entity_types=("UserType", "PostType"),
+    collection_types={"UserConnection": "UserType", "PostConnection": "PostType"},
+    # 作者改名 / 刪除時，內含作者資料的 post 結果也要失效
+    references={"PostType.author": ("UserType", "author_id"), "PostType.authorName": ("UserType", "author_id")},
+    skip_root_fields=("hello",),  # 依 request header 回傳，不能共用
+    # 剛失效的結果從 primary 重建，replica 的舊資料不會被寫回快取
+    on_repopulate=lambda context: context["db"].use_primary(),
+)
+# operation 名稱由 client 決定，/metrics 只以 METRICS_OPERATION_NAMES (逗號分隔) 內的名稱當 label，
+# 未設定時只記錄最先出現的 METRICS_MAX_OPERATION_NAMES 個，其餘為 "other"
+metrics_extension = partial(
+    MetricsExtension,
+    operation_names=[name.strip() for name in os.getenv("METRICS_OPERATION_NAMES", "").split(",") if name.strip()],
+    max_operation_names=int(os.getenv("METRICS_MAX_OPERATION_NAMES", "100")),
+)
+# SQL_TRACE=header: request 帶 X-SQL-Trace header 時在 extensions.sqlTrace 回傳執行的 SQL 與 N+1 提示
+# SQL_TRACE=always: 每個 request 都回傳 (測試用)；SQL_STATEMENT_BUDGET: trace 時 SQL 數量的上限，超過會回傳 error
+SQL_TRACE = os.getenv("SQL_TRACE", "off")
+sql_trace_extension = partial(
+    SQLTraceExtension,
+    enabled=SQL_TRACE == "always",
+    header="x-sql-trace" if SQL_TRACE == "header" else None,
+    statement_budget=int(os.environ["SQL_STATEMENT_BUDGET"]) if os.getenv("SQL_STATEMENT_BUDGET") else None,
+)
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription,
+                           extensions=[metrics_extension,
+                                       sql_trace_extension,
+                                       partial(RequestSessionExtension, factory=session_factory,
+                                               per_operation=operation_loaders,
+                                               sticky_seconds=DB_PRIMARY_STICKY_SECONDS if REPLICA_URLS else 0),
+                                       partial(DocumentCacheExtension, cache=document_cache),
+                                       query_cost_extension,
+                                       response_cache_extension])
 # graphql_app = GraphQL(schema)
-graphql_app = GraphQLRouter(schema)
+# APQ_BACKEND=redis 時多個 worker 共用同一份 persisted query
+APQ_BACKEND = os.getenv("APQ_BACKEND", "memory")
+persisted_query_store = RedisCache(redis_conn, prefix="apq:") if APQ_BACKEND == "redis" else LRUCache(maxsize=1000)
+graphql_app = APQGraphQLRouter(schema, persisted_query_store=persisted_query_store)
 
-app = FastAPI(title="FastAPI + GraphQL Example", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    Base.metadata.create_all(bind=engine)
+    print("Database connected on startup")
+
+    yield
+
+    await dispose_engines(engine, *replica_engines, async_engine, *async_replica_engines)
+    print("Database disconnected on shutdown")
+
+app = FastAPI(title="FastAPI + GraphQL Example", version="1.0.0", default_response_class=FastJSONResponse,
+              lifespan=lifespan)
 # app.add_route("/graphql", graphql_app)
 app.include_router(graphql_app, prefix="/graphql")
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return metrics_response()
+
 # API 端點：處理檔案上傳
 @app.post("/upload/")
-async def upload(file: UploadFile = File(...), background_tasks: BackgroundTasks = BackgroundTasks()):
-    """處理檔案上傳，並在背景執行模擬的上傳進度"""
+async def upload(request: Request, file: UploadFile = File(...), priority: Optional[JobPriority] = None,
+                 background_tasks: BackgroundTasks = BackgroundTasks()):
+    """處理檔案上傳：以 chunk 串流寫入磁碟並計算 sha256，worker 收到的是檔案路徑"""
     file_name = file.filename
     # background_tasks.add_task(upload_file_simulation, file_name)  # 在背景執行上傳
     # return {"message": "上傳開始 in background ", "file_name": file_name}
 
-    job = upload_file_queue.enqueue(process_file, file_name)  # 在背景執行上傳
-    return {"message": "上傳開始 in queue ", "file_name": file_name}
+    saved = await save_upload_file(file)
+    job = await run_in_threadpool(submit_file_job, saved["path"], request_role(request.headers), priority)
+    return {"message": "上傳開始 in queue ", "file_name": file_name, "stored_name": saved["stored_name"],
+            "job_id": job.id, "queue": job.origin, "size": saved["size"], "sha256": saved["sha256"]}
+
+# 可續傳的分段上傳：POST 建立 session -> PATCH 依 offset 送出 bytes -> 斷線後 GET 查詢 offset 再續傳
+class UploadSessionInput(BaseModel):
+    file_name: str
+    size: int  # 檔案總大小 (bytes)
+    sha256: Optional[str] = None  # 選填，完成時驗證內容
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    return FastJSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.post("/uploads/")
+async def create_upload_session(body: UploadSessionInput):
+    return await run_in_threadpool(create_session, body.file_name, body.size, body.sha256)
+
+@app.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """查詢已寫入的 offset，續傳時從這個位置開始送"""
+    return await run_in_threadpool(get_session, upload_id)
+
+@app.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, upload_offset: int = Header(...),
+                       priority: Optional[JobPriority] = None):
+    """body 為原始 bytes，Upload-Offset header 為這段資料的起始位置；送完最後一段後排入 worker 處理"""
+    state = await append_chunk(upload_id, upload_offset, request.stream())
+    if state["path"] is not None:
+        job = await run_in_threadpool(submit_file_job, state["path"], request_role(request.headers), priority)
+        state["job_id"] = job.id
+        state["queue"] = job.origin
+    return state
+
+@app.get("/queues/metrics")
+async def queue_metrics():
+    """各 queue 的排隊數、執行中數與等待時間，用來調整 worker 數量"""
+    return await run_in_threadpool(job_scheduler.metrics)
 
 # 模擬檔案上傳的背景任務
 async def upload_file_simulation(file_id: str):
-    upload_progress_dict[file_id] = 0
+    await progress_store.set(file_id, 0)
     for i in range(1, 11):
-        print(upload_progress_dict)
+        print(file_id, await progress_store.get(file_id))
         await asyncio.sleep(1)  # 模擬上傳過程
-        upload_progress_dict[file_id] = i * 10
-    upload_progress_dict[file_id] = 100
-    print(upload_progress_dict)
+        await progress_store.set(file_id, i * 10)
+    await progress_store.set(file_id, 100)
+    print(file_id, await progress_store.get(file_id))
 
 async def event_stream():
     """模擬即時資料流，使用非同步方式來減少延遲"""
@@ -572,21 +1071,15 @@ app.add_middleware(
     allow_headers=["*"],  # 設置允許的 Header
 )
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
-    print("Database connected on startup")
-
-    yield
-
-    engine.dispose()
-    print("Database disconnected on shutdown")
-
-
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
+@app.get("/graphql_document_cache", tags=["Health"])
+async def graphql_document_cache():
+    """document cache 的 hit / miss / eviction 計數"""
+    return document_cache.stats()
+
 class Fruit(BaseModel):
 	name: str
 	price: float
@@ -625,23 +1118,41 @@ class ContentModel(BaseModel):
     content: str
     collection_name: str = "dify_upload"
 
+# 每次 insert_many 的筆數上限，記憶體只保留一個 batch
+MONGO_INSERT_BATCH_SIZE = int(os.getenv("MONGO_INSERT_BATCH_SIZE", "1000"))
+
 # create a endpoint to save file to mongo
 @app.post("/save_to_mongo/", operation_id="save_to_mongo")
 async def save_to_mongo(input_data: ContentModel):    
-    md_string = input_data.content
-    data = [line.split('|')[1:-1] for line in md_string.strip().split('\n')]
-    columns = [ _.strip() for _ in data[0]]
-    cleaned_data = [[item.strip() for item in row] for row in data[2:]]
-    df = pd.DataFrame(cleaned_data, columns=columns)
-    df["created_datetime"] = datetime.now()
-    data = df.to_dict(orient="records")
-    # data = [dict(zip(columns, row)) for row in cleaned_data]
+    """markdown 表格逐列解析，每 MONGO_INSERT_BATCH_SIZE 筆寫入一次，回傳筆數與每秒寫入筆數"""
+    started = time.perf_counter()
+    created_datetime = datetime.now()
     
     collection_id = uuid.uuid4().hex[:16]
     db = client["dify"]
-    collection = db[f"{input_data.collection_name}_{collection_id}"]
-    collection.insert_many(data)
-    return {"message": "Data saved successfully"}
+    collection_name = f"{input_data.collection_name}_{collection_id}"
+    collection = db[collection_name]
+
+    rows, failed = 0, 0
+    for batch in batched(iter_markdown_rows(input_data.content), MONGO_INSERT_BATCH_SIZE):
+        for row in batch:
+            row["created_datetime"] = created_datetime
+        try:
+            # ordered=False: 單筆失敗不影響同一批的其他筆
+            rows += len((await collection.insert_many(batch, ordered=False)).inserted_ids)
+        except BulkWriteError as e:
+            rows += e.details["nInserted"]
+            failed += len(e.details["writeErrors"])
+
+    elapsed = time.perf_counter() - started
+    return {
+        "message": "Data saved successfully",
+        "collection": collection_name,
+        "rows": rows,
+        "failed_rows": failed,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
 
 # db = client["mydatabase"]
 # collection = db["texts"]
@@ -0,0 +1,76 @@
+"""simple_main 的 DB (./simple.db) 與上傳目錄 (./uploads) 都是相對路徑，整個測試 session 在暫存目錄中執行"""
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+@pytest.fixture(scope="session")
+def workdir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("app")
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+@pytest.fixture(scope="session")
+def simple_main(workdir):
+    import simple_main
+    return simple_main
+
+@pytest.fixture(scope="session")
+def client(simple_main):
+    with TestClient(simple_main.app) as client:
+        yield client
+
+@pytest.fixture
+def graphql(client):
+    """送出 GraphQL request，回傳 response JSON"""
+    def execute(query: str, variables: dict = None, **kwargs) -> dict:
+        return client.post("/graphql", json={"query": query, "variables": variables or {}}, **kwargs).json()
+    return execute
+
+@pytest.fixture
+def create_user(graphql):
+    def create(username: str = "alice") -> int:
+        result = graphql("mutation($input: UserInput!) { createUser(input: $input) { id } }",
+                         {"input": {"username": username, "email": f"{username}@example.com"}})
+        return int(result["data"]["createUser"]["id"])
+    return create
+
+@pytest.fixture
+def statements(simple_main):
+    """這個 test 期間 simple_main 執行的 SQL"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    # DB_ASYNC=true 時 resolver 走 async engine
+    engine = simple_main.async_engine.sync_engine if simple_main.async_engine else simple_main.engine
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def job_queues(simple_main, monkeypatch):
+    """以 fakeredis 取代 simple_main 的 rq queues，回傳 {JobPriority: Queue}"""
+    import fakeredis
+    from rq import Queue
+
+    from handler.scheduler import JobPriority, JobScheduler
+    connection = fakeredis.FakeRedis()
+    queues = {priority: Queue(f"test_{priority.value}", connection=connection) for priority in JobPriority}
+    monkeypatch.setattr(simple_main, "job_scheduler", JobScheduler(queues))
+    return queues
+
+@pytest.fixture
+def run_jobs(job_queues):
+    """在目前的 process 以 burst 模式執行完所有排隊中的 job"""
+    from rq import SimpleWorker
+
+    def run():
+        queues = list(job_queues.values())
+        SimpleWorker(queues, connection=queues[0].connection).work(burst=True)
+    return run
@@ -0,0 +1,49 @@
+import hashlib
+
+import pytest
+
+QUERY = "query ApqProbe { getPosts { id } }"
+HASH = hashlib.sha256(QUERY.encode("utf-8")).hexdigest()
+
+
+def persisted(query_hash: str, query: str = None) -> dict:
+    body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}}
+    if query is not None:
+        body["query"] = query
+    return body
+
+def test_register_then_execute_by_hash(client):
+    missing = client.post("/graphql", json=persisted(HASH)).json()
+    assert missing["errors"][0]["extensions"]["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    registered = client.post("/graphql", json=persisted(HASH, QUERY)).json()
+    assert "errors" not in registered
+
+    by_hash = client.post("/graphql", json=persisted(HASH)).json()
+    assert by_hash["data"] == registered["data"]
+
+def test_hash_must_match_query(client):
+    result = client.post("/graphql", json=persisted("0" * 64, QUERY)).json()
+    assert result["errors"][0]["extensions"]["code"] == "BAD_USER_INPUT"
+
+def test_get_request_by_hash(client):
+    client.post("/graphql", json=persisted(HASH, QUERY))
+    response = client.get("/graphql", params={
+        "extensions": '{"persistedQuery": {"version": 1, "sha256Hash": "%s"}}' % HASH})
+    assert response.status_code == 200
+    assert "getPosts" in response.json()["data"]
+
+def test_missing_hash_is_bad_user_input(client):
+    for persisted_query in ({"version": 1}, {"version": 1, "sha256Hash": None}, {"version": 1, "sha256Hash": 1}):
+        response = client.post("/graphql", json={"query": QUERY, "extensions": {"persistedQuery": persisted_query}})
+        assert response.status_code == 200
+        assert response.json()["errors"][0]["extensions"]["code"] == "BAD_USER_INPUT"
+
+@pytest.mark.parametrize("extensions", [["persistedQuery"], "persistedQuery", {"persistedQuery": "abc"}])
+def test_malformed_extensions_is_bad_request(client, extensions):
+    response = client.post("/graphql", json={"query": QUERY, "extensions": extensions})
+    assert response.status_code == 400
+
+def test_get_with_invalid_extensions_json_is_bad_request(client):
+    response = client.get("/graphql", params={"query": QUERY, "extensions": "{not json"})
+    assert response.status_code == 400
@@ -0,0 +1,28 @@
+def test_create_users_inserts_in_one_statement(graphql, statements):
+    inputs = [{"username": f"bulk{i}", "email": f"bulk{i}@example.com"} for i in range(50)]
+    result = graphql("mutation($inputs: [UserInput!]!) { createUsers(inputs: $inputs) { users { id username } errors { index } } }",
+                     {"inputs": inputs})
+
+    users = result["data"]["createUsers"]["users"]
+    assert [user["username"] for user in users] == [item["username"] for item in inputs]
+    assert len({user["id"] for user in users}) == 50
+    inserts = [statement for statement in statements if statement.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 1
+    # SAVEPOINT / INSERT / RELEASE，commit 後不再逐筆 SELECT
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+
+def test_create_posts_maps_rows_back_to_inputs(graphql, create_user, statements):
+    author_id = create_user("bulkauthor")
+    statements.clear()
+    inputs = [{"title": "same", "content": "c", "authorId": str(author_id)},
+              {"title": "missing author", "content": "c", "authorId": "999999"},
+              {"title": "other", "content": "c", "authorId": str(author_id)},
+              {"title": "same", "content": "c", "authorId": str(author_id)}]
+    result = graphql("mutation($inputs: [PostInput!]!) { createPosts(inputs: $inputs) { posts { id title } errors { index message } } }",
+                     {"inputs": inputs})
+
+    data = result["data"]["createPosts"]
+    assert [post["title"] for post in data["posts"]] == ["same", "other", "same"]
+    assert len({post["id"] for post in data["posts"]}) == 3
+    assert [error["index"] for error in data["errors"]] == [1]
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("INSERT")]) == 1
@@ -0,0 +1,35 @@
+MULTIPART = {"accept": 'multipart/mixed;boundary="graphql";subscriptionSpec=1.0,application/json'}
+
+
+def test_over_budget_query_is_rejected(graphql):
+    result = graphql("{ getUser(limit: 1000000) { id posts { id title } } }")
+    assert result["data"] is None
+    assert result["errors"][0]["extensions"]["code"] == "QUERY_TOO_COMPLEX"
+
+def test_stream_posts_cost_scales_with_limit(client):
+    query = "subscription($limit: Int!) { streamPosts(limit: $limit) { id title authorName } }"
+    rejected = client.post("/graphql", json={"query": query, "variables": {"limit": 1000000}}, headers=MULTIPART)
+    assert "QUERY_TOO_COMPLEX" in rejected.text
+
+    accepted = client.post("/graphql", json={"query": query, "variables": {"limit": 10}}, headers=MULTIPART)
+    assert accepted.status_code == 200
+    assert "QUERY_TOO_COMPLEX" not in accepted.text
+    assert '"streamPosts"' in accepted.text
+
+def test_stream_posts_stops_at_limit(simple_main, client, create_user):
+    author_id = create_user("streamer")
+    with simple_main.SessionLocal() as db:
+        db.add_all(simple_main.PostModel(title=f"stream {i}", content="c", author_id=author_id) for i in range(5))
+        db.commit()
+
+    response = client.post("/graphql", headers=MULTIPART, json={
+        "query": "subscription($authorId: Int) { streamPosts(authorId: $authorId, limit: 3, batchSize: 2) { title } }",
+        "variables": {"authorId": author_id}})
+    assert response.text.count('"title"') == 3
+
+def test_get_posts_is_charged_as_unbounded_list(graphql):
+    result = graphql("{ getPosts { id } }")
+    assert result["extensions"]["cost"]["requested"] == 100
+
+    nested = graphql("{ getPosts { author { posts { title } } } }")  # 100 * (1 + 10 * 1)
+    assert nested["errors"][0]["extensions"]["code"] == "QUERY_TOO_COMPLEX"
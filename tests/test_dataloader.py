@@ -0,0 +1,21 @@
+def test_post_without_author_resolves_null(simple_main, graphql):
+    with simple_main.SessionLocal() as db:
+        post = simple_main.PostModel(title="orphan", content="no author")
+        db.add(post)
+        db.commit()
+        post_id = post.id
+
+    result = graphql("query($id: Int!) { getPost(id: $id) { title author { id } authorName } }", {"id": post_id})
+    assert "errors" not in result
+    assert result["data"]["getPost"] == {"title": "orphan", "author": None, "authorName": ""}
+
+def test_post_author_is_batched(simple_main, graphql, create_user):
+    author_id = create_user("dataloader")
+    for title in ("first", "second"):
+        graphql("mutation($authorId: ID!, $title: String!) { createPost(title: $title, content: \"c\", authorId: $authorId) { id } }",
+                {"authorId": str(author_id), "title": title})
+
+    result = graphql("query($id: Int!) { getUser(id: $id) { posts { title author { username } } } }", {"id": author_id})
+    posts = result["data"]["getUser"][0]["posts"]
+    assert [post["title"] for post in posts] == ["first", "second"]
+    assert {post["author"]["username"] for post in posts} == {"dataloader"}
@@ -0,0 +1,59 @@
+from functools import partial
+
+import pytest
+import strawberry
+
+from cache.backend import LRUCache
+from extension.document_cache import DocumentCacheExtension
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    def hello(self, name: str = "world") -> str:
+        return f"hello {name}"
+
+
+@pytest.fixture
+def cache():
+    return LRUCache(maxsize=2)
+
+@pytest.fixture
+def schema(cache):
+    return strawberry.Schema(query=Query, extensions=[partial(DocumentCacheExtension, cache=cache)])
+
+def test_second_request_hits_cache(schema, cache):
+    first = schema.execute_sync("{ hello }")
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    second = schema.execute_sync("{ hello }")
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert second.data == first.data == {"hello": "hello world"}
+
+def test_variables_reuse_cached_document(schema, cache):
+    query = "query($name: String!) { hello(name: $name) }"
+    schema.execute_sync(query, variable_values={"name": "a"})
+    result = schema.execute_sync(query, variable_values={"name": "b"})
+    assert cache.hits == 1
+    assert result.data == {"hello": "hello b"}
+
+def test_least_recently_used_document_is_evicted(schema, cache):
+    schema.execute_sync("{ a: hello }")
+    schema.execute_sync("{ b: hello }")
+    schema.execute_sync("{ a: hello }")  # a 變成最近使用
+    schema.execute_sync("{ c: hello }")  # 淘汰 b
+    assert cache.evictions == 1
+
+    hits = cache.hits
+    schema.execute_sync("{ a: hello }")
+    assert cache.hits == hits + 1
+    schema.execute_sync("{ b: hello }")
+    assert cache.hits == hits + 1
+
+@pytest.mark.parametrize("query", ["{ hello", "{ missing }"])
+def test_invalid_query_is_not_cached(schema, cache, query):
+    for _ in range(2):
+        result = schema.execute_sync(query)
+        assert result.errors
+    assert cache.hits == 0
+    assert cache.stats()["size"] == 0
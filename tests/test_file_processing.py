@@ -0,0 +1,68 @@
+import os
+import random
+
+import pytest
+
+from handler import file_processing
+from handler.file_processing import chunk_ranges, process_file_chunks, process_range
+
+
+def expected(data: bytes) -> dict:
+    return {"bytes": len(data), "lines": data.count(b"\n"), "words": len(data.split())}
+
+@pytest.fixture
+def write(tmp_path):
+    def write_file(data: bytes) -> str:
+        path = tmp_path / "data.txt"
+        path.write_bytes(data)
+        return str(path)
+    return write_file
+
+@pytest.mark.parametrize("data", [
+    b"abcdefgh",  # 一個字跨過所有 block
+    b"abc def\tgh\n",
+    b"  ab  cd  ",
+    b"a\nb\nc\n\n",
+    b"",
+])
+def test_words_across_read_blocks(monkeypatch, write, data):
+    monkeypatch.setattr(file_processing, "READ_BLOCK_SIZE", 3)
+    assert process_range(write(data), 0, len(data)) == expected(data)
+
+def test_random_content_matches_split(monkeypatch, write):
+    rng = random.Random(0)
+    data = bytes(rng.choice(b"ab \n\t") for _ in range(5000))
+    path = write(data)
+    for block_size in (1, 2, 7, 64):
+        monkeypatch.setattr(file_processing, "READ_BLOCK_SIZE", block_size)
+        assert process_range(path, 0, len(data)) == expected(data)
+
+def test_ranges_end_after_newline(write):
+    data = b"first line\n" + b"x" * 50 + b" long line\nlast"
+    ranges = chunk_ranges(write(data), chunk_size=8)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert data[end - 1:end] == b"\n"
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16, 1024])
+def test_words_across_ranges_are_counted_once(monkeypatch, write, chunk_size):
+    monkeypatch.setattr(file_processing, "READ_BLOCK_SIZE", 4)
+    data = b"alpha beta\ngamma-delta epsilon\n\nzeta eta theta iota\nkappa"
+    path = write(data)
+    progress = []
+    result = process_file_chunks(path, lambda processed, total: progress.append((processed, total)),
+                                 workers=1, chunk_size=chunk_size)
+    assert result == expected(data)
+    assert progress[-1] == (len(data), len(data))
+
+@pytest.mark.parametrize("split", range(1, 11))
+def test_range_split_inside_a_word_counts_it_once(write, split):
+    data = b"hello world"
+    path = write(data)
+    assert process_range(path, 0, split)["words"] + process_range(path, split, len(data))["words"] == 2
+
+def test_empty_file_reports_progress(write):
+    progress = []
+    assert process_file_chunks(write(b""), lambda *args: progress.append(args)) == expected(b"")
+    assert progress == [(0, 0)]
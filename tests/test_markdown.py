@@ -0,0 +1,44 @@
+import io
+
+from handler.markdown import batched, iter_markdown_rows, split_cells
+
+TABLE = """
+| name | email | note |
+| :--- | :---: | ---: |
+| alice | alice@example.com | a \\| b |
+
+| bob | bob@example.com |  |
+"""
+
+
+def test_header_separator_and_blank_lines():
+    assert list(iter_markdown_rows(TABLE)) == [
+        {"name": "alice", "email": "alice@example.com", "note": "a | b"},
+        {"name": "bob", "email": "bob@example.com", "note": ""},
+    ]
+
+def test_file_lines_with_newlines():
+    rows = iter_markdown_rows(io.StringIO("| a | b |\r\n|---|---|\r\n| 1 | 2 |\r\n"))
+    assert list(rows) == [{"a": "1", "b": "2"}]
+
+def test_escaped_pipes_stay_in_cell():
+    assert split_cells(r"| a \| b | c |") == ["a | b", "c"]
+    assert split_cells(r"| ends with pipe \| |") == ["ends with pipe |"]
+
+def test_outer_pipes_are_optional():
+    assert split_cells("a | b") == ["a", "b"]
+    assert list(iter_markdown_rows("x | y\n--- | ---\n1 | 2")) == [{"x": "1", "y": "2"}]
+
+def test_only_the_line_after_header_is_a_separator():
+    rows = list(iter_markdown_rows("| a |\n| --- |\n| -1 |\n| - |"))
+    assert rows == [{"a": "-1"}, {"a": "-"}]
+    # 沒有分隔線時第二行就是資料
+    assert list(iter_markdown_rows("| a |\n| 1 |")) == [{"a": "1"}]
+
+def test_header_only_and_empty_input():
+    assert list(iter_markdown_rows("| a | b |\n| --- | --- |\n")) == []
+    assert list(iter_markdown_rows("\n\n")) == []
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 3)) == []
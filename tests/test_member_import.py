@@ -0,0 +1,35 @@
+import argparse
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from database import Base
+from handler.member_import import import_rows, iter_rows, positive_int
+from model.sqlalchemy.user import UserModel
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'members.db'}")
+    Base.metadata.create_all(bind=engine, tables=[UserModel.__table__])
+    yield engine
+    engine.dispose()
+
+def test_import_skips_duplicates_and_existing(engine, tmp_path):
+    path = tmp_path / "members.csv"
+    path.write_text("name,age\nAmy,30\nBob,\nAmy,31\n,20\nCarl,abc\nDan,40\n", encoding="utf-8")
+    with engine.begin() as connection:
+        connection.execute(UserModel.__table__.insert(), [{"name": "Dan", "age": 1}])
+
+    stats = import_rows(engine, iter_rows(str(path)), batch_size=2)
+    assert {key: stats[key] for key in ("read", "inserted", "duplicates", "existing", "invalid")} == \
+        {"read": 6, "inserted": 2, "duplicates": 1, "existing": 1, "invalid": 2}
+    with engine.connect() as connection:
+        assert sorted(connection.scalars(select(UserModel.name))) == ["Amy", "Bob", "Dan"]
+
+def test_batch_size_must_be_positive(engine):
+    with pytest.raises(ValueError):
+        import_rows(engine, [{"name": "Amy"}], batch_size=0)
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive_int("0")
+    assert positive_int("5") == 5
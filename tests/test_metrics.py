@@ -0,0 +1,18 @@
+from extension.metrics import MetricsExtension
+
+
+def test_operation_names_are_capped(monkeypatch):
+    monkeypatch.setattr(MetricsExtension, "_operation_names", set())
+    extension = MetricsExtension(max_operation_names=2)
+    assert [extension.operation_label(name) for name in ("A", "B", "C", "A", None)] == ["A", "B", "other", "A", "anonymous"]
+
+def test_operation_names_allowlist(monkeypatch):
+    monkeypatch.setattr(MetricsExtension, "_operation_names", set())
+    extension = MetricsExtension(operation_names=["GetPosts"])
+    assert extension.operation_label("GetPosts") == "GetPosts"
+    assert extension.operation_label("Random123") == "other"
+
+def test_metrics_endpoint_records_operations(client, graphql):
+    graphql("query MetricsProbe { getPosts { id } }")
+    text = client.get("/metrics").text
+    assert 'graphql_operation_duration_seconds_count{operation_name="MetricsProbe",operation_type="query"}' in text
@@ -0,0 +1,37 @@
+QUERY = """query($first: Int, $after: String, $last: Int, $before: String) {
+  usersConnection(first: $first, after: $after, last: $last, before: $before) {
+    edges { cursor node { id } }
+    pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+  }
+}"""
+
+
+def page(graphql, **variables) -> dict:
+    return graphql(QUERY, variables)["data"]["usersConnection"]
+
+def ids(connection: dict) -> list:
+    return [int(edge["node"]["id"]) for edge in connection["edges"]]
+
+def test_walk_forward_and_back(graphql, create_user):
+    for i in range(5):
+        create_user(f"page{i}")
+    everything = []
+    after = None
+    while True:
+        connection = page(graphql, first=2, after=after)
+        everything += ids(connection)
+        if not connection["pageInfo"]["hasNextPage"]:
+            break
+        after = connection["pageInfo"]["endCursor"]
+    assert everything == sorted(everything)
+    assert len(everything) == len(set(everything)) >= 5
+
+    last = page(graphql, last=2)
+    assert ids(last) == everything[-2:]
+    assert last["pageInfo"]["hasPreviousPage"] is True
+    previous = page(graphql, last=2, before=last["pageInfo"]["startCursor"])
+    assert ids(previous) == everything[-4:-2]
+
+def test_invalid_cursor_is_an_error(graphql):
+    result = graphql(QUERY, {"first": 2, "after": "not-a-cursor"})
+    assert "Invalid cursor" in result["errors"][0]["message"]
@@ -0,0 +1,23 @@
+import re
+
+
+def selected_columns(statement: str) -> set:
+    columns = re.match(r"\s*SELECT (.*?)\s+FROM", statement, re.S).group(1)
+    return {column.strip().split(" AS ")[0] for column in columns.split(",")}
+
+def test_get_user_selects_only_requested_columns(graphql, create_user, statements):
+    user_id = create_user("projection")
+    statements.clear()
+    result = graphql("query($id: Int) { getUser(id: $id) { id username } }", {"id": user_id})
+    assert result["data"]["getUser"] == [{"id": str(user_id), "username": "projection"}]
+
+    selects = [statement for statement in statements if statement.lstrip().startswith("SELECT")]
+    assert len(selects) == 1
+    assert selected_columns(selects[0]) == {'user.id', 'user.username'}
+
+def test_selected_relationship_is_eager_loaded(graphql, create_user, statements):
+    user_id = create_user("eager")
+    statements.clear()
+    graphql("query($id: Int) { getUser(id: $id) { username posts { title } } }", {"id": user_id})
+    # user 一句 + selectinload posts 一句，posts resolver 不再查詢
+    assert len([statement for statement in statements if statement.lstrip().startswith("SELECT")]) == 2
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+READS = {
+    "getPost": "query($id: Int!) { getPost(id: $id) { id title authorName } }",
+    "getPosts": "{ getPosts { id authorName } }",
+    "postsConnection": "{ postsConnection(first: 50) { edges { node { id authorName } } } }",
+}
+
+
+@pytest.fixture
+def post(graphql, create_user):
+    author_id = create_user("alice")
+    result = graphql("mutation($authorId: ID!) { createPost(title: \"cached\", content: \"c\", authorId: $authorId) { id } }",
+                     {"authorId": str(author_id)})
+    return author_id, int(result["data"]["createPost"]["id"])
+
+def author_names(name: str, result: dict, post_id: int) -> list:
+    data = result["data"][name]
+    if name == "getPost":
+        nodes = [data]
+    elif name == "getPosts":
+        nodes = data
+    else:
+        nodes = [edge["node"] for edge in data["edges"]]
+    return [node["authorName"] for node in nodes if int(node["id"]) == post_id]
+
+def test_second_read_is_a_hit(graphql, post):
+    _, post_id = post
+    first = graphql(READS["getPost"], {"id": post_id})
+    second = graphql(READS["getPost"], {"id": post_id})
+    assert first["extensions"]["responseCache"]["hit"] is False
+    assert second["extensions"]["responseCache"]["hit"] is True
+    assert second["data"] == first["data"]
+
+@pytest.mark.parametrize("name", READS)
+def test_update_user_invalidates_embedded_author(graphql, post, name):
+    author_id, post_id = post
+    variables = {"id": post_id} if name == "getPost" else {}
+    assert author_names(name, graphql(READS[name], variables), post_id) == ["alice"]
+    assert graphql(READS[name], variables)["extensions"]["responseCache"]["hit"] is True
+
+    graphql("mutation($id: ID!) { updateUser(id: $id, username: \"bob\", email: \"bob@example.com\") { id } }",
+            {"id": str(author_id)})
+
+    result = graphql(READS[name], variables)
+    assert result["extensions"]["responseCache"]["hit"] is False
+    assert author_names(name, result, post_id) == ["bob"]
+
+def test_delete_user_invalidates_cascaded_posts(graphql, post):
+    author_id, post_id = post
+    # 沒有選 authorName，只靠 PostType:{id} 的 tag
+    query = "query($id: Int!) { getPost(id: $id) { id title } }"
+    graphql(query, {"id": post_id})
+    assert graphql(query, {"id": post_id})["extensions"]["responseCache"]["hit"] is True
+
+    graphql("mutation($id: ID!) { deleteUser(id: $id) { id } }", {"id": str(author_id)})
+
+    result = graphql(query, {"id": post_id})
+    assert result["data"] is None
+    assert "Post not found" in result["errors"][0]["message"]
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    from cache.backend import LRUCache, RedisCache
+    if request.param == "memory":
+        return LRUCache(maxsize=10)
+    import fakeredis
+    return RedisCache(fakeredis.FakeRedis(), prefix="test:")
+
+def test_read_started_before_invalidate_is_not_written_back(cache):
+    version = cache.version()
+    cache.invalidate(["UserType:1"])  # 讀取進行中 mutation 完成
+    cache.set("stale", "old", ["UserType:1", "PostType"], version)
+    assert cache.get("stale") is None
+
+    cache.set("fresh", "new", ["UserType:1"], cache.version())
+    assert cache.get("fresh") == "new"
+
+def test_invalidate_of_unrelated_tag_keeps_write(cache):
+    version = cache.version()
+    cache.invalidate(["UserType:2"])
+    cache.set("key", "value", ["UserType:1"], version)
+    assert cache.get("key") == "value"
+
+def test_async_interface(cache):
+    async def roundtrip():
+        await cache.aset("key", "value", ["PostType"], await cache.aversion())
+        cached = await cache.aget("key")
+        await cache.ainvalidate(["PostType"])
+        return cached, await cache.aget("key")
+
+    assert asyncio.run(roundtrip()) == ("value", None)
+
+def test_forgotten_tag_versions_reject_older_reads():
+    from cache.backend import LRUCache
+    cache = LRUCache(maxsize=2)
+    version = cache.version()
+    cache.invalidate(["a", "b", "c"])  # 只保留最後兩個 tag 的 version
+    cache.set("key", "value", ["a"], version)
+    assert cache.get("key") is None
@@ -0,0 +1,170 @@
+import asyncio
+from functools import partial
+from typing import List
+
+import pytest
+import strawberry
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Column, Integer, String, select, update
+from sqlalchemy.orm import declarative_base
+from strawberry.fastapi import GraphQLRouter
+from strawberry.types import Info
+
+from cache.backend import LRUCache
+from database import RequestSession, create_db_engine, routing_sessionmaker
+from extension.response_cache import ResponseCacheExtension
+from extension.session import RequestSessionExtension
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "item"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """primary 與 replica 各一個 SQLite 檔，replica 的資料刻意不同，用來分辨讀取走哪一邊"""
+    primary = create_db_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for engine, name in ((primary, "primary"), (replica, "replica")):
+        Base.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(Item.__table__.insert(), {"id": 1, "name": name})
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+def item_name(db):
+    return db.execute(select(Item.name).where(Item.id == 1)).scalar_one()
+
+def test_reads_go_to_replica_and_writes_to_primary(engines):
+    primary, replica = engines
+    with routing_sessionmaker(primary, [replica])() as db:
+        assert item_name(db) == "replica"
+        db.add(Item(id=2, name="new"))
+        db.commit()
+    with primary.connect() as connection:
+        assert connection.execute(select(Item.name).where(Item.id == 2)).scalar_one() == "new"
+    with replica.connect() as connection:
+        assert connection.execute(select(Item.name).where(Item.id == 2)).first() is None
+
+def test_read_your_writes_within_session(engines):
+    primary, replica = engines
+    with routing_sessionmaker(primary, [replica])() as db:
+        db.execute(update(Item).where(Item.id == 1).values(name="renamed"))
+        # 寫入之後的讀取改走 primary
+        assert item_name(db) == "renamed"
+        db.commit()
+        assert item_name(db) == "renamed"
+
+def test_without_replicas_everything_uses_primary(engines):
+    primary, _ = engines
+    with routing_sessionmaker(primary)() as db:
+        assert item_name(db) == "primary"
+
+
+@strawberry.type
+class ItemType:
+    id: int
+    name: str
+
+
+@strawberry.type
+class Query:
+    @strawberry.field
+    async def items(self, info: Info) -> List[ItemType]:
+        rows = await info.context["db"].run(lambda db: db.execute(select(Item.id, Item.name).order_by(Item.id)).all())
+        return [ItemType(id=row.id, name=row.name) for row in rows]
+
+
+@strawberry.type
+class Mutation:
+    @strawberry.mutation
+    async def rename(self, info: Info, name: str) -> str:
+        def save(db):
+            # 先讀再寫：mutation 內的讀取也必須走 primary
+            before = item_name(db)
+            db.execute(update(Item).where(Item.id == 1).values(name=name))
+            db.commit()
+            return before
+
+        before = await info.context["db"].run(save)
+        await info.context["cache"].ainvalidate(["ItemType:1"])
+        return before
+
+
+@pytest.fixture
+def app(engines):
+    primary, replica = engines
+    cache = LRUCache(maxsize=100, invalidated_window=60)
+    repopulated = []
+
+    def on_repopulate(context):
+        repopulated.append(True)
+        context["db"].use_primary()
+
+    schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=[
+        partial(RequestSessionExtension, factory=routing_sessionmaker(primary, [replica]), sticky_seconds=30,
+                per_operation=lambda db: {"cache": cache}),
+        partial(ResponseCacheExtension, cache=cache, entity_types=("ItemType",), on_repopulate=on_repopulate),
+    ])
+    app = FastAPI()
+    app.include_router(GraphQLRouter(schema), prefix="/graphql")
+    app.state.repopulated = repopulated
+    return app
+
+def names(client):
+    return [item["name"] for item in client.post("/graphql", json={"query": "{ items { id name } }"}).json()["data"]["items"]]
+
+def rename(client, name):
+    return client.post("/graphql", json={"query": "mutation($name: String!) { rename(name: $name) }",
+                                         "variables": {"name": name}})
+
+def test_mutation_pins_client_to_primary(app, engines):
+    primary, replica = engines
+    with TestClient(app) as client:
+        assert names(client) == ["replica"]
+
+        response = rename(client, "renamed")
+        # mutation 內的讀取走 primary
+        assert response.json()["data"]["rename"] == "primary"
+        assert "db_primary_until" in response.cookies
+
+        # 帶著 cookie 的下一個 request 讀 primary，看得到剛寫入的資料
+        assert names(client) == ["renamed"]
+
+def test_just_invalidated_result_is_rebuilt_from_primary(app):
+    with TestClient(app) as reader, TestClient(app) as writer:
+        assert names(reader) == ["replica"]
+        assert not app.state.repopulated
+
+        rename(writer, "renamed")
+        # reader 沒有 cookie，但這個 query 的快取剛被 invalidate，重建時改走 primary
+        assert names(reader) == ["renamed"]
+        assert app.state.repopulated == [True]
+
+def test_expired_or_forged_cookie_is_ignored(app):
+    with TestClient(app) as client:
+        client.cookies.set("db_primary_until", "1")
+        assert names(client) == ["replica"]
+
+    with TestClient(app) as client:
+        client.cookies.set("db_primary_until", "99999999999")
+        assert names(client) == ["replica"]
+
+def test_request_session_use_primary_before_first_query(engines):
+    primary, replica = engines
+    request_session = RequestSession(routing_sessionmaker(primary, [replica]))
+
+    async def read():
+        request_session.use_primary()
+        try:
+            return await request_session.run(item_name)
+        finally:
+            await request_session.close()
+
+    assert asyncio.run(read()) == "primary"
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+from rq import Queue
+
+from handler.scheduler import JobPriority, JobScheduler, claim_batch
+
+
+def process(path):
+    return path
+
+def process_batch(queue_name, batch_id):
+    return batch_id
+
+@pytest.fixture
+def queues():
+    connection = fakeredis.FakeRedis()
+    return {priority: Queue(priority.value, connection=connection) for priority in JobPriority}
+
+@pytest.fixture
+def scheduler(queues):
+    # coalesce <= 10 bytes < small <= 100 bytes < normal < 1000 bytes <= large
+    return JobScheduler(queues, small_file_bytes=100, large_file_bytes=1000, coalesce_file_bytes=10)
+
+@pytest.fixture
+def make_file(tmp_path):
+    def make(size: int, name: str = None) -> str:
+        path = tmp_path / (name or f"{size}.bin")
+        path.write_bytes(b"x" * size)
+        return str(path)
+    return make
+
+@pytest.mark.parametrize("size, expected", [
+    (11, JobPriority.HIGH),
+    (100, JobPriority.HIGH),
+    (101, JobPriority.NORMAL),
+    (999, JobPriority.NORMAL),
+    (1000, JobPriority.LOW),
+])
+def test_queue_follows_file_size(scheduler, make_file, size, expected):
+    job = scheduler.submit(process, process_batch, make_file(size))
+    assert job.origin == expected.value
+    assert job.func_name.endswith(".process")
+
+@pytest.mark.parametrize("size, role, priority, expected", [
+    (500, "admin", None, JobPriority.HIGH),
+    (500, "guest", None, JobPriority.LOW),
+    (50, "admin", None, JobPriority.HIGH),  # 已經是最高
+    (5000, "guest", None, JobPriority.LOW),  # 已經是最低
+    (5000, "guest", JobPriority.HIGH, JobPriority.HIGH),  # 明確指定時以指定的為準
+])
+def test_role_and_explicit_priority(scheduler, make_file, size, role, priority, expected):
+    job = scheduler.submit(process, process_batch, make_file(size), role=role, priority=priority)
+    assert job.origin == expected.value
+
+def test_missing_file_is_rejected_before_routing(scheduler, queues, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        scheduler.submit(process, process_batch, str(tmp_path / "missing.bin"))
+    assert all(queue.count == 0 for queue in queues.values())
+
+def test_tiny_files_share_one_batch_job(scheduler, queues, make_file):
+    jobs = [scheduler.submit(process, process_batch, make_file(5, f"{i}.txt")) for i in range(3)]
+    assert len({job.id for job in jobs}) == 1
+    high = queues[JobPriority.HIGH]
+    assert high.job_ids == [jobs[0].id]
+    assert claim_batch(high.connection, high.name, jobs[0].id) == [make_file(5, f"{i}.txt") for i in range(3)]
+
+def test_claimed_batch_is_closed(scheduler, queues, make_file):
+    first = scheduler.submit(process, process_batch, make_file(5, "a.txt"))
+    high = queues[JobPriority.HIGH]
+    claim_batch(high.connection, high.name, first.id)
+
+    second = scheduler.submit(process, process_batch, make_file(5, "b.txt"))
+    assert second.id != first.id
+    assert claim_batch(high.connection, high.name, second.id) == [make_file(5, "b.txt")]
+
+def test_full_batch_opens_a_new_one(queues, make_file):
+    scheduler = JobScheduler(queues, coalesce_file_bytes=10, batch_max_files=2)
+    ids = [scheduler.submit(process, process_batch, make_file(5, f"{i}.txt")).id for i in range(5)]
+    assert ids[0] == ids[1] != ids[2] == ids[3] != ids[4]
+
+def test_batch_max_files_of_one_never_coalesces(queues, make_file):
+    scheduler = JobScheduler(queues, coalesce_file_bytes=10, batch_max_files=1)
+    ids = [scheduler.submit(process, process_batch, make_file(5, f"{i}.txt")).id for i in range(3)]
+    assert len(set(ids)) == 3
+
+def test_concurrent_submits_respect_batch_size(queues, make_file):
+    scheduler = JobScheduler(queues, coalesce_file_bytes=10, batch_max_files=4)
+    paths = [make_file(5, f"{i}.txt") for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        jobs = list(pool.map(lambda path: scheduler.submit(process, process_batch, path), paths))
+
+    high = queues[JobPriority.HIGH]
+    batches = {id: claim_batch(high.connection, high.name, id) for id in {job.id for job in jobs}}
+    assert sorted(path for batch in batches.values() for path in batch) == sorted(paths)
+    assert all(1 <= len(batch) <= 4 for batch in batches.values())
+    assert sorted(high.job_ids) == sorted(batches)
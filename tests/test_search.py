@@ -0,0 +1,77 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from handler.search import install_search_index, match_query, search_ids
+
+
+@pytest.fixture
+def db():
+    """獨立的 in-memory SQLite，只有 search 需要的欄位"""
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE "user" (id INTEGER PRIMARY KEY, username TEXT)'))
+        connection.execute(text('CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT, content TEXT)'))
+        # 建索引前就存在的資料由 rebuild 建入
+        connection.execute(text("INSERT INTO post (id, title, content) VALUES (1, 'GraphQL query basics', 'intro')"))
+        install_search_index(connection)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def add_post(db: Session, id: int, title: str, content: str = ""):
+    db.execute(text("INSERT INTO post (id, title, content) VALUES (:id, :title, :content)"),
+               {"id": id, "title": title, "content": content})
+
+def test_prefix_and_all_keywords_must_match(db):
+    add_post(db, 2, "GraphQL mutations")
+    db.execute(text("""INSERT INTO "user" (id, username) VALUES (1, 'graphite')"""))
+
+    assert search_ids(db, "gra que", 10) == [("post", 1)]
+    assert sorted(search_ids(db, "gra", 10)) == [("post", 1), ("post", 2), ("user", 1)]
+    assert search_ids(db, "graphql nothing", 10) == []
+
+def test_title_match_ranks_above_content_match(db):
+    add_post(db, 2, "unrelated", "mentions fastapi once")
+    add_post(db, 3, "fastapi tips", "body")
+    assert search_ids(db, "fastapi", 10) == [("post", 3), ("post", 2)]
+
+def test_triggers_keep_index_in_sync(db):
+    add_post(db, 2, "draft title")
+    assert search_ids(db, "draft", 10) == [("post", 2)]
+
+    db.execute(text("UPDATE post SET title = 'final title' WHERE id = 2"))
+    assert search_ids(db, "draft", 10) == []
+    assert search_ids(db, "final", 10) == [("post", 2)]
+
+    db.execute(text("DELETE FROM post WHERE id = 2"))
+    assert search_ids(db, "final", 10) == []
+
+def test_limit_and_offset(db):
+    for id in range(2, 7):
+        add_post(db, id, f"paging {id}")
+    everything = search_ids(db, "paging", 10)
+    assert len(everything) == 5
+    assert search_ids(db, "paging", 2) == everything[:2]
+    assert search_ids(db, "paging", 2, offset=2) == everything[2:4]
+    assert search_ids(db, "paging", 10, offset=5) == []
+
+@pytest.mark.parametrize("keyword", ["graphql OR nothing", "graphql NOT basics", "content:intro", '" OR 1=1 --',
+                                     "NEAR(graphql query)", "'); DROP TABLE post; --"])
+def test_operators_in_keyword_are_treated_as_text(db, keyword):
+    # 每個 token 都包成字串，OR / NOT / 欄位過濾不會生效，也不會丟出 FTS5 語法錯誤
+    assert search_ids(db, keyword, 10) == []
+    assert db.execute(text("SELECT count(*) FROM post")).scalar() == 1
+
+def test_keyword_without_tokens_returns_nothing(db):
+    assert search_ids(db, '"*-:()', 10) == []
+
+def test_search_query_returns_union_in_rank_order(graphql, create_user):
+    author_id = create_user("searchauthor")
+    graphql("mutation($authorId: ID!) { createPost(title: \"searchable walrus\", content: \"c\", authorId: $authorId) { id } }",
+            {"authorId": str(author_id)})
+    result = graphql('{ search(keyword: "searcha") { __typename ... on UserType { username } ... on PostType { title } } }')
+    assert result["data"]["search"] == [
+        {"__typename": "PostType", "title": "searchable walrus"},
+        {"__typename": "UserType", "username": "searchauthor"},
+    ]
@@ -0,0 +1,13 @@
+from datetime import datetime
+from enum import Enum
+
+from handler import serializer
+
+
+class Role(Enum):
+    ADMIN = "admin"
+
+
+def test_dumps_encodes_datetime_and_enum():
+    data = {"at": datetime(2024, 1, 1, 12, 30), "role": Role.ADMIN, "name": "中文"}
+    assert serializer.loads(serializer.dumps(data)) == {"at": "2024-01-01T12:30:00", "role": "admin", "name": "中文"}
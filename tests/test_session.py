@@ -0,0 +1,27 @@
+def ws_execute(ws, operation_id: str, query: str, variables: dict) -> dict:
+    ws.send_json({"id": operation_id, "type": "subscribe", "payload": {"query": query, "variables": variables}})
+    message = ws.receive_json()
+    assert ws.receive_json() == {"id": operation_id, "type": "complete"}
+    return message["payload"]
+
+def test_websocket_operations_get_their_own_loaders(client, graphql, create_user):
+    author_id = create_user("websocket")
+    query = "query($id: Int) { getUser(id: $id) { posts { title } } }"
+    create_post = "mutation($authorId: ID!, $title: String!) { createPost(title: $title, content: \"c\", authorId: $authorId) { id } }"
+
+    with client.websocket_connect("/graphql", subprotocols=["graphql-transport-ws"]) as ws:
+        ws.send_json({"type": "connection_init"})
+        assert ws.receive_json()["type"] == "connection_ack"
+
+        first = ws_execute(ws, "1", query, {"id": author_id})
+        assert first["data"]["getUser"][0]["posts"] == []
+
+        graphql(create_post, {"authorId": str(author_id), "title": "after first"})
+        # 同一條連線的下一個 operation 不能沿用上一個 operation 的 DataLoader 快取
+        second = ws_execute(ws, "2", query, {"id": author_id})
+        assert second["data"]["getUser"][0]["posts"] == [{"title": "after first"}]
+
+def test_each_operation_closes_its_session(simple_main, graphql):
+    graphql("{ getPosts { id authorName } }")
+    # 連線都已歸還 (沒有被某個 request / 連線一直占用)
+    assert simple_main.engine.pool.checkedout() == 0
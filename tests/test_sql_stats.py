@@ -0,0 +1,27 @@
+import asyncio
+
+from handler.sql_stats import SQLStats, collect_sql, current_sql_stats, statement_shape
+
+
+def test_statement_shape_ignores_parameters():
+    assert statement_shape("SELECT * FROM post WHERE id IN (?, ?, ?)") == statement_shape("SELECT * FROM post WHERE id IN (?)")
+    assert statement_shape("SELECT * FROM user WHERE id = 1") == statement_shape("SELECT * FROM user WHERE id = 42")
+
+def test_repeated_statements_flag_n_plus_one():
+    stats = SQLStats()
+    stats.trace()
+    for id in range(4):
+        stats.record(f"SELECT * FROM user WHERE id = {id}", 0.001)
+    stats.record("SELECT * FROM post", 0.001)
+    repeated = stats.repeated_statements(threshold=3)
+    assert [group["count"] for group in repeated] == [4]
+
+def test_collect_sql_finishing_in_another_context():
+    # multipart subscription 的 on_operation 在另一個 context 結束
+    async def run():
+        manager = collect_sql()
+        assert manager.__enter__() is current_sql_stats()
+        # 以前 reset(token) 在不同的 context 會拋出 ValueError
+        await asyncio.to_thread(manager.__exit__, None, None, None)
+
+    asyncio.run(run())
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from rq.job import Job
+
+from handler import upload
+from handler.upload import UploadError, append_chunk, create_session, get_session
+
+
+async def body(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+def append(upload_dir, upload_id, offset, *chunks) -> dict:
+    return asyncio.run(append_chunk(upload_id, offset, body(*chunks), upload_dir=upload_dir))
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    upload._hashers.clear()
+    return str(tmp_path)
+
+def test_resume_on_another_worker(upload_dir):
+    data = os.urandom(3000)
+    session = create_session("a.bin", len(data), hashlib.sha256(data).hexdigest(), upload_dir=upload_dir)
+    upload_id = session["upload_id"]
+    assert append(upload_dir, upload_id, 0, data[:1000])["offset"] == 1000
+
+    # 另一個 worker (沒有 hash 快取) 接著寫
+    cached = dict(upload._hashers)
+    upload._hashers.clear()
+    assert append(upload_dir, upload_id, 1000, data[1000:2000])["offset"] == 2000
+
+    # 原本的 worker 帶著 offset 1000 的舊 hash 收到最後一段，需以磁碟內容重建
+    upload._hashers.update(cached)
+    state = append(upload_dir, upload_id, 2000, data[2000:])
+    assert state["sha256"] == hashlib.sha256(data).hexdigest()
+    with open(state["path"], "rb") as f:
+        assert f.read() == data
+
+def test_offset_mismatch_is_rejected(upload_dir):
+    upload_id = create_session("a.bin", 10, upload_dir=upload_dir)["upload_id"]
+    append(upload_dir, upload_id, 0, b"12345")
+    with pytest.raises(UploadError) as error:
+        append(upload_dir, upload_id, 0, b"12345")
+    assert error.value.status_code == 409
+    assert get_session(upload_id, upload_dir=upload_dir)["offset"] == 5
+
+def test_concurrent_chunks_are_serialized(upload_dir):
+    upload_id = create_session("a.bin", 6, upload_dir=upload_dir)["upload_id"]
+
+    async def slow_body(chunk: bytes, started: asyncio.Event, release: asyncio.Event):
+        started.set()
+        await release.wait()
+        yield chunk
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(append_chunk(upload_id, 0, slow_body(b"aaa", started, release), upload_dir=upload_dir))
+        await started.wait()
+        # 第一個 request 還在寫入時，同一個 offset 的第二個 request 被拒絕
+        with pytest.raises(UploadError) as error:
+            await append_chunk(upload_id, 0, body(b"bbb"), upload_dir=upload_dir)
+        assert error.value.status_code == 409
+        release.set()
+        return await first
+
+    assert asyncio.run(run())["offset"] == 3
+    assert append(upload_dir, upload_id, 3, b"ccc")["path"] is not None
+
+def test_checksum_mismatch_resets_the_session(upload_dir):
+    data = b"hello world"
+    upload_id = create_session("a.txt", len(data), hashlib.sha256(data).hexdigest(), upload_dir=upload_dir)["upload_id"]
+    with pytest.raises(UploadError) as error:
+        append(upload_dir, upload_id, 0, b"hello w0rld")
+    assert error.value.status_code == 422
+
+    # 清空後從 offset 0 重傳同一個 session
+    assert get_session(upload_id, upload_dir=upload_dir)["offset"] == 0
+    state = append(upload_dir, upload_id, 0, data[:5], data[5:])
+    with open(state["path"], "rb") as f:
+        assert f.read() == data
+
+def test_patch_endpoint_resumes_upload(client):
+    data = os.urandom(2048)
+    session = client.post("/uploads/", json={"file_name": "../x.bin", "size": len(data),
+                                             "sha256": hashlib.sha256(data).hexdigest()}).json()
+    url = f"/uploads/{session['upload_id']}"
+    assert client.patch(url, content=data[:1000], headers={"Upload-Offset": "0"}).json()["offset"] == 1000
+    assert client.patch(url, content=data[1000:], headers={"Upload-Offset": "5"}).status_code == 409
+    assert client.get(url).json()["offset"] == 1000
+
+UPLOAD_IN_TASK = "mutation($name: String!) { uploadFileInTask(storedName: $name) { fileName jobId } }"
+
+@pytest.mark.parametrize("via", ["multipart", "session"])
+def test_uploaded_file_is_processed_by_stored_name(client, graphql, job_queues, run_jobs, via):
+    data = b"hello world\nsecond line\n"
+    if via == "multipart":
+        saved = client.post("/upload/", files={"file": ("notes.txt", data)}).json()
+    else:
+        session = client.post("/uploads/", json={"file_name": "notes.txt", "size": len(data)}).json()
+        saved = client.patch(f"/uploads/{session['upload_id']}", content=data, headers={"Upload-Offset": "0"}).json()
+    assert saved["stored_name"].endswith("_notes.txt")
+
+    result = graphql(UPLOAD_IN_TASK, {"name": saved["stored_name"]})
+    assert "errors" not in result
+    run_jobs()
+
+    connection = next(iter(job_queues.values())).connection
+    job = Job.fetch(result["data"]["uploadFileInTask"]["jobId"], connection=connection)
+    assert job.is_finished
+    stats = next(stats for path, stats in job.return_value().items() if path.endswith(saved["stored_name"]))
+    assert stats["bytes"] == len(data)
+    assert stats["lines"] == 2
+
+@pytest.mark.parametrize("name", ["notes.txt", "../simple.db", "0" * 32 + "_missing.txt", ""])
+def test_unknown_stored_name_is_a_graphql_error(graphql, job_queues, name):
+    result = graphql(UPLOAD_IN_TASK, {"name": name})
+    assert result["data"] is None
+    assert result["errors"][0]["message"].startswith("Uploaded file not found")
+    assert result["errors"][0]["extensions"]["code"] == "BAD_USER_INPUT"
+
+def test_batch_skips_files_deleted_while_queued(simple_main, job_queues, run_jobs, tmp_path):
+    kept, deleted = tmp_path / "kept.txt", tmp_path / "deleted.txt"
+    kept.write_bytes(b"one two\n")
+    deleted.write_bytes(b"three\n")
+    jobs = [simple_main.submit_file_job(str(path)) for path in (kept, deleted)]
+    assert jobs[0].id == jobs[1].id  # 小檔案併入同一個批次
+    deleted.unlink()
+
+    run_jobs()
+    job = Job.fetch(jobs[0].id, connection=jobs[0].connection)
+    assert job.is_finished
+    assert job.return_value() == {
+        str(kept): {"bytes": 8, "lines": 1, "words": 2},
+        str(deleted): {"error": "File not found"},
+    }
@@ -0,0 +1,11 @@
+UPDATE = "mutation($id: ID!, $username: String, $email: String) { updateUser(id: $id, username: $username, email: $email) { username email } }"
+
+
+def test_update_user_keeps_fields_that_were_not_sent(graphql, create_user):
+    user_id = create_user("partial")
+    # benchmark 的 updateUser 情境只送 username
+    result = graphql(UPDATE, {"id": str(user_id), "username": "renamed"})
+    assert result["data"]["updateUser"] == {"username": "renamed", "email": "partial@example.com"}
+
+    result = graphql(UPDATE, {"id": str(user_id), "email": "new@example.com"})
+    assert result["data"]["updateUser"] == {"username": "renamed", "email": "new@example.com"}